@@ -1,29 +1,2460 @@
 import os
+import asyncio
 import pandas as pd
 import re
 import requests
 import sqlite3
+import hashlib
+import io
 import json
 import csv
+import datetime
+import logging
+import itertools
+import bisect
+import functools
+import shutil
+import weakref
+from abc import ABC, abstractmethod
 from rdflib import Graph, URIRef, Literal, Namespace
 from pandas import read_csv
 from rdflib.namespace import RDF
-from sparql_dataframe import get
 from pandas import concat
-from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
-from typing import List, Union, Optional
-
-# To search for a file anywhere on the system
-def find_file(filename, search_path="/"):  # start search from the system root
-    for root, dirs, files in os.walk(search_path):
-        if filename in files:
-            return os.path.join(root, filename)
-    return None
+import time
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager, nullcontext
+from urllib.parse import quote, urlsplit
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson  # Optional: a faster JSON parser for SPARQL JSON results
+except ImportError:
+    orjson = None
+try:
+    import aiohttp  # Optional: the async HTTP client of the asyncio query handlers
+except ImportError:
+    aiohttp = None
+from typing import Iterator, List, Union, Optional
+
+# Diagnostics go through this logger. No handler is installed here, so by default only
+# warnings and errors reach stderr (through logging's last-resort handler) and the
+# per-row and per-object messages cost a level check. Call configure_logging() - or
+# configure the "impl" logger yourself - to see them.
+logger = logging.getLogger(__name__)
 
 BLAZEGRAPH_ENDPOINT = 'http://127.0.0.1:9999/blazegraph/sparql'
 CSV_FILEPATH = 'data/meta.csv'
 
+# Directories searched when a data file is not found at the given path. None searches
+# the working directory at the time of the lookup and the project folder (the one
+# containing Main/ and Data/); the filesystem root never is.
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FILE_SEARCH_ROOTS = None
+FILE_SEARCH_MAX_DEPTH = 6
+FILE_INDEX_PATH = ".file_index.json"  # Relative paths are taken from the project folder
+FILE_SEARCH_SKIP_DIRS = {".git", "__pycache__", "node_modules", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache"}
+
+
+# Attributes every LogRecord has; anything else on a record was passed through `extra`
+_LOG_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONLogFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line: time, level, logger and message,
+    plus the fields passed through `extra` (e.g. the row counts of an upload).
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _LOG_RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=logging.INFO, stream=None, structured: bool = False) -> logging.Handler:
+    """
+    Sends the module's log records at `level` and above to `stream` (stderr by default),
+    as plain text or, with `structured`, as JSON lines. Calling it again replaces the
+    handler it installed before. Returns the handler.
+    """
+    for handler in list(logger.handlers):
+        if getattr(handler, "_configured_by_impl", False):
+            logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JSONLogFormatter() if structured else logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+    handler._configured_by_impl = True
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
+
+
+# Metrics. Handlers and mashups count and time their calls, with the rows they return;
+# the SQL, SPARQL, parsing and object building stages are timed apart, and SPARQL bytes
+# and result cache lookups are counted. Everything goes to the collector installed with
+# set_metrics_collector(). None is installed by default, and then an instrumented call
+# costs one extra function call and a global lookup.
+METRICS_NAMESPACE = "impl"  # Prefix of the exported metric names
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds
+METRICS = {
+    "calls_total": ("counter", "Calls of each instrumented method."),
+    "errors_total": ("counter", "Calls of each instrumented method that raised an exception."),
+    "rows_total": ("counter", "Rows or objects returned by each instrumented method."),
+    "call_duration_seconds": ("histogram", "Time spent in each instrumented method."),
+    "stage_duration_seconds": ("histogram", "Time spent in SQL queries, SPARQL requests, result parsing and object building."),
+    "bytes_total": ("counter", "Bytes sent to and received from SPARQL endpoints."),
+    "cache_requests_total": ("counter", "Lookups in the query result caches, by result."),
+}
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRIC_LABEL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+
+
+def metric_labels(labels: tuple, extra: str = "") -> str:
+    # A label set in the Prometheus text format, e.g. {method="MetadataQueryHandler.getAllPeople"}
+    pairs = [f'{name}="{str(value).translate(METRIC_LABEL_ESCAPES)}"' for name, value in labels]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def metric_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsCollector(object):
+    """
+    Thread-safe counters and histograms, exported in the Prometheus text format.
+
+    The instrumentation only calls inc() and observe(); a subclass overriding them can
+    send the measurements anywhere else. export() gives the current values, write()
+    saves them for node_exporter's textfile collector and serve() answers scrapes.
+    """
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE, buckets=METRICS_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [observations per bucket..., above the last bucket, sum]
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        position = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[position] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        # Observe the seconds spent in the block
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        # The value of a counter, 0 if it was never incremented
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name: str, **labels) -> tuple:
+        # The number of observations of a histogram and their sum in seconds
+        with self._lock:
+            histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+            return (sum(histogram[:-1]), histogram[-1]) if histogram is not None else (0, 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def export(self) -> str:
+        # All the metrics in the Prometheus text exposition format
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                help_text = METRICS.get(name, (kind, ""))[1]
+                if help_text:
+                    lines.append(f"# HELP {self.namespace}_{name} {help_text}")
+                lines.append(f"# TYPE {self.namespace}_{name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{self.namespace}_{name}{metric_labels(labels)} {metric_value(value)}")
+        for (name, labels), values in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, observations in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += observations
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else metric_value(bound))
+                lines.append(f"{self.namespace}_{name}_bucket{metric_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.namespace}_{name}_sum{metric_labels(labels)} {metric_value(values[-1])}")
+            lines.append(f"{self.namespace}_{name}_count{metric_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write(self, path: str):
+        # Save export() to `path`, replacing the file atomically so readers never see half of it
+        partial = path + ".partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            f.write(self.export())
+        os.replace(partial, path)
+
+    def serve(self, port: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Answers GET /metrics with export() from a background thread. Returns the server:
+        its server_address holds the port chosen when `port` is 0, and shutdown() stops it.
+        """
+        collector = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if urlsplit(self.path).path != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = collector.export().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug("Metrics request: " + format, *args)
+
+        server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+_metrics = None  # The installed MetricsCollector; None disables metrics
+_no_timer = nullcontext()
+
+
+def set_metrics_collector(collector: Optional[MetricsCollector]) -> Optional[MetricsCollector]:
+    # Install a collector, or disable metrics with None; returns the collector replaced
+    global _metrics
+    previous, _metrics = _metrics, collector
+    return previous
+
+
+def get_metrics_collector() -> Optional[MetricsCollector]:
+    return _metrics
+
+
+def stage_timer(stage: str):
+    # A context manager timing a stage of a call, doing nothing while metrics are disabled
+    metrics = _metrics
+    return _no_timer if metrics is None else metrics.timer("stage_duration_seconds", stage=stage)
+
+
+def timed_stage(stage: str):
+    # Decorates a function so its calls are timed as `stage` while metrics are enabled
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            metrics = _metrics
+            if metrics is None:
+                return function(*args, **kwargs)
+            with metrics.timer("stage_duration_seconds", stage=stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_metric(name: str, value: float = 1, **labels):
+    metrics = _metrics
+    if metrics is not None:
+        metrics.inc(name, value, **labels)
+
+
+def record_call(metrics: MetricsCollector, method: str, started: float, result=None, failed: bool = False):
+    metrics.observe("call_duration_seconds", time.perf_counter() - started, method=method)
+    metrics.inc("calls_total", method=method)
+    if failed:
+        metrics.inc("errors_total", method=method)
+    elif hasattr(result, "__len__") and not isinstance(result, (str, dict)):
+        metrics.inc("rows_total", len(result), method=method)
+
+
+def instrumented(function):
+    """
+    Decorates a handler or mashup method so that, while a collector is installed, its calls
+    are counted and timed as "Class.method", along with the rows or objects they return.
+    Coroutine methods are awaited.
+    """
+    method = function.__qualname__
+    if asyncio.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            metrics = _metrics
+            if metrics is None:
+                return await function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                result = await function(*args, **kwargs)
+            except Exception:
+                record_call(metrics, method, started, failed=True)
+                raise
+            record_call(metrics, method, started, result)
+            return result
+        return wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        metrics = _metrics
+        if metrics is None:
+            return function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            record_call(metrics, method, started, failed=True)
+            raise
+        record_call(metrics, method, started, result)
+        return result
+    return wrapper
+
+
+def default_file_search_roots() -> list:
+    # FILE_SEARCH_ROOTS, or the current working directory and the project folder
+    roots = FILE_SEARCH_ROOTS if FILE_SEARCH_ROOTS is not None else [os.getcwd(), PROJECT_DIR]
+    return list(dict.fromkeys(os.path.abspath(root) for root in roots))
+
+
+class FileResolver(object):
+    """
+    Resolves bare file names (e.g. 'process.json') to paths below a bounded set of roots.
+
+    The first lookup walks the roots (at most `max_depth` levels deep) and records every
+    file name together with the modification time of each directory visited. The index
+    is persisted to `index_path`, so later lookups - also from other processes - are a
+    dictionary access. Whenever a lookup misses or a cached path has disappeared, only the
+    directories whose mtime changed since the last scan are listed again.
+    """
+
+    def __init__(self, roots=None, max_depth=FILE_SEARCH_MAX_DEPTH, index_path=FILE_INDEX_PATH):
+        self.roots = []
+        for root in (roots if roots is not None else default_file_search_roots()):
+            if os.path.abspath(root) not in self.roots:
+                self.roots.append(os.path.abspath(root))
+        self.max_depth = max_depth
+        # The index does not follow the working directory around
+        self.index_path = os.path.join(PROJECT_DIR, index_path) if index_path else index_path
+        self.files = {}  # file name -> list of absolute paths
+        self.dir_mtimes = {}  # directory -> (mtime, depth) at the time it was listed
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "scans": 0,
+                      "dirs_listed": 0, "scan_seconds": 0.0, "lookup_seconds": 0.0,
+                      "last_lookup_seconds": 0.0}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def find(self, filename: str) -> Optional[str]:
+        # Return the first indexed path for the file name, refreshing the index if needed
+        started = time.perf_counter()
+        with self._lock:
+            if not self._loaded:
+                self._load_index()
+            path = self._lookup(filename)
+            if path is None:
+                # The file may have been created after the last scan
+                if self._refresh():
+                    path = self._lookup(filename)
+            self.stats["lookups"] += 1
+            self.stats["hits" if path else "misses"] += 1
+            elapsed = time.perf_counter() - started
+            self.stats["lookup_seconds"] += elapsed
+            self.stats["last_lookup_seconds"] = elapsed
+        return path
+
+    def getStats(self) -> dict:
+        return dict(self.stats)
+
+    def invalidate(self):
+        # Drop the in-memory and the persisted index
+        with self._lock:
+            self.files = {}
+            self.dir_mtimes = {}
+            self._loaded = True
+            if self.index_path and os.path.exists(self.index_path):
+                os.remove(self.index_path)
+
+    def _lookup(self, filename):
+        for path in self.files.get(filename, []):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _refresh(self) -> bool:
+        # Re-list the directories whose mtime changed; walk the roots if nothing is indexed yet
+        started = time.perf_counter()
+        changed = False
+        if not self.dir_mtimes:
+            for root in self.roots:
+                self._scan(root, 0)
+            changed = True
+        else:
+            for directory, (mtime, depth) in list(self.dir_mtimes.items()):
+                try:
+                    current = os.stat(directory).st_mtime
+                except OSError:
+                    current = None
+                if current != mtime:
+                    self._forget(directory)
+                    if current is not None:
+                        self._scan(directory, depth)
+                    changed = True
+        if changed:
+            self.stats["scans"] += 1
+            self.stats["scan_seconds"] += time.perf_counter() - started
+            self._save_index()
+        return changed
+
+    def _scan(self, directory, depth):
+        # Index the files of one directory and descend into its subdirectories
+        try:
+            mtime = os.stat(directory).st_mtime
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        self.dir_mtimes[directory] = (mtime, depth)
+        self.stats["dirs_listed"] += 1
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    paths = self.files.setdefault(entry.name, [])
+                    if entry.path not in paths:
+                        paths.append(entry.path)
+                elif (entry.is_dir(follow_symlinks=False) and depth < self.max_depth
+                        and entry.name not in FILE_SEARCH_SKIP_DIRS
+                        and entry.path not in self.dir_mtimes):
+                    self._scan(entry.path, depth + 1)
+            except OSError:
+                continue
+
+    def _forget(self, directory):
+        # Remove the files directly inside a directory that is about to be listed again
+        del self.dir_mtimes[directory]
+        for name in list(self.files):
+            paths = [p for p in self.files[name] if os.path.dirname(p) != directory]
+            if paths:
+                self.files[name] = paths
+            else:
+                del self.files[name]
+
+    def _load_index(self):
+        self._loaded = True
+        if not self.index_path or not os.path.isfile(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # An index built for other roots or depth is useless here
+        if data.get("roots") != self.roots or data.get("max_depth") != self.max_depth:
+            return
+        self.files = data.get("files", {})
+        self.dir_mtimes = {d: tuple(v) for d, v in data.get("dirs", {}).items()}
+
+    def _save_index(self):
+        if not self.index_path:
+            return
+        data = {"roots": self.roots, "max_depth": self.max_depth,
+                "files": self.files, "dirs": self.dir_mtimes}
+        try:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass  # The index is only a cache
+
+
+_file_resolver = None
+
+
+_file_resolver_defaults = False  # Whether the shared resolver searches the default roots
+
+
+def get_file_resolver() -> FileResolver:
+    # Shared resolver used by find_file and the upload handlers; one searching the default
+    # roots is rebuilt when they change, e.g. after a change of working directory
+    global _file_resolver, _file_resolver_defaults
+    if _file_resolver is None or (_file_resolver_defaults and _file_resolver.roots != default_file_search_roots()):
+        _file_resolver = FileResolver()
+        _file_resolver_defaults = True
+    return _file_resolver
+
+
+def set_file_search_roots(roots, max_depth=FILE_SEARCH_MAX_DEPTH, index_path=FILE_INDEX_PATH):
+    # Replace the shared resolver with one that searches the given roots
+    global _file_resolver, _file_resolver_defaults
+    _file_resolver = FileResolver(roots, max_depth, index_path)
+    _file_resolver_defaults = roots is None
+    return _file_resolver
+
+
+# To search for a file below the configured search roots
+def find_file(filename, search_path=None):
+    if search_path is not None:
+        # An explicit search path gets its own, non-persisted index
+        return FileResolver([search_path], index_path=None).find(filename)
+    return get_file_resolver().find(filename)
+
+# Activity blocks of a process data object and the table each one is stored in
+ACTIVITY_TABLES = {
+    "acquisition": "Acquisition",
+    "processing": "Processing",
+    "modelling": "Modelling",
+    "optimising": "Optimising",
+    "exporting": "Exporting",
+}
+ACTIVITY_COLUMNS = {
+    table: ["object_id", "responsible_institute", "responsible_person"]
+    + (["technique"] if table == "Acquisition" else [])
+    + ["tool", "start_date", "end_date"]
+    for table in ACTIVITY_TABLES.values()
+}
+
+# Streaming ingestion settings. The PRAGMAs trade durability for speed and only apply
+# to the connection used for the load.
+INGEST_BATCH_SIZE = 10000
+JSON_READ_CHUNK_SIZE = 1 << 16
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -262144,  # Negative values are KiB, i.e. 256 MiB
+}
+
+
+def iter_json_array(file_path, chunk_size=JSON_READ_CHUNK_SIZE):
+    """
+    Yields the elements of a top-level JSON array one at a time.
+
+    The file is read in chunks of `chunk_size` characters and each element is decoded as
+    soon as it is complete, so memory use depends on the largest element rather than on
+    the size of the file.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size)
+        eof = not buffer
+        pos = 0
+        started = False
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"Unexpected end of JSON array in {file_path}")
+                buffer = f.read(chunk_size)
+                eof = not buffer
+                pos = 0
+                continue
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"{file_path} does not contain a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value ending exactly at the end of the buffer may continue in the next chunk
+            if end is None or (end == len(buffer) and not eof):
+                if eof:
+                    raise ValueError(f"Malformed JSON element in {file_path} at offset {pos}")
+                more = f.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            yield value
+            pos = end
+
+
+def activity_rows(item):
+    # Yield (table, row) pairs for the activity blocks of one process data object
+    object_id = item["object id"]
+    for key, table in ACTIVITY_TABLES.items():
+        activity = item.get(key, {})
+        row = [
+            object_id,
+            activity.get("responsible institute"),
+            activity.get("responsible person"),
+        ]
+        if table == "Acquisition":
+            row.append(activity.get("technique"))
+        row += [
+            ", ".join(activity.get("tool", [])) if activity.get("tool") else None,
+            activity.get("start date"),
+            activity.get("end date"),
+        ]
+        yield table, tuple(row)
+
+
+# Normalized storage: every activity lives in one table with a type discriminator
+# and its tools in a junction table. Selected with ProcessDataUploadHandler(schema="activity");
+# existing databases are converted with migrate_to_activity_schema.
+ACTIVITY_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS activity (
+            id INTEGER PRIMARY KEY,
+            object_id TEXT,
+            type TEXT NOT NULL,
+            responsible_institute TEXT,
+            responsible_person TEXT,
+            technique TEXT,
+            start_date TEXT,
+            end_date TEXT
+        )""",
+    """CREATE TABLE IF NOT EXISTS activity_tool (
+            activity_id INTEGER NOT NULL REFERENCES activity (id),
+            position INTEGER NOT NULL,
+            tool TEXT NOT NULL,
+            PRIMARY KEY (activity_id, position)
+        ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS activity_object_id ON activity (object_id)",
+    "CREATE INDEX IF NOT EXISTS activity_responsible_person ON activity (responsible_person)",
+    "CREATE INDEX IF NOT EXISTS activity_responsible_institute ON activity (responsible_institute)",
+    "CREATE INDEX IF NOT EXISTS activity_start_date ON activity (start_date)",
+    "CREATE INDEX IF NOT EXISTS activity_end_date ON activity (end_date)",
+    "CREATE INDEX IF NOT EXISTS activity_tool_tool ON activity_tool (tool)",
+]
+ACTIVITY_INSERT = (
+    "INSERT INTO activity (id, object_id, type, responsible_institute, responsible_person, "
+    "technique, start_date, end_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+ACTIVITY_TOOL_INSERT = "INSERT INTO activity_tool (activity_id, position, tool) VALUES (?, ?, ?)"
+# Same columns as the UNION over the per-type tables; DISTINCT keeps its duplicate removal
+ACTIVITY_SELECT = (
+    "SELECT DISTINCT object_id, responsible_institute, responsible_person, technique, "
+    "NULL AS tool, start_date, end_date, type FROM activity"
+)
+# The same columns read from the per-type tables
+TABLES_ACTIVITY_SELECT = """
+    SELECT object_id, responsible_institute, responsible_person, technique, NULL as tool, start_date, end_date, 'Acquisition' as type  FROM Acquisition
+    UNION
+    SELECT object_id, responsible_institute, responsible_person, NULL as technique, NULL as tool, start_date, end_date, 'Processing' as type  FROM Processing
+    UNION
+    SELECT object_id, responsible_institute, responsible_person, NULL as technique, NULL as tool, start_date, end_date, 'Modelling' as type  FROM Modelling
+    UNION
+    SELECT object_id, responsible_institute, responsible_person, NULL as technique, NULL as tool, start_date, end_date, 'Optimising' as type  FROM Optimising
+    UNION
+    SELECT object_id, responsible_institute, responsible_person, NULL as technique, NULL as tool, start_date, end_date, 'Exporting' as type  FROM Exporting
+"""
+# Ids of the objects with an Acquisition started on or after a date and of those with an
+# Exporting ended on or before another, each with the type that matched
+TIME_FRAME_OBJECTS_SELECT = """
+    SELECT object_id, type FROM activity WHERE type = 'Acquisition' AND %(acquired)s
+    UNION
+    SELECT object_id, type FROM activity WHERE type = 'Exporting' AND %(exported)s
+"""
+# Acquisitions in the activity schema, with the comma-joined tool column of the Acquisition table
+ACQUISITION_SELECT = """
+    SELECT object_id, responsible_institute, responsible_person, technique,
+        (SELECT group_concat(tool, ', ') FROM
+            (SELECT tool FROM activity_tool WHERE activity_id = activity.id ORDER BY position)) AS tool,
+        start_date, end_date
+    FROM activity WHERE type = 'Acquisition'"""
+TABLES_TIME_FRAME_OBJECTS_SELECT = """
+    SELECT object_id, 'Acquisition' AS type FROM Acquisition WHERE start_date >= ?
+    UNION
+    SELECT object_id, 'Exporting' AS type FROM Exporting WHERE end_date <= ?
+"""
+
+# Rows per page read by the iterator methods of the query handlers and mashups
+ITER_PAGE_SIZE = 1000
+
+# Metadata queries. %(page)s takes an optional subquery restricting the objects returned.
+HERITAGE_TYPE_FILTER = """(
+        <https://schema.org/NauticalChart>,
+        <https://schema.org/ManuscriptPlate>,
+        <https://schema.org/ManuscriptVolume>,
+        <https://schema.org/PrintedVolume>,
+        <https://schema.org/PrintedMaterial>,
+        <https://schema.org/Herbarium>,
+        <https://schema.org/Specimen>,
+        <https://schema.org/Painting>,
+        <https://schema.org/Model>,
+        <https://schema.org/Map>
+        )"""
+CULTURAL_OBJECTS_QUERY = """
+        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX schema: <https://schema.org/>
+
+        SELECT (REPLACE(STR(?type), "https://schema.org/", "") AS ?type_name) ?id ?title ?date ?owner ?place ?author_id ?author_name
+        WHERE {%(page)s
+        ?cultural_object rdf:type ?type .
+        ?cultural_object schema:name ?title .
+        OPTIONAL { ?cultural_object schema:identifier ?id }
+        OPTIONAL { ?cultural_object schema:dateCreated ?date }
+        OPTIONAL { ?cultural_object schema:provider ?owner }
+        OPTIONAL { ?cultural_object schema:contentLocation ?place }
+        OPTIONAL { ?cultural_object schema:creator ?author }
+        OPTIONAL { ?author schema:identifier ?author_id }
+        OPTIONAL { ?author rdfs:label ?author_name }
+        
+        FILTER(?type IN """ + HERITAGE_TYPE_FILTER + """)
+        FILTER(?author_name != "NaN")
+        FILTER(?author_id != "NaN")
+        }
+        """
+CULTURAL_OBJECTS_COLUMNS = ["type_name", "id", "title", "date", "owner", "place", "author_id", "author_name"]
+# One page of the objects CULTURAL_OBJECTS_QUERY returns: the same conditions, ordered
+CULTURAL_OBJECTS_PAGE = """
+        {
+            SELECT DISTINCT ?cultural_object WHERE {
+                ?cultural_object rdf:type ?page_type ;
+                    schema:name ?page_title ;
+                    schema:creator ?page_author .
+                ?page_author schema:identifier ?page_author_id ;
+                    rdfs:label ?page_author_name .
+                FILTER(?page_type IN """ + HERITAGE_TYPE_FILTER + """)
+                FILTER(?page_author_name != "NaN")
+                FILTER(?page_author_id != "NaN")
+            }
+            ORDER BY ?cultural_object LIMIT %(limit)d OFFSET %(offset)d
+        }"""
+# The objects with the given identifiers (a list of SPARQL literals), for %(page)s
+CULTURAL_OBJECTS_BY_ID = """
+        {
+            VALUES ?page_id { %(ids)s }
+            ?cultural_object schema:identifier ?page_id .
+        }"""
+# Identifiers sent in one VALUES clause; longer lists are split over several queries
+ID_FILTER_BATCH_SIZE = 500
+# The authors of the objects with the given identifiers (a list of SPARQL literals)
+AUTHORS_BY_OBJECT_QUERY = """
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX schema: <https://schema.org/>
+
+        SELECT ?object_id ?id ?name
+        WHERE {
+            VALUES ?object_id { %(ids)s }
+            ?entity schema:identifier ?object_id .
+            ?entity schema:creator ?Author .
+            ?Author rdfs:label ?name .
+            ?Author schema:identifier ?id .
+        }
+        """
+PEOPLE_PAGE_QUERY = """
+        PREFIX schema: <https://schema.org/>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+
+        SELECT DISTINCT ?id ?name
+        WHERE {
+            ?entity schema:creator ?Author .
+            ?Author rdfs:label ?name .
+            ?Author schema:identifier ?id .
+        }
+        ORDER BY ?id ?name LIMIT %(limit)d OFFSET %(offset)d
+        """
+# The authors of the object with the given identifier, with its title
+ENTITY_BY_ID_QUERY = """
+        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX schema: <https://schema.org/>
+
+        SELECT ?identifier ?name ?title
+        WHERE {
+            ?entity schema:identifier "%(id)s" .
+            ?entity schema:creator ?Author .
+            ?Author rdfs:label ?name .
+            ?Author schema:identifier ?identifier .
+            ?entity schema:name ?title
+        }
+        """
+PEOPLE_QUERY = """
+        PREFIX schema: <https://schema.org/>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        
+        SELECT ?id ?name
+        WHERE {
+            ?entity schema:creator ?Author .
+            ?Author rdfs:label ?name .
+            ?Author schema:identifier ?id .
+        }
+        """
+AUTHORS_OF_OBJECT_QUERY = """
+        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX schema: <https://schema.org/>
+
+        SELECT ?id ?name
+        WHERE {
+            ?entity schema:identifier "%(id)s" .
+            ?entity schema:creator ?Author .
+            ?Author rdfs:label ?name .
+            ?Author schema:identifier ?id .
+        }
+        """
+# The objects sharing an author with the person with the given identifier
+OBJECTS_AUTHORED_BY_QUERY = """
+        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX schema: <https://schema.org/>
+
+        SELECT ?object ?type_name ?id ?title ?date ?owner ?place ?name ?author_id
+            WHERE {
+            ?entity schema:identifier "%(id)s" .
+            ?entity schema:creator ?Author .
+            ?object schema:creator ?Author .
+            ?object rdf:type ?type .
+            ?object schema:name ?title .
+            ?object schema:identifier ?id .
+            ?object schema:dateCreated ?date .
+            ?object schema:provider ?owner .
+            ?object schema:contentLocation ?place .
+            OPTIONAL {
+                ?object schema:creator ?Author .
+                ?Author rdfs:label ?name .
+                ?Author schema:identifier ?author_id .
+            }
+            BIND(REPLACE(STR(?type), "https://schema.org/", "") AS ?type_name)
+            FILTER(?type IN """ + HERITAGE_TYPE_FILTER + """)
+            }
+            """
+
+
+def create_activity_schema(c):
+    for statement in ACTIVITY_SCHEMA:
+        c.execute(statement)
+
+
+def next_activity_id(c) -> int:
+    return c.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM activity").fetchone()[0]
+
+
+def normalized_activity_rows(item, ids):
+    """
+    Yields (statement, row) pairs storing one process data object in the activity schema.
+
+    `ids` is an iterator of free activity ids (e.g. itertools.count(next_activity_id(c))).
+    """
+    object_id = item["object id"]
+    for key, table in ACTIVITY_TABLES.items():
+        activity = item.get(key, {})
+        activity_id = next(ids)
+        yield ACTIVITY_INSERT, (
+            activity_id,
+            object_id,
+            table,
+            activity.get("responsible institute"),
+            activity.get("responsible person"),
+            activity.get("technique"),
+            activity.get("start date"),
+            activity.get("end date"),
+        )
+        tools = activity.get("tool") or []
+        if isinstance(tools, str):
+            tools = [tools]
+        for position, tool in enumerate(tools):
+            yield ACTIVITY_TOOL_INSERT, (activity_id, position, tool)
+
+
+def has_table(c, name: str) -> bool:
+    return c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def migrate_to_activity_schema(db_file: str, drop_tables: bool = False, batch_size: int = INGEST_BATCH_SIZE) -> int:
+    """
+    Copies the rows of the per-type activity tables into the activity schema.
+
+    The comma-joined tool strings are split into activity_tool rows. Databases that
+    already contain activities are left untouched, so the migration can run on every
+    start-up.
+
+    Args:
+        db_file (str): Path of the SQLite database to migrate.
+        drop_tables (bool): Drop the per-type tables once their rows are copied.
+        batch_size (int): Rows read and written per executemany call.
+
+    Returns:
+        int: Number of activities copied.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    migrated = 0
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN")
+        create_activity_schema(c)
+        if c.execute("SELECT 1 FROM activity LIMIT 1").fetchone() is None:
+            ids = itertools.count(next_activity_id(c))
+            for table in ACTIVITY_TABLES.values():
+                if not has_table(c, table):
+                    continue
+                technique = "technique" if table == "Acquisition" else "NULL"
+                source = conn.execute(
+                    f"SELECT object_id, responsible_institute, responsible_person, {technique}, "
+                    f"tool, start_date, end_date FROM {table} ORDER BY rowid"
+                )
+                while True:
+                    rows = source.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    activities, tools = [], []
+                    for object_id, institute, person, tech, tool, start, end in rows:
+                        activity_id = next(ids)
+                        activities.append((activity_id, object_id, table, institute, person, tech, start, end))
+                        if tool:
+                            tools += [(activity_id, i, t) for i, t in enumerate(tool.split(", "))]
+                    c.executemany(ACTIVITY_INSERT, activities)
+                    c.executemany(ACTIVITY_TOOL_INSERT, tools)
+                    migrated += len(activities)
+        if drop_tables:
+            for table in ACTIVITY_TABLES.values():
+                c.execute(f"DROP TABLE IF EXISTS {table}")
+        c.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return migrated
+
+
+# Interval index over the dates of the activity schema: an R*Tree holding every activity
+# as a point (start day, end day), days being Julian day numbers. A missing date (NULL) or
+# one that is not an ISO date spans its whole axis instead, so, as with NULL in SQL, no
+# condition on it holds. An empty date sorts before every day, as it does as text, so the
+# results match those of comparing the date columns. Date conditions then become range
+# searches in the tree instead of string comparisons over the table.
+ACTIVITY_PERIOD_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS activity_period USING rtree_i32(id, start_min, start_max, end_min, end_max)"
+)
+PERIOD_DAY_SQL = (
+    "CASE WHEN %(column)s = '' THEN -2147483648 WHEN %(column)s GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' "
+    "THEN CAST(julianday(substr(%(column)s, 1, 10)) AS INTEGER) END"
+)
+ACTIVITY_PERIOD_INSERT = """INSERT INTO activity_period (id, start_min, start_max, end_min, end_max)
+    SELECT id, COALESCE(start_day, -2147483648), COALESCE(start_day, 2147483647),
+        COALESCE(end_day, -2147483648), COALESCE(end_day, 2147483647)
+    FROM (SELECT id, %s AS start_day, %s AS end_day FROM activity""" % (
+    PERIOD_DAY_SQL % {"column": "start_date"}, PERIOD_DAY_SQL % {"column": "end_date"},
+)
+ACTIVITY_PERIOD_FILL = ACTIVITY_PERIOD_INSERT + " WHERE id >= ?)"  # Index the activities added from an id on
+ACTIVITY_PERIOD_REFRESH = ACTIVITY_PERIOD_INSERT + " WHERE id = ?)"  # Index one activity again
+JULIAN_DAY_OFFSET = 1721424  # Julian day number of a date minus its proleptic Gregorian ordinal
+# Date conditions of the process queries: on the interval index and on the date columns,
+# with their parameters in the same order
+ACTIVITY_PERIOD_CONDITIONS = {
+    "started_after": ("start_min >= ?", "start_date >= ?"),  # (start)
+    "ended_before": ("end_max <= ?", "end_date <= ?"),  # (end)
+    "overlapping": ("start_max <= ? AND end_min >= ?", "start_date <= ? AND end_date >= ?"),  # (end, start)
+    "contained": ("start_min >= ? AND end_max <= ?", "start_date >= ? AND end_date <= ?"),  # (start, end)
+}
+
+
+def period_day(value) -> Optional[int]:
+    # The Julian day number of an ISO date (as stored in the interval index), None for other values
+    try:
+        return datetime.date.fromisoformat(str(value)[:10]).toordinal() + JULIAN_DAY_OFFSET
+    except ValueError:
+        return None
+
+
+def index_activity_periods(c, first_id: int = 0):
+    """
+    Adds the activities from `first_id` on to the interval index, creating it if needed.
+    A newly created index gets every activity.
+    """
+    if not has_table(c, "activity_period"):
+        c.execute(ACTIVITY_PERIOD_SCHEMA)
+        first_id = 0
+    c.execute(ACTIVITY_PERIOD_FILL, (first_id,))
+
+
+def build_activity_periods(db_file: str) -> int:
+    """
+    Creates (or rebuilds) the interval index of an activity-schema database.
+
+    ProcessDataUploadHandler builds it at ingest and keeps it up to date;
+    ProcessDataQueryHandler uses it for all its date conditions.
+
+    Returns:
+        int: Number of activities indexed.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN")
+        create_activity_schema(c)
+        c.execute("DROP TABLE IF EXISTS activity_period")
+        index_activity_periods(c)
+        indexed = c.execute("SELECT COUNT(*) FROM activity_period").fetchone()[0]
+        c.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return indexed
+
+
+# Substring index over the text columns of the activity schema. The trigram tokenizer
+# lets FTS5 answer LIKE '%x%' from the index instead of scanning every row.
+ACTIVITY_FTS_SCHEMA = """CREATE VIRTUAL TABLE IF NOT EXISTS activity_fts USING fts5(
+        responsible_person, responsible_institute, tool, technique,
+        tokenize = 'trigram'
+    )"""
+ACTIVITY_FTS_INSERT = """INSERT INTO activity_fts (rowid, responsible_person, responsible_institute, tool, technique)
+    SELECT a.id, a.responsible_person, a.responsible_institute,
+        (SELECT group_concat(tool, ', ') FROM
+            (SELECT tool FROM activity_tool WHERE activity_id = a.id ORDER BY position)),
+        a.technique
+    FROM activity a"""
+ACTIVITY_FTS_FILL = ACTIVITY_FTS_INSERT + " WHERE a.id >= ?"  # Index the activities added from an id on
+ACTIVITY_FTS_REFRESH = ACTIVITY_FTS_INSERT + " WHERE a.id = ?"  # Index one activity again
+
+
+def index_activity_text(c, first_id: int = 0):
+    """
+    Adds the activities from `first_id` on to the full-text index, creating it if needed.
+    A newly created index gets every activity, so rows stored before it was enabled are
+    still found by the text filters.
+    """
+    if not has_table(c, "activity_fts"):
+        c.execute(ACTIVITY_FTS_SCHEMA)
+        first_id = 0
+    c.execute(ACTIVITY_FTS_FILL, (first_id,))
+
+
+def build_activity_fts(db_file: str) -> int:
+    """
+    Creates (or rebuilds) the full-text index of an activity-schema database.
+
+    Once the index exists, ProcessDataUploadHandler keeps it up to date and
+    ProcessDataQueryHandler uses it for person, institute, tool and technique lookups.
+
+    Returns:
+        int: Number of activities indexed.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN")
+        create_activity_schema(c)
+        c.execute(ACTIVITY_FTS_SCHEMA)
+        c.execute("DELETE FROM activity_fts")
+        c.execute(ACTIVITY_FTS_FILL, (0,))
+        indexed = c.execute("SELECT COUNT(*) FROM activity_fts").fetchone()[0]
+        c.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return indexed
+
+
+# Incremental ingestion. The manifest records, for every (object id, activity type)
+# block loaded, the activity it is stored as and a hash of its content, so loading a
+# file again only writes the blocks that are new or changed.
+ACTIVITY_MANIFEST_SCHEMA = """CREATE TABLE IF NOT EXISTS activity_manifest (
+        object_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        activity_id INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        PRIMARY KEY (object_id, type)
+    ) WITHOUT ROWID"""
+ACTIVITY_MANIFEST_UPSERT = """INSERT INTO activity_manifest (object_id, type, activity_id, hash) VALUES (?, ?, ?, ?)
+    ON CONFLICT (object_id, type) DO UPDATE SET activity_id = excluded.activity_id, hash = excluded.hash"""
+ACTIVITY_UPDATE = (
+    "UPDATE activity SET responsible_institute = ?, responsible_person = ?, technique = ?, "
+    "start_date = ?, end_date = ? WHERE id = ?"
+)
+
+
+def activity_block_hash(activity: dict) -> str:
+    # A digest of one activity block, independent of the order of its keys
+    encoded = json.dumps(activity, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+# Columnar snapshots of the process data. export_activity_parquet writes the activities
+# to a directory of Parquet files, partitioned by type and start year (Hive style, e.g.
+# type=Acquisition/start_year=2023/), with the repetitive text columns dictionary-encoded
+# and the tools kept as a list per activity. A ProcessDataQueryHandler whose dbPathOrUrl is
+#
+#     parquet:///path/to/snapshot
+#
+# answers its queries from the snapshot, reading only the partitions and columns a query
+# needs from memory-mapped files. pyarrow is only needed for these snapshots.
+PARQUET_SCHEME = "parquet"
+PARQUET_BATCH_SIZE = 65536  # Rows read from the database and written at a time
+PARQUET_ROW_GROUP_SIZE = 1 << 17  # Rows per Parquet row group (fewer in the last group of a file)
+PARQUET_DICTIONARY_COLUMNS = ("responsible_institute", "responsible_person", "technique")
+ACTIVITY_EXPORT_SELECT = """SELECT a.object_id, a.responsible_institute, a.responsible_person, a.technique,
+        (SELECT json_group_array(tool) FROM
+            (SELECT tool FROM activity_tool WHERE activity_id = a.id ORDER BY position)),
+        a.start_date, a.end_date, a.type
+    FROM activity a ORDER BY a.id"""
+TABLES_ACTIVITY_EXPORT_SELECT = " UNION ALL ".join(
+    f"SELECT object_id, responsible_institute, responsible_person, "
+    f"{'technique' if 'technique' in columns else 'NULL'}, tool, start_date, end_date, '{table}' FROM {table}"
+    for table, columns in ACTIVITY_COLUMNS.items()
+)
+# Columns of the process query results, and the stored columns they are read from
+ACTIVITY_RESULT_COLUMNS = [
+    "object_id", "responsible_institute", "responsible_person", "technique", "tool", "start_date", "end_date", "type",
+]
+
+
+def require_pyarrow():
+    # pyarrow and its dataset and compute modules, imported on first use
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.fs
+    except ImportError:
+        raise ImportError("Parquet snapshots need the pyarrow package") from None
+    return pyarrow, pyarrow.dataset, pyarrow.compute
+
+
+def activity_parquet_schema():
+    pa = require_pyarrow()[0]
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("object_id", pa.string()),
+        ("responsible_institute", text),
+        ("responsible_person", text),
+        ("technique", text),
+        ("tool", pa.list_(text)),
+        ("start_date", pa.string()),
+        ("end_date", pa.string()),
+        ("type", pa.string()),
+        ("start_year", pa.int32()),
+    ])
+
+
+def activity_parquet_partitioning():
+    pa, ds, _ = require_pyarrow()
+    return ds.partitioning(pa.schema([("type", pa.string()), ("start_year", pa.int32())]), flavor="hive")
+
+
+def parquet_snapshot_path(url: str) -> Optional[str]:
+    # The directory of a parquet: URL (parquet:path or parquet://path), None for other paths
+    scheme, separator, rest = (url or "").partition(":")
+    if not separator or scheme.lower() != PARQUET_SCHEME:
+        return None
+    return rest[2:] if rest.startswith("//") else rest
+
+
+def export_activity_parquet(db_file: str, directory: str, batch_size: int = PARQUET_BATCH_SIZE) -> dict:
+    """
+    Writes the activities of a process database to a partitioned Parquet snapshot.
+
+    Either storage schema can be exported. Rows are read from the database and written
+    `batch_size` at a time. The snapshot is written next to `directory` and only replaces
+    it once complete, so readers never see a half-written one; the old snapshot is moved
+    aside and deleted after the new one is in place.
+
+    Args:
+        db_file (str): Path of the SQLite database.
+        directory (str): Directory of the snapshot, replaced if it exists.
+
+    Returns:
+        dict: Number of activities and files written, and elapsed seconds.
+    """
+    pa, ds, _ = require_pyarrow()
+    schema = activity_parquet_schema()
+    started = time.perf_counter()
+    rows = 0
+
+    # pyarrow pulls the batches from one of its own threads
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_file))}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        if has_table(conn, "activity"):
+            cursor = conn.execute(ACTIVITY_EXPORT_SELECT)
+            split_tools = json.loads
+        else:
+            cursor = conn.execute(TABLES_ACTIVITY_EXPORT_SELECT)
+
+            def split_tools(tools):
+                return tools.split(", ") if tools else []
+
+        def batches():
+            nonlocal rows
+            while True:
+                page = cursor.fetchmany(batch_size)
+                if not page:
+                    return
+                rows += len(page)
+                object_ids, institutes, people, techniques, tools, starts, ends, types = zip(*page)
+                tool_lists = [split_tools(value) for value in tools]
+                offsets = list(itertools.accumulate((len(value) for value in tool_lists), initial=0))
+                flat_tools = pa.array(list(itertools.chain.from_iterable(tool_lists)), pa.string())
+                yield pa.RecordBatch.from_arrays([
+                    pa.array(object_ids, pa.string()),
+                    pa.array(institutes, pa.string()).dictionary_encode(),
+                    pa.array(people, pa.string()).dictionary_encode(),
+                    pa.array(techniques, pa.string()).dictionary_encode(),
+                    pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), flat_tools.dictionary_encode()),
+                    pa.array(starts, pa.string()),
+                    pa.array(ends, pa.string()),
+                    pa.array(types, pa.string()),
+                    pa.array([int(d[:4]) if d and d[:4].isdigit() else None for d in starts], pa.int32()),
+                ], schema=schema)
+
+        partial = directory.rstrip(os.sep) + ".partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        written = []
+        ds.write_dataset(
+            batches(), partial, schema=schema, format="parquet", partitioning=activity_parquet_partitioning(),
+            min_rows_per_group=PARQUET_ROW_GROUP_SIZE, max_rows_per_group=PARQUET_ROW_GROUP_SIZE, file_visitor=lambda f: written.append(f.path),
+        )
+    finally:
+        conn.close()
+
+    # Move the old snapshot aside rather than deleting it first, so a failed swap loses
+    # nothing and there is no moment with neither snapshot in place
+    previous = None
+    if os.path.isdir(directory):
+        previous = directory.rstrip(os.sep) + ".old"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(directory, previous)
+    try:
+        os.replace(partial, directory)
+    except OSError:
+        if previous is not None:
+            os.replace(previous, directory)
+        raise
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+
+    elapsed = time.perf_counter() - started
+    logger.info("Exported %d activities to %d Parquet files in %.3fs.", rows, len(written), elapsed,
+                extra={"activities": rows, "files": len(written), "seconds": elapsed})
+    return {"activities": rows, "files": len(written), "seconds": elapsed}
+
+
+def read_activity_parquet(directory: str, columns: Optional[List[str]] = None, filter=None) -> pd.DataFrame:
+    """
+    Reads activities from a Parquet snapshot, memory-mapping its files.
+
+    Args:
+        directory (str): Directory written by export_activity_parquet.
+        columns (list, optional): Columns to read (including the partition columns type
+            and start_year); all of them by default. Other columns are not read at all.
+        filter (pyarrow.dataset.Expression, optional): Rows to keep. Conditions on type and
+            start_year skip whole partitions, the others are checked against the row group
+            statistics before rows are read.
+
+    Returns:
+        pd.DataFrame: The rows, with the dictionary-encoded columns decoded to strings and
+            the tools as lists.
+    """
+    table = open_activity_parquet(directory).to_table(columns=columns, filter=filter)
+    return decode_activity_table(table).to_pandas()
+
+
+def open_activity_parquet(directory: str):
+    pa, ds, _ = require_pyarrow()
+    return ds.dataset(directory, format="parquet", partitioning=activity_parquet_partitioning(),
+                      filesystem=pa.fs.LocalFileSystem(use_mmap=True))
+
+
+def substring_rows(column, value: str):
+    """
+    Returns the indices of the rows of a dictionary-encoded column (or of a column of lists
+    of dictionary-encoded values) holding a value that contains `value`, ignoring case like
+    SQL's LIKE. Each distinct value of a chunk is only matched once.
+    """
+    pa, _, pc = require_pyarrow()
+    rows, offset = [], 0
+    for chunk in column.chunks:
+        parents = None
+        values = chunk
+        if pa.types.is_list(chunk.type):
+            values = pc.list_flatten(chunk)
+            parents = pc.list_parent_indices(chunk)
+        matches = pc.match_substring(values.dictionary, value, ignore_case=True)
+        hits = pc.indices_nonzero(pc.fill_null(pc.take(matches, values.indices), False))
+        if parents is not None:
+            hits = pc.unique(pc.take(parents, hits))
+        rows.append(pc.add(hits.cast(pa.int64()), offset))
+        offset += len(chunk)
+    return pa.concat_arrays(rows) if rows else pa.array([], pa.int64())
+
+
+def decode_activity_table(table):
+    # The table with its dictionary-encoded columns cast back to plain strings
+    pa = require_pyarrow()[0]
+    for name in PARQUET_DICTIONARY_COLUMNS:
+        if name in table.column_names:
+            position = table.column_names.index(name)
+            table = table.set_column(position, name, table.column(name).cast(pa.string()))
+    if "tool" in table.column_names:
+        position = table.column_names.index("tool")
+        table = table.set_column(position, "tool", table.column("tool").cast(pa.list_(pa.string())))
+    return table
+
+
+# Connection pooling for the relational database. Pools are shared by every
+# ProcessDataQueryHandler pointing at the same file.
+SQLITE_POOL_SIZE = 4
+SQLITE_POOL_IDLE_TIMEOUT = 300.0  # Seconds an unused connection is kept open
+SQLITE_STATEMENT_CACHE_SIZE = 256  # Prepared statements cached per connection
+DEFAULT_PROCESS_DB = "json.db"
+# Read-only serving. The database file is opened as immutable and memory-mapped, and is
+# replaced by renaming a new file over it (os.replace), which the pools notice by its
+# inode and modification time at most every SQLITE_SWAP_CHECK_INTERVAL seconds.
+SQLITE_SWAP_CHECK_INTERVAL = 1.0
+
+
+def sqlite_file_identity(path: str) -> Optional[tuple]:
+    # What changes when the file at `path` is replaced, None if there is no file
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class SQLiteConnectionPool(object):
+    """
+    A thread-safe pool of read-only SQLite connections to one database file.
+
+    At most `size` connections are open at the same time; callers asking for more wait
+    until one is released. Connections idle for longer than `idle_timeout` seconds are
+    closed the next time the pool is used. Each connection keeps its own cache of
+    prepared statements, so repeated queries skip parsing and planning.
+
+    A serving pool opens the file as immutable, so SQLite takes no locks and never checks
+    it for changes, and memory-maps all of it, so reads are served from the page cache of
+    the operating system, shared by every connection, instead of being copied into each
+    connection's cache. The statements returned by `statements` (given the names of the
+    tables in the database) are prepared on every new connection.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = SQLITE_POOL_SIZE,
+        idle_timeout: float = SQLITE_POOL_IDLE_TIMEOUT,
+        serving: bool = False,
+        statements=None,
+    ):
+        self.db_path = os.path.abspath(db_path)
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.serving = serving
+        self.statements = statements
+        self.identity = sqlite_file_identity(self.db_path) if serving else None
+        self._checked = time.monotonic()
+        self._tables = None
+        self._idle = []  # (connection, time it was released), most recent last
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        # Close the idle connections; busy ones are closed when released
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                conn.close()
+                self._open -= 1
+            self._idle = []
+            self._cond.notify_all()
+
+    def widen(self, size: int, idle_timeout: float):
+        # Grow the pool to at least `size` connections kept for at least `idle_timeout` seconds
+        with self._cond:
+            if size > self.size:
+                self.size = size
+                self._cond.notify_all()  # Callers waiting for a connection may open one now
+            self.idle_timeout = max(self.idle_timeout, idle_timeout)
+
+    def prepare(self, count: Optional[int] = None):
+        # Open (and warm up) up to `count` connections now instead of on first use
+        with self._cond:
+            count = min(self.size, count or self.size) - self._open
+        conns = []
+        try:
+            for _ in range(max(count, 0)):
+                conns.append(self._acquire())
+        finally:
+            for conn in conns:
+                self._release(conn)
+
+    def tables(self) -> set:
+        # Names of the tables in the database; a serving pool only reads them once
+        if self._tables is not None:
+            return self._tables
+        with self.connection() as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if self.serving:
+            self._tables = tables
+        return tables
+
+    def stale(self) -> bool:
+        # Whether the file of a serving pool has been replaced since the pool was created;
+        # checked under the lock, so only one of several concurrent callers sees the swap
+        if not self.serving:
+            return False
+        with self._cond:
+            if time.monotonic() - self._checked < SQLITE_SWAP_CHECK_INTERVAL:
+                return False
+            self._checked = time.monotonic()
+            identity = sqlite_file_identity(self.db_path)
+            return identity is not None and identity != self.identity
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = "file:" + quote(self.db_path) + ("?mode=ro&immutable=1" if self.serving else "?mode=ro")
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,  # Connections are handed from thread to thread
+            cached_statements=SQLITE_STATEMENT_CACHE_SIZE,
+        )
+        if self.serving:
+            try:
+                conn.execute(f"PRAGMA mmap_size = {self.identity[2] if self.identity else 0}")
+                if self.statements is not None:
+                    self._warm_up(conn)
+            except BaseException:
+                conn.close()
+                raise
+        return conn
+
+    def _warm_up(self, conn: sqlite3.Connection):
+        """
+        Prepares the pool's statements on a new connection, so they are in its statement
+        cache, already parsed and planned, when the first query arrives. A progress
+        handler stops each statement before its first step, so no rows are read.
+        """
+        if self._tables is None:
+            self._tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.set_progress_handler(lambda: 1, 1)
+        try:
+            for statement in self.statements(self._tables):
+                try:
+                    conn.execute(statement, (None,) * statement.count("?")).close()
+                except sqlite3.OperationalError:
+                    pass  # Interrupted
+        finally:
+            conn.set_progress_handler(None, 1)
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError(f"Connection pool for {self.db_path} is closed")
+                self._evict_idle()
+                if self._idle:
+                    return self._idle.pop()[0]
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                self._cond.wait()
+        try:
+            return self._connect()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            if self._closed:
+                conn.close()
+                self._open -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _evict_idle(self):
+        # Close connections that have not been used within the idle timeout
+        deadline = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < deadline:
+            self._idle.pop(0)[0].close()
+            self._open -= 1
+
+
+_sqlite_pools = {}
+_sqlite_pools_lock = threading.Lock()
+
+
+def get_sqlite_pool(
+    db_path: str,
+    size: int = SQLITE_POOL_SIZE,
+    idle_timeout: float = SQLITE_POOL_IDLE_TIMEOUT,
+    serving: bool = False,
+    statements=None,
+) -> SQLiteConnectionPool:
+    """
+    Returns the pool for a database file, creating it on first use. Serving pools are
+    kept apart from the others; once their file has been replaced, the next call returns
+    a new pool on the new file and the old one is closed as its queries finish.
+
+    Every handler of a file shares its pool. When handlers ask for different settings the
+    pool takes the largest: it grows to the biggest `size` and keeps idle connections for
+    the longest `idle_timeout` any caller asked for.
+    """
+    path = os.path.abspath(db_path)
+    key = (path, serving)
+    with _sqlite_pools_lock:
+        pool = _sqlite_pools.get(key)
+        if pool is not None and pool.stale():
+            logger.info("Database %s was replaced, reopening it.", path)
+            pool.close()
+            pool = None
+        if pool is None or pool._closed:
+            pool = _sqlite_pools[key] = SQLiteConnectionPool(path, size, idle_timeout, serving, statements)
+        else:
+            pool.widen(size, idle_timeout)
+        return pool
+
+
+def close_sqlite_pools():
+    # Close every pool, e.g. before replacing a database file
+    with _sqlite_pools_lock:
+        for pool in _sqlite_pools.values():
+            pool.close()
+        _sqlite_pools.clear()
+
+
+# HTTP connections to SPARQL endpoints. All requests to a host go through one shared
+# requests.Session, so connections are kept alive and reused by later queries and
+# upload chunks instead of being opened for every request.
+SPARQL_POOL_SIZE = 10  # Connections kept open per endpoint host
+SPARQL_CONNECT_TIMEOUT = 10.0  # Seconds to wait for a connection to be established
+SPARQL_QUERY_TIMEOUT = 300.0  # Seconds to wait for the result of a query
+
+_http_sessions = {}  # scheme://host:port -> requests.Session
+_http_session_sizes = {}  # scheme://host:port -> pool size of the session's adapter
+_http_sessions_lock = threading.Lock()
+
+
+def get_http_session(endpoint: str, pool_size: int = SPARQL_POOL_SIZE) -> requests.Session:
+    """
+    Returns the session shared by every request to the host of `endpoint`, creating it on
+    first use with a pool of `pool_size` keep-alive connections. A caller asking for a
+    larger pool than the session has gets it: a wider adapter is mounted, and requests
+    already running finish on the old one. Responses may be compressed with gzip or
+    deflate; requests decompresses them transparently.
+    """
+    parts = urlsplit(endpoint)
+    key = f"{parts.scheme}://{parts.netloc}"
+    with _http_sessions_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            session = _http_sessions[key] = requests.Session()
+            session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        if pool_size > _http_session_sizes.get(key, 0):
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session_sizes[key] = pool_size
+        return session
+
+
+def close_http_sessions():
+    # Close every shared session and its connections
+    with _http_sessions_lock:
+        for session in _http_sessions.values():
+            session.close()
+        _http_sessions.clear()
+        _http_session_sizes.clear()
+
+
+# Formats a SPARQL SELECT result can be requested in. CSV is the most compact and is
+# parsed by pandas' C reader straight from the connection; JSON keeps the datatype of
+# each value, which read_sparql_json turns into typed columns.
+SPARQL_RESULT_FORMATS = {
+    "csv": "text/csv",
+    "json": "application/sparql-results+json",
+}
+XSD = "http://www.w3.org/2001/XMLSchema#"
+XSD_INTEGER_TYPES = {XSD + name for name in (
+    "integer", "int", "long", "short", "byte", "nonNegativeInteger", "positiveInteger", "nonPositiveInteger",
+    "negativeInteger", "unsignedLong", "unsignedInt", "unsignedShort", "unsignedByte",
+)}
+XSD_FLOAT_TYPES = {XSD + "decimal", XSD + "double", XSD + "float"}
+
+
+@timed_stage("parse")
+def read_sparql_csv(stream) -> pd.DataFrame:
+    # Parse CSV results from a binary file-like object, as sparql_dataframe did from a string
+    return pd.read_csv(stream, sep=",", encoding="utf-8")
+
+
+def sparql_json_value(term: dict):
+    # The Python value of one term of a SPARQL JSON result
+    value = term["value"]
+    kind = term["type"]
+    if kind == "bnode":
+        return "_:" + value  # As the CSV results write blank nodes
+    datatype = term.get("datatype")
+    if datatype is None or kind == "uri":
+        return value
+    try:
+        if datatype in XSD_INTEGER_TYPES:
+            return int(value)
+        if datatype in XSD_FLOAT_TYPES:
+            return float(value)
+        if datatype == XSD + "boolean":
+            return value in ("true", "1")
+    except ValueError:
+        pass  # An ill-typed literal keeps its lexical form
+    return value
+
+
+@timed_stage("parse")
+def read_sparql_json(payload: bytes) -> pd.DataFrame:
+    """
+    Parses SPARQL JSON results into a DataFrame with one typed column per variable.
+
+    Numeric and boolean literals become numbers and booleans according to their XSD
+    datatype; everything else, including plain literals that look like numbers, stays a
+    string. Unbound values are missing (NaN). Uses orjson when it is installed.
+    """
+    document = orjson.loads(payload) if orjson is not None else json.loads(payload)
+    variables = document["head"]["vars"]
+    bindings = document["results"]["bindings"]
+    columns = {}
+    for variable in variables:
+        column = columns[variable] = []
+        append = column.append
+        for binding in bindings:
+            term = binding.get(variable)
+            if term is None:
+                append(None)
+            elif term["type"] == "literal" and "datatype" not in term:
+                append(term["value"])  # Plain literals, the common case
+            else:
+                append(sparql_json_value(term))
+    return pd.DataFrame(columns, columns=variables)
+
+
+def sparql_select(
+    endpoint: str,
+    query: str,
+    timeout: float = SPARQL_QUERY_TIMEOUT,
+    pool_size: int = SPARQL_POOL_SIZE,
+    result_format: str = "csv",
+) -> pd.DataFrame:
+    """
+    Runs a SELECT query on a SPARQL endpoint and returns its results as a DataFrame.
+
+    The query is posted directly. With `result_format` "csv" (the default) the results are
+    parsed by pandas while they are read from the connection, giving the same DataFrames
+    as sparql_dataframe without holding the response body in memory; with "json" they are
+    decoded by read_sparql_json into typed columns.
+    """
+    if result_format not in SPARQL_RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {result_format}")
+    data = query.encode("utf-8")
+    with stage_timer("sparql"):
+        response = get_http_session(endpoint, pool_size).post(
+            endpoint,
+            data=data,
+            headers={
+                "Content-Type": "application/sparql-query; charset=utf-8",
+                "Accept": SPARQL_RESULT_FORMATS[result_format],
+            },
+            timeout=(SPARQL_CONNECT_TIMEOUT, timeout),
+            stream=True,
+        )
+    count_metric("bytes_total", len(data), direction="sent")
+    with response:
+        response.raise_for_status()
+        # Decode what the endpoint sent, which is not always what was asked for
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type in ("application/sparql-results+json", "application/json"):
+            with stage_timer("sparql"):
+                payload = response.content
+            count_metric("bytes_total", len(payload), direction="received")
+            return read_sparql_json(payload)
+        response.raw.decode_content = True  # Undo gzip or deflate while reading
+        df = read_sparql_csv(response.raw)  # Times the transfer of the body as parsing
+        count_metric("bytes_total", response.raw.tell(), direction="received")
+        return df
+
+
+# HTTP connections for the asyncio query handlers. With aiohttp installed, each event
+# loop gets one ClientSession per endpoint host, with its own pool of keep-alive
+# connections; without it, queries run sparql_select in the loop's default executor.
+_async_http_sessions = weakref.WeakKeyDictionary()  # event loop -> {scheme://host:port: aiohttp.ClientSession}
+
+
+def get_async_http_session(endpoint: str, pool_size: int = SPARQL_POOL_SIZE):
+    """
+    Returns the aiohttp session shared by the requests the running event loop sends to the
+    host of `endpoint`, creating it on first use with at most `pool_size` connections.
+    """
+    if aiohttp is None:
+        raise ImportError("The async HTTP client needs aiohttp: pip install aiohttp")
+    parts = urlsplit(endpoint)
+    key = f"{parts.scheme}://{parts.netloc}"
+    sessions = _async_http_sessions.setdefault(asyncio.get_running_loop(), {})
+    session = sessions.get(key)
+    if session is None or session.closed:
+        session = sessions[key] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=pool_size),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+    return session
+
+
+async def close_async_http_sessions(endpoint: Optional[str] = None):
+    # Close the sessions of the running event loop and their connections; only the one of
+    # the host of `endpoint` if given. A later request opens a new session.
+    loop = asyncio.get_running_loop()
+    if endpoint is None:
+        sessions = list(_async_http_sessions.pop(loop, {}).values())
+    else:
+        parts = urlsplit(endpoint)
+        session = _async_http_sessions.get(loop, {}).pop(f"{parts.scheme}://{parts.netloc}", None)
+        sessions = [session] if session is not None else []
+    for session in sessions:
+        await session.close()
+
+
+async def sparql_select_async(
+    endpoint: str,
+    query: str,
+    timeout: float = SPARQL_QUERY_TIMEOUT,
+    pool_size: int = SPARQL_POOL_SIZE,
+    result_format: str = "csv",
+) -> pd.DataFrame:
+    """
+    Coroutine counterpart of sparql_select, giving the same DataFrames.
+
+    The query is sent with aiohttp when it is installed, and the response parsed in the
+    loop's default executor so large results do not hold up the event loop. Without
+    aiohttp the whole of sparql_select runs in the executor.
+    """
+    if result_format not in SPARQL_RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {result_format}")
+    loop = asyncio.get_running_loop()
+    if aiohttp is None:
+        return await loop.run_in_executor(None, sparql_select, endpoint, query, timeout, pool_size, result_format)
+    data = query.encode("utf-8")
+    metrics = _metrics
+    started = time.perf_counter()
+    async with get_async_http_session(endpoint, pool_size).post(
+        endpoint,
+        data=data,
+        headers={
+            "Content-Type": "application/sparql-query; charset=utf-8",
+            "Accept": SPARQL_RESULT_FORMATS[result_format],
+        },
+        timeout=aiohttp.ClientTimeout(total=timeout, connect=SPARQL_CONNECT_TIMEOUT),
+    ) as response:
+        response.raise_for_status()
+        content_type = response.content_type.lower()
+        payload = await response.read()  # Decompressed by aiohttp
+    if metrics is not None:
+        metrics.observe("stage_duration_seconds", time.perf_counter() - started, stage="sparql")
+        metrics.inc("bytes_total", len(data), direction="sent")
+        metrics.inc("bytes_total", len(payload), direction="received")
+    if content_type in ("application/sparql-results+json", "application/json"):
+        return await loop.run_in_executor(None, read_sparql_json, payload)
+    return await loop.run_in_executor(None, read_sparql_csv, io.BytesIO(payload))
+
+
+# Bulk loading into the triple store. Triples are sent as N-Triples in chunks, each
+# chunk in one HTTP request, instead of one SPARQL UPDATE per triple.
+SPARQL_UPLOAD_CHUNK_SIZE = 50000  # Triples per request
+SPARQL_UPLOAD_RETRIES = 3  # Extra attempts for a chunk after a failed request
+SPARQL_UPLOAD_BACKOFF = 0.5  # Seconds before the first retry, doubled after each one
+SPARQL_UPLOAD_TIMEOUT = 300.0  # Seconds to wait for the store to answer a request
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+NTRIPLES_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"})
+
+
+def ntriples_term(term) -> str:
+    # Serialize an rdflib term for N-Triples, which is also valid inside INSERT DATA
+    if isinstance(term, Literal):
+        text = '"' + str(term).translate(NTRIPLES_ESCAPES) + '"'
+        if term.language:
+            return f"{text}@{term.language}"
+        if term.datatype:
+            return f"{text}^^<{term.datatype}>"
+        return text
+    if isinstance(term, URIRef):
+        return f"<{term}>"
+    return term.n3()  # Blank nodes
+
+
+class SPARQLBulkLoader(object):
+    """
+    Sends triples to a SPARQL endpoint in as few HTTP requests as possible.
+
+    With format "sparql-update" each chunk is wrapped in an INSERT DATA request, which any
+    SPARQL 1.1 endpoint accepts. With format "ntriples" the chunk is posted as an RDF
+    document, which Blazegraph loads through its bulk insert API without parsing SPARQL.
+    Requests failing with a connection error or a transient status code are retried with
+    exponential backoff.
+    """
+
+    CONTENT_TYPES = {
+        "sparql-update": "application/sparql-update; charset=utf-8",
+        "ntriples": "text/plain; charset=utf-8",
+    }
+
+    def __init__(
+        self,
+        endpoint: str,
+        chunk_size: int = SPARQL_UPLOAD_CHUNK_SIZE,
+        retries: int = SPARQL_UPLOAD_RETRIES,
+        backoff: float = SPARQL_UPLOAD_BACKOFF,
+        format: str = "sparql-update",
+        timeout: float = SPARQL_UPLOAD_TIMEOUT,
+    ):
+        if format not in self.CONTENT_TYPES:
+            raise ValueError(f"Unknown upload format: {format}")
+        self.endpoint = endpoint
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.format = format
+        self.timeout = timeout
+        self.stats = {"triples": 0, "requests": 0, "retries": 0, "bytes": 0}
+
+    def load(self, triples) -> int:
+        # Send an iterable of (subject, predicate, object) terms; returns the number sent
+        sent = 0
+        chunk = []
+        for triple in triples:
+            chunk.append(triple)
+            if len(chunk) >= self.chunk_size:
+                sent += self.send(chunk)
+                chunk = []
+        if chunk:
+            sent += self.send(chunk)
+        return sent
+
+    def send(self, triples) -> int:
+        lines = "".join(f"{ntriples_term(s)} {ntriples_term(p)} {ntriples_term(o)} .\n" for s, p, o in triples)
+        self.post(self.wrap(lines))
+        self.stats["triples"] += len(triples)
+        return len(triples)
+
+    def wrap(self, lines: str) -> str:
+        if self.format == "sparql-update":
+            return "INSERT DATA {\n" + lines + "}"
+        return lines
+
+    def post(self, body: str, content_type: Optional[str] = None):
+        # POST one request body, retrying transient failures
+        data = body.encode("utf-8")
+        headers = {"Content-Type": content_type or self.CONTENT_TYPES[self.format]}
+        attempt = 0
+        while True:
+            try:
+                response = get_http_session(self.endpoint).post(
+                    self.endpoint, data=data, headers=headers, timeout=(SPARQL_CONNECT_TIMEOUT, self.timeout)
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    self.stats["requests"] += 1
+                    self.stats["bytes"] += len(data)
+                    count_metric("bytes_total", len(data), direction="sent")
+                    return response
+                error = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt >= self.retries:
+                raise error
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+            self.stats["retries"] += 1
+
+
+# Destinations for a stream of triples. Each sink consumes an iterable of
+# (subject, predicate, object) terms with write() and returns how many it took, so
+# a producer can hand it a generator and never hold the whole graph in memory.
+CSV_READ_CHUNK_SIZE = 10000  # CSV rows parsed at a time when streaming metadata
+AUTHOR_CACHE_SIZE = 10000  # Recently described authors remembered to skip repeated triples
+DEFAULT_METADATA_MANIFEST = "metadata_manifest.db"  # Rows last synced to each graph store, for delta mode
+META_CSV_DTYPES = {
+    "Id": "string",
+    "Type": "string",
+    "Title": "string",
+    "Date": "string",
+    "Author": "string",
+    "Owner": "string",
+    "Place": "string",
+}
+
+
+class GraphSink(object):
+    # Adds triples to an rdflib graph (an in-memory one unless a store-backed graph is given)
+
+    def __init__(self, graph: Optional[Graph] = None):
+        self.graph = graph if graph is not None else Graph()
+        self.count = 0
+
+    def write(self, triples) -> int:
+        added = 0
+        for triple in triples:
+            self.graph.add(triple)
+            added += 1
+        self.count += added
+        return added
+
+    def close(self):
+        pass
+
+
+class NTriplesFileSink(object):
+    # Appends triples to an N-Triples file, one line per triple
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8")
+        self.count = 0
+
+    def write(self, triples) -> int:
+        added = 0
+        for s, p, o in triples:
+            self.file.write(f"{ntriples_term(s)} {ntriples_term(p)} {ntriples_term(o)} .\n")
+            added += 1
+        self.count += added
+        return added
+
+    def close(self):
+        self.file.close()
+
+
+class SPARQLUploadSink(object):
+    # Uploads triples to a SPARQL endpoint through a SPARQLBulkLoader, one chunk at a time
+
+    def __init__(self, loader: SPARQLBulkLoader):
+        self.loader = loader
+        self.count = 0
+
+    def write(self, triples) -> int:
+        added = self.loader.load(triples)
+        self.count += added
+        return added
+
+    def close(self):
+        pass
+
+
+# Embedded triple stores, answering SPARQL in-process instead of over HTTP. A handler
+# whose dbPathOrUrl has one of these schemes uses the store at that path:
+#
+#     oxigraph:///path/to/dir     an Oxigraph store on disk (needs pyoxigraph)
+#     berkeleydb:///path/to/dir   an rdflib graph in a BerkeleyDB store (needs berkeleydb)
+#     rdflib:///path/to/file.nt   an rdflib graph in memory, persisted as an N-Triples file
+#
+# Any other dbPathOrUrl is the URL of a SPARQL endpoint.
+EMBEDDED_LOAD_CHUNK_SIZE = 50000  # Triples parsed into the store at a time
+
+
+class EmbeddedTripleStore(ABC):
+    """
+    A triple store living in this process. Query results are serialized by the store and
+    read by the same decoders as the results of a SPARQL endpoint, so handlers get the
+    same DataFrames whichever backend they use. Backends implement add, query_results and
+    update.
+    """
+
+    def __init__(self, url: str, path: str):
+        self.url = url
+        self.path = path
+
+    @abstractmethod
+    def add(self, triples) -> int:
+        # Add an iterable of (subject, predicate, object) terms; returns how many were read
+        ...
+
+    @abstractmethod
+    def query_results(self, query: str, result_format: str) -> bytes:
+        # The results of a SELECT query serialized in one of SPARQL_RESULT_FORMATS
+        ...
+
+    @abstractmethod
+    def update(self, update: str):
+        # Run a SPARQL update, such as DELETE DATA or INSERT DATA
+        ...
+
+    def query(self, query: str, result_format: str = "csv") -> pd.DataFrame:
+        with stage_timer("sparql"):
+            payload = self.query_results(query, result_format)
+        if result_format == "json":
+            return read_sparql_json(payload)
+        return read_sparql_csv(io.BytesIO(payload))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class OxigraphStore(EmbeddedTripleStore):
+    # An Oxigraph (RocksDB) store in the directory `path`
+
+    def __init__(self, url: str, path: str):
+        super().__init__(url, path)
+        try:
+            import pyoxigraph
+        except ImportError:
+            raise ImportError("The oxigraph:// store needs the pyoxigraph package") from None
+        self.oxigraph = pyoxigraph
+        self.store = pyoxigraph.Store(path)
+
+    def add(self, triples) -> int:
+        added = 0
+        triples = iter(triples)
+        for chunk in iter(lambda: list(itertools.islice(triples, EMBEDDED_LOAD_CHUNK_SIZE)), []):
+            lines = "".join(f"{ntriples_term(s)} {ntriples_term(p)} {ntriples_term(o)} .\n" for s, p, o in chunk)
+            self.store.load(input=lines, format=self.oxigraph.RdfFormat.N_TRIPLES)
+            added += len(chunk)
+        return added
+
+    def query_results(self, query: str, result_format: str) -> bytes:
+        formats = {"csv": self.oxigraph.QueryResultsFormat.CSV, "json": self.oxigraph.QueryResultsFormat.JSON}
+        return self.store.query(query).serialize(format=formats[result_format])
+
+    def update(self, update: str):
+        self.store.update(update)
+
+    def flush(self):
+        if self.store is not None:
+            self.store.flush()
+
+    def close(self):
+        self.flush()
+        self.store = None  # Releases the directory lock
+
+    def __len__(self):
+        return len(self.store)
+
+
+class RDFLibStore(EmbeddedTripleStore):
+    # An rdflib graph; rdflib's stores are not thread-safe, so every access holds a lock
+
+    def __init__(self, url: str, path: str, graph: Graph):
+        super().__init__(url, path)
+        self.graph = graph
+        self._lock = threading.Lock()
+
+    def add(self, triples) -> int:
+        added = 0
+        with self._lock:
+            for triple in triples:
+                self.graph.add(triple)
+                added += 1
+        return added
+
+    def query_results(self, query: str, result_format: str) -> bytes:
+        with self._lock:
+            return self.graph.query(query).serialize(format=result_format)
+
+    def update(self, update: str):
+        with self._lock:
+            self.graph.update(update)
+
+    def __len__(self):
+        with self._lock:
+            return len(self.graph)
+
+
+class BerkeleyDBStore(RDFLibStore):
+    # An rdflib graph persisted in a BerkeleyDB environment in the directory `path`
+
+    def __init__(self, url: str, path: str):
+        graph = Graph(store="BerkeleyDB")
+        graph.open(path, create=True)
+        super().__init__(url, path, graph)
+
+    def flush(self):
+        with self._lock:
+            self.graph.commit()
+
+    def close(self):
+        with self._lock:
+            self.graph.close()
+
+
+class NTriplesSnapshotStore(RDFLibStore):
+    """
+    An in-memory rdflib graph loaded from the N-Triples file `path`. Added triples are
+    appended to the file as well, so the next process opening it sees them; after an
+    update the file is rewritten from the graph when the store is flushed.
+    """
+
+    def __init__(self, url: str, path: str):
+        graph = Graph()
+        if os.path.isfile(path):
+            graph.parse(path, format="nt")
+        super().__init__(url, path, graph)
+        self.file = open(path, "a", encoding="utf-8")
+        self.updated = False  # Whether the file is behind the graph
+
+    def add(self, triples) -> int:
+        added = 0
+        with self._lock:
+            for s, p, o in triples:
+                self.graph.add((s, p, o))
+                self.file.write(f"{ntriples_term(s)} {ntriples_term(p)} {ntriples_term(o)} .\n")
+                added += 1
+        return added
+
+    def update(self, update: str):
+        super().update(update)
+        self.updated = True
+
+    def flush(self):
+        with self._lock:
+            if self.updated:
+                self.file.close()
+                self.graph.serialize(destination=self.path, format="nt", encoding="utf-8")
+                self.file = open(self.path, "a", encoding="utf-8")
+                self.updated = False
+            self.file.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.file.close()
+
+
+EMBEDDED_STORE_SCHEMES = {
+    "oxigraph": OxigraphStore,
+    "berkeleydb": BerkeleyDBStore,
+    "rdflib": NTriplesSnapshotStore,
+}
+
+_embedded_stores = {}  # url -> open EmbeddedTripleStore
+_embedded_stores_lock = threading.Lock()
+
+
+def embedded_store_path(url: str) -> Optional[str]:
+    # The path of an embedded store URL (scheme:path or scheme://path), None for other URLs
+    scheme, separator, rest = (url or "").partition(":")
+    if not separator or scheme.lower() not in EMBEDDED_STORE_SCHEMES:
+        return None
+    return rest[2:] if rest.startswith("//") else rest
+
+
+def get_embedded_store(url: str) -> Optional[EmbeddedTripleStore]:
+    """
+    Returns the embedded store for `url`, opening it on first use, or None when `url` is
+    not an embedded store URL. Upload and query handlers in one process share the store.
+    """
+    path = embedded_store_path(url)
+    if path is None:
+        return None
+    with _embedded_stores_lock:
+        store = _embedded_stores.get(url)
+        if store is None:
+            store = _embedded_stores[url] = EMBEDDED_STORE_SCHEMES[url.partition(":")[0].lower()](url, path)
+        return store
+
+
+def close_embedded_store(url: str) -> bool:
+    # Flush and close the store opened for `url`; returns whether one was open
+    with _embedded_stores_lock:
+        store = _embedded_stores.pop(url, None)
+    if store is None:
+        return False
+    store.close()
+    return True
+
+
+class EmbeddedStoreSink(object):
+    # Adds triples to an embedded store, flushing it to disk when closed
+
+    def __init__(self, store: EmbeddedTripleStore):
+        self.store = store
+        self.count = 0
+
+    def write(self, triples) -> int:
+        added = self.store.add(iter(triples))
+        self.count += added
+        return added
+
+    def close(self):
+        self.store.flush()
+
+
+class SPARQLDeltaSink(object):
+    """
+    Applies changes to a graph as DELETE DATA / INSERT DATA updates.
+
+    Triples are queued as N-Triples lines with delete() and insert(); every `chunk_size`
+    queued lines are sent as one update request, deletions first, to the endpoint of a
+    SPARQLBulkLoader (with its retries) or to an embedded store. A line queued for one
+    operation cancels the same line queued for the other, so the order of calls is kept.
+    """
+
+    def __init__(
+        self,
+        loader: Optional[SPARQLBulkLoader] = None,
+        store: Optional[EmbeddedTripleStore] = None,
+        chunk_size: int = SPARQL_UPLOAD_CHUNK_SIZE,
+    ):
+        if (loader is None) == (store is None):
+            raise ValueError("A delta sink needs either a loader or a store")
+        self.loader = loader
+        self.store = store
+        self.chunk_size = chunk_size
+        self.deletes = {}  # Ordered sets of queued lines
+        self.inserts = {}
+        self.stats = {"deleted": 0, "inserted": 0, "requests": 0}
+
+    def delete(self, lines):
+        for line in lines:
+            self.inserts.pop(line, None)
+            self.deletes[line] = None
+        self._flush_if_full()
+
+    def insert(self, lines):
+        for line in lines:
+            self.deletes.pop(line, None)
+            self.inserts[line] = None
+        self._flush_if_full()
+
+    def _flush_if_full(self):
+        if len(self.deletes) + len(self.inserts) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        operations = []
+        if self.deletes:
+            operations.append("DELETE DATA {\n" + "".join(self.deletes) + "}")
+        if self.inserts:
+            operations.append("INSERT DATA {\n" + "".join(self.inserts) + "}")
+        if not operations:
+            return
+        update = " ;\n".join(operations)
+        if self.store is not None:
+            self.store.update(update)
+        else:
+            self.loader.post(update, SPARQLBulkLoader.CONTENT_TYPES["sparql-update"])
+        self.stats["deleted"] += len(self.deletes)
+        self.stats["inserted"] += len(self.inserts)
+        self.stats["requests"] += 1
+        self.deletes = {}
+        self.inserts = {}
+
+    def close(self):
+        self.flush()
+        if self.store is not None:
+            self.store.flush()
+
+
+# Delta sync of the metadata. The manifest, a small SQLite file, keeps the content of every
+# row last synced to a graph store (keyed by the store's URL and the row's Id) and the
+# description of every author those rows link to, so a sync can work out the triples to
+# delete and insert without querying the store.
+METADATA_MANIFEST_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS metadata_manifest (
+        target TEXT NOT NULL,
+        id TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        row TEXT NOT NULL,
+        author TEXT NOT NULL,
+        PRIMARY KEY (target, id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS metadata_manifest_author_idx ON metadata_manifest (target, author)",
+    """CREATE TABLE IF NOT EXISTS metadata_manifest_author (
+        target TEXT NOT NULL,
+        iri TEXT NOT NULL,
+        triples TEXT NOT NULL,
+        PRIMARY KEY (target, iri)
+    ) WITHOUT ROWID""",
+)
+METADATA_MANIFEST_UPSERT = """INSERT INTO metadata_manifest (target, id, hash, row, author) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (target, id) DO UPDATE SET hash = excluded.hash, row = excluded.row, author = excluded.author"""
+METADATA_ORPHAN_AUTHORS = """SELECT iri, triples FROM metadata_manifest_author a WHERE target = ?
+    AND NOT EXISTS (SELECT 1 FROM metadata_manifest m WHERE m.target = a.target AND m.author = a.iri)"""
+
+
+def ntriples_line(triple) -> str:
+    s, p, o = triple
+    return f"{ntriples_term(s)} {ntriples_term(p)} {ntriples_term(o)} .\n"
+
+
+# Caching of SPARQL query results. One cache is shared by every MetadataQueryHandler
+# unless a handler is given its own; all caches forget an endpoint's results whenever
+# MetadataUploadHandler writes to it.
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_TTL = 300.0  # Seconds a result is served before it is queried again
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Memory used by the cached DataFrames
+
+
+class QueryResultCache(object):
+    """
+    A thread-safe LRU cache of query results keyed by (endpoint, query text).
+
+    Entries expire `ttl` seconds after they were stored. The least recently used entries
+    are evicted once the cache holds more than `max_entries` results or their DataFrames
+    take more than `max_bytes`; a single result larger than `max_bytes` is not cached.
+    Callers get a copy of the cached DataFrame, so they may modify it freely.
+
+    Every invalidation starts a new generation. A caller takes generation() before running
+    a query and passes it to put(), so a result read before data changed is not cached
+    after that change has invalidated the endpoint.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        ttl: float = QUERY_CACHE_TTL,
+        max_bytes: int = QUERY_CACHE_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (endpoint, query) -> (expires, size, DataFrame)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._invalidated = {}  # endpoint -> generation of its last invalidation
+        self._invalidated_all = 0  # Generation of the last invalidation of every endpoint
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0, "stale": 0}
+        _query_caches.add(self)
+
+    def get(self, endpoint: str, query: str) -> Optional[pd.DataFrame]:
+        # The cached result, or None on a miss
+        key = (endpoint.rstrip("/"), query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                count_metric("cache_requests_total", result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            count_metric("cache_requests_total", result="hit")
+            return entry[2].copy()
+
+    def generation(self) -> int:
+        # The current generation, to pass to put() for a query about to run
+        with self._lock:
+            return self._generation
+
+    def put(self, endpoint: str, query: str, df: pd.DataFrame, generation: Optional[int] = None):
+        # Store a result; one read in a generation older than the endpoint's last invalidation is dropped
+        key = (endpoint.rstrip("/"), query)
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation < max(self._invalidated_all, self._invalidated.get(key[0], 0)):
+                self._stats["stale"] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, df.copy())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, endpoint: Optional[str] = None) -> int:
+        # Drop the results of one endpoint (all results if None); returns how many
+        with self._lock:
+            self._generation += 1
+            if endpoint is None:
+                self._invalidated_all = self._generation
+                keys = list(self._entries)
+            else:
+                endpoint = endpoint.rstrip("/")
+                self._invalidated[endpoint] = self._generation
+                keys = [key for key in self._entries if key[0] == endpoint]
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def getStats(self) -> dict:
+        # Hit, miss and eviction counters, and the current size of the cache
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            return stats
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+_query_caches = weakref.WeakSet()  # Every live cache, so uploads can invalidate them all
+_query_cache = QueryResultCache()
+
+
+def get_query_cache() -> QueryResultCache:
+    return _query_cache
+
+
+def invalidate_query_cache(endpoint: Optional[str] = None) -> int:
+    # Forget cached results of an endpoint after its data has changed
+    return sum(cache.invalidate(endpoint) for cache in list(_query_caches))
+
+
+# The domain classes use __slots__: mashups build hundreds of thousands of them, and a
+# slotted instance has no per-instance __dict__.
 class IdentifiableEntity(object): #Rubens
+    __slots__ = ("id", "__weakref__")
+
     def __init__(self, id: str):
         self.id = id
 
@@ -32,6 +2463,8 @@ class IdentifiableEntity(object): #Rubens
 
 
 class Person(IdentifiableEntity):  # Rubens
+    __slots__ = ("name",)
+
     def __init__(self, id: str, name: str):
         self.name = name
         super().__init__(id)
@@ -41,6 +2474,8 @@ class Person(IdentifiableEntity):  # Rubens
 
 # Ben
 class CulturalHeritageObject(IdentifiableEntity):  # Represents a cultural heritage object with various attributes
+    __slots__ = ("title", "date", "owner", "place", "hasAuthor")
+
     def __init__(
         self,
         id: str,  # Unique identifier for the object
@@ -59,10 +2494,8 @@ class CulturalHeritageObject(IdentifiableEntity):  # Represents a cultural herit
         self.id = id  # Stores the unique identifier
         self.title = title  # Stores the title of the object
         self.date = date  # Stores the date (optional)
-        self.owner = str(owner)  # Ensures the owner attribute is stored as a string
+        self.owner = optional_str(owner)  # Stored as a string; None when the owner is missing
         self.place = place  # Stores the place associated with the object
-        self.author_id = author_id  # Stores the optional author ID
-        self.author_name = author_name  # Stores the optional author name
         
         # Initializes the hasAuthor attribute with an empty list if no author information is provided
         self.hasAuthor = hasAuthor or []
@@ -73,6 +2506,20 @@ class CulturalHeritageObject(IdentifiableEntity):  # Represents a cultural herit
         elif isinstance(hasAuthor, list):  # If a list of Person instances is passed, store it directly
             self.hasAuthor = hasAuthor
 
+        # A single author may be given by ID and name instead; it is stored in hasAuthor
+        if not self.hasAuthor and (author_id or author_name):
+            self.hasAuthor = [Person(author_id, author_name)]
+
+    @property
+    def author_id(self) -> Optional[str]:
+        """Returns the ID of the first author, if any."""
+        return self.hasAuthor[0].id if self.hasAuthor else None
+
+    @property
+    def author_name(self) -> Optional[str]:
+        """Returns the name of the first author, if any."""
+        return self.hasAuthor[0].name if self.hasAuthor else None
+
     def getTitle(self) -> str:
         """Returns the title of the cultural heritage object."""
         return self.title
@@ -101,47 +2548,50 @@ class CulturalHeritageObject(IdentifiableEntity):  # Represents a cultural herit
 
 class NauticalChart(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a nautical chart."""
-    pass
+    __slots__ = ()
 
 class ManuscriptPlate(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a manuscript plate."""
-    pass
+    __slots__ = ()
 
 class ManuscriptVolume(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a manuscript volume."""
-    pass
+    __slots__ = ()
 
 class PrintedVolume(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a printed volume."""
-    pass
+    __slots__ = ()
 
 class PrintedMaterial(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: printed material."""
-    pass
+    __slots__ = ()
 
 class Herbarium(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a herbarium specimen."""
-    pass
+    __slots__ = ()
 
 class Specimen(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a specimen."""
-    pass
+    __slots__ = ()
 
 class Painting(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a painting."""
-    pass
+    __slots__ = ()
 
 class Model(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a model."""
-    pass
+    __slots__ = ()
 
 class Map(CulturalHeritageObject):
     """Represents a specific type of cultural heritage object: a map."""
-    pass
+    __slots__ = ()
 
 
 
 class Activity(object):  # Rubens
+    # refersTo is an attribute holding the CulturalHeritageObject the activity refers to
+    __slots__ = ("refersTo", "institute", "person", "tool", "start", "end")
+
     def __init__(
         self,
         refersTo: CulturalHeritageObject,
@@ -184,11 +2634,10 @@ class Activity(object):  # Rubens
             return self.end
         return None
 
-    def refersTo(self) -> CulturalHeritageObject:
-        return self.refersTo
-
 
 class Acquisition(Activity):
+    __slots__ = ("technique",)
+
     def __init__(
         self,
         refersTo: CulturalHeritageObject,
@@ -207,19 +2656,285 @@ class Acquisition(Activity):
 
 
 class Processing(Activity):
-    pass
+    __slots__ = ()
 
 
 class Modelling(Activity):
-    pass
+    __slots__ = ()
 
 
 class Optimising(Activity):
-    pass
+    __slots__ = ()
 
 
 class Exporting(Activity):
-    pass
+    __slots__ = ()
+
+
+# Classes the mashups instantiate, by the type names found in query results
+CULTURAL_HERITAGE_CLASSES = {
+    "NauticalChart": NauticalChart,
+    "ManuscriptPlate": ManuscriptPlate,
+    "ManuscriptVolume": ManuscriptVolume,
+    "PrintedVolume": PrintedVolume,
+    "PrintedMaterial": PrintedMaterial,
+    "Herbarium": Herbarium,
+    "Specimen": Specimen,
+    "Painting": Painting,
+    "Model": Model,
+    "Map": Map,
+}
+ACTIVITY_CLASSES = {
+    "Acquisition": Acquisition,
+    "Processing": Processing,
+    "Modelling": Modelling,
+    "Optimising": Optimising,
+    "Exporting": Exporting,
+}
+
+
+class CulturalHeritageObjectMap(object):
+    """
+    An identity map holding one CulturalHeritageObject per object id.
+
+    Activities only know the id of their object, so reference() hands out a shared
+    placeholder carrying just the id, or the full object once one has been registered.
+    register() fills in the instance already held for the id when it has the same class;
+    otherwise the new object replaces it in the map, and placeholders handed out before
+    stay as they are, so no live object ever changes class. Entries are weak references
+    and disappear once nothing else uses the object.
+    """
+
+    FIELDS = ("title", "date", "owner", "place", "hasAuthor")
+
+    def __init__(self):
+        self._objects = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def reference(self, object_id, cls: type = CulturalHeritageObject) -> CulturalHeritageObject:
+        # The object with this id, or a placeholder for it of class `cls` when the type is known
+        key = str(object_id)
+        with self._lock:
+            obj = self._objects.get(key)
+            if obj is None:
+                obj = self._objects[key] = cls(key, "", "", "", "")
+            return obj
+
+    def register(self, obj: CulturalHeritageObject) -> CulturalHeritageObject:
+        # Make `obj` the object for its id; returns the instance to use from now on
+        key = str(obj.id)
+        with self._lock:
+            current = self._objects.get(key)
+            if current is None or type(current) is not type(obj):
+                self._objects[key] = obj
+                return obj
+            if current is not obj:
+                for field in self.FIELDS:
+                    setattr(current, field, getattr(obj, field))
+            return current
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+
+def column_values(df: pd.DataFrame, column: str, convert=None) -> list:
+    # The values of a column as a list, converted one by one; None for a missing column
+    if column not in df.columns:
+        return [None] * len(df)
+    values = df[column].tolist()
+    return list(map(convert, values)) if convert else values
+
+
+def optional_str(value) -> Optional[str]:
+    # str(value), or None for a missing value (NULL, NaN)
+    return None if value is None or pd.isna(value) else str(value)
+
+
+def tool_list(value) -> List[str]:
+    # The tools of a comma-joined tool column value, as stored at ingest; [] for a missing value
+    value = optional_str(value)
+    return value.split(", ") if value else []
+
+
+@timed_stage("materialize")
+def activities_from_frame(
+    df: Optional[pd.DataFrame],
+    types: Optional[set] = None,
+    objects: Optional[CulturalHeritageObjectMap] = None,
+) -> List[Activity]:
+    """
+    Builds Activity objects from the rows of a process query result.
+
+    Rows are grouped by their `type` column and each group is built in one pass over its
+    column arrays with the class registered in ACTIVITY_CLASSES, instead of row by row.
+    Rows of unknown types are skipped. The objects keep the order of the rows.
+
+    Args:
+        df (pd.DataFrame): Query result with the columns of ProcessDataQueryHandler.getAllActivities.
+        types (set, optional): Activity type names to build; all known types by default.
+        objects (CulturalHeritageObjectMap, optional): Identity map resolving object ids.
+            A new one is used by default, so activities on the same object still share it.
+
+    Returns:
+        List[Activity]: The activities, each referring to the map's object for its id
+            (a placeholder carrying only the id unless the full object was registered).
+    """
+    if df is None or df.empty or "type" not in df.columns:
+        return []
+    if objects is None:
+        objects = CulturalHeritageObjectMap()
+
+    object_ids = column_values(df, "object_id", str)
+    institutes = column_values(df, "responsible_institute", optional_str)
+    people = column_values(df, "responsible_person", optional_str)
+    tools = column_values(df, "tool", tool_list)
+    starts = column_values(df, "start_date", optional_str)
+    ends = column_values(df, "end_date", optional_str)
+
+    built = [None] * len(df)
+    for type_name, positions in df.groupby("type", sort=False).indices.items():
+        cls = ACTIVITY_CLASSES.get(type_name)
+        if cls is None or (types is not None and type_name not in types):
+            continue
+        if cls is Acquisition:
+            techniques = column_values(df, "technique", optional_str)
+            for i in positions:
+                built[i] = Acquisition(
+                    objects.reference(object_ids[i]),
+                    institutes[i], techniques[i], people[i], starts[i], ends[i], tools[i],
+                )
+        else:
+            for i in positions:
+                built[i] = cls(
+                    objects.reference(object_ids[i]),
+                    institutes[i], people[i], tools[i], starts[i], ends[i],
+                )
+    return [activity for activity in built if activity is not None]
+
+
+@timed_stage("materialize")
+def cultural_heritage_objects_from_frame(
+    df: Optional[pd.DataFrame],
+    objects: Optional[CulturalHeritageObjectMap] = None,
+) -> List[CulturalHeritageObject]:
+    """
+    Builds CulturalHeritageObject instances from the rows of a metadata query result.
+
+    Objects are built per `type_name` group with the class registered in
+    CULTURAL_HERITAGE_CLASSES. Results have one row per object and author, so rows sharing
+    an id become one object listing all of their authors. Objects keep the order in which
+    their id first appears; rows of unknown types are skipped.
+
+    Args:
+        df (pd.DataFrame): Query result with the columns type_name, id, title, date, owner
+            and place, and optionally author_id and author_name.
+        objects (CulturalHeritageObjectMap, optional): Identity map the objects are
+            registered in, so that instances already handed out are reused.
+
+    Returns:
+        List[CulturalHeritageObject]: One object per distinct id.
+    """
+    if df is None or df.empty or "type_name" not in df.columns:
+        return []
+
+    ids = column_values(df, "id", str)
+    titles = column_values(df, "title")
+    dates = column_values(df, "date", optional_str)
+    owners = column_values(df, "owner", optional_str)
+    places = column_values(df, "place")
+    author_ids = column_values(df, "author_id", str)
+    author_names = column_values(df, "author_name")
+    if "author_id" in df.columns and "author_name" in df.columns:
+        has_author = (df["author_id"].notna() & df["author_name"].notna()).tolist()
+    else:
+        has_author = [False] * len(df)
+
+    built = {}  # id -> (position of its first row, object)
+    for type_name, positions in df.groupby("type_name", sort=False).indices.items():
+        cls = CULTURAL_HERITAGE_CLASSES.get(type_name)
+        if cls is None:
+            logger.warning("No class defined for type: %s", type_name)
+            continue
+        for i in positions:
+            entry = built.get(ids[i])
+            if entry is None:
+                entry = built[ids[i]] = (i, cls(ids[i], titles[i], dates[i], owners[i], places[i]))
+            if has_author[i]:
+                authors = entry[1].hasAuthor
+                if all(author.id != author_ids[i] for author in authors):
+                    authors.append(Person(author_ids[i], author_names[i]))
+    ordered = [obj for _, obj in sorted(built.values(), key=lambda entry: entry[0])]
+    if objects is not None:
+        ordered = [objects.register(obj) for obj in ordered]
+    return ordered
+
+
+@timed_stage("materialize")
+def people_from_frame(df: Optional[pd.DataFrame], id_column: str = "id", name_column: str = "name") -> List[Person]:
+    # One Person per distinct id, in the order the ids first appear
+    if df is None or df.empty or id_column not in df.columns:
+        return []
+    people = {}
+    for person_id, name in zip(df[id_column].tolist(), column_values(df, name_column)):
+        if person_id not in people:
+            people[person_id] = Person(id=person_id, name=name)
+    return list(people.values())
+
+
+def join_on_object_id(activities_df: pd.DataFrame, objects_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins the rows of a process query result to the metadata rows of the objects they refer to.
+
+    The distinct object ids of the activities are hash-joined with the objects in a single
+    merge, so each side is read once. Ids are compared as strings, as the SPARQL results
+    parse them as numbers.
+
+    Returns:
+        pd.DataFrame: The rows of `objects_df` referred to by some activity, ordered by the
+            first activity referring to each object.
+    """
+    if "object_id" not in activities_df.columns or "id" not in objects_df.columns:
+        return objects_df.iloc[0:0]
+    keys = pd.DataFrame({"id": pd.unique(activities_df["object_id"].dropna().astype(str))})
+    return keys.merge(objects_df.assign(id=objects_df["id"].astype(str)), on="id", how="inner", sort=False)
+
+
+def merge_handler_frames(frames: list) -> pd.DataFrame:
+    # The rows of the DataFrames several handlers returned, each distinct row once. When
+    # no handler returned rows, the first result keeps the handlers' columns.
+    non_empty = [df for df in frames if not df.empty]
+    if not non_empty:
+        return frames[0] if frames else pd.DataFrame()
+    if len(non_empty) == 1:
+        return non_empty[0]
+    return pd.concat(non_empty, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def referred_object_ids(activities_df: pd.DataFrame) -> list:
+    # The distinct object ids of process query results, as strings, in the order they appear
+    return pd.unique(activities_df["object_id"].dropna().astype(str)).tolist()
+
+
+def acquired_and_exported_ids(frames: pd.DataFrame) -> list:
+    # The objects of getObjectIdsInTimeFrame results with both an Acquisition and an Exporting
+    # in the time frame, in any handler
+    if "object_id" not in frames.columns or frames.empty:
+        return []
+    kinds = frames.assign(object_id=frames["object_id"].astype(str)).groupby("object_id", sort=False)["type"].nunique()
+    common_ids = kinds.index[kinds == 2].tolist()
+    logger.debug("IDs of this timeframe: %s", common_ids)
+    return common_ids
+
+
+def sparql_values(values) -> str:
+    # The values as a space-separated list of SPARQL string literals, for a VALUES clause
+    return " ".join(Literal(str(value)).n3() for value in values)
+
+
+def batched(values: list, size: int) -> Iterator[list]:
+    # Consecutive slices of at most `size` values
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
 
 
 class Handler(object):  # Ekaterina
@@ -238,17 +2953,18 @@ class UploadHandler(Handler):  # Ekaterina
     def __init__(self):
         super().__init__()
 
+    @instrumented
     def pushDataToDb(self, file_path: str) -> bool:
         # If the file is not found at the provided path, search for it
         if not os.path.isfile(file_path):
             file_name = os.path.basename(file_path)  # Extract file name from the path
-            file_path = find_file(file_name)  # Search the entire system for the file
+            file_path = find_file(file_name)  # Search the configured roots for the file
 
         if not file_path:
             raise FileNotFoundError(f"File '{file_name}' not found.")
 
         self.file_path = file_path
-        blazegraph_endpoint = "http://127.0.0.1:9999/blazegraph/sparql"
+        blazegraph_endpoint = self._endpoint()
 
         # Split file path for file extension
         _, extension = os.path.splitext(file_path)
@@ -265,12 +2981,16 @@ class UploadHandler(Handler):  # Ekaterina
         else:
             raise Exception("Only .json, .csv, or .db files can be uploaded!")
 
+    def _endpoint(self) -> str:
+        # The endpoint set with setDbPathOrUrl, or the default Blazegraph one
+        return self.dbPathOrUrl or BLAZEGRAPH_ENDPOINT
+
     def upload_to_sqlite(self, file_path: str) -> bool:
         # Implement logic for uploading data to SQLite database
         with sqlite3.connect(self.dbPathOrUrl) as conn:
             df = pd.read_json(file_path)
             df.to_sql('process', conn, if_exists='replace')
-        print("Uploaded data to SQLite database successfully.")
+        logger.info("Uploaded data to SQLite database successfully.")
         return True
 
     def upload_json_to_sqlite(self, file_path: str) -> bool:
@@ -283,7 +3003,7 @@ class UploadHandler(Handler):  # Ekaterina
                 for table, rows in record.items():
                     if isinstance(rows, list):
                         pd.DataFrame(rows).to_sql(table, conn, if_exists='replace')
-        print("Uploaded JSON data to SQLite database successfully.")
+        logger.info("Uploaded JSON data to SQLite database successfully.")
         return True
 
     def upload_csv_to_blazegraph(self, file_path: str, sparql_endpoint: str) -> bool:
@@ -312,90 +3032,335 @@ class UploadHandler(Handler):  # Ekaterina
         headers = {'Content-Type': 'application/x-turtle'}
 
         with open(turtle_file, 'rb') as f:
-            response = requests.post(sparql_endpoint, data=f, headers=headers)
+            response = get_http_session(sparql_endpoint).post(
+                sparql_endpoint, data=f, headers=headers, timeout=(SPARQL_CONNECT_TIMEOUT, SPARQL_UPLOAD_TIMEOUT)
+            )
+
+        # Cached query results may be stale now
+        invalidate_query_cache(sparql_endpoint)
 
         if response.status_code != 200:
-            print(f"Upload failed: {response.status_code} - {response.reason}")
-            print(f"Response text: {response.text}")
+            logger.error("Upload failed: %s - %s\nResponse text: %s", response.status_code, response.reason, response.text)
             return False 
         
-        print("Upload to Blazegraph successful!")
+        logger.info("Upload to Blazegraph successful!")
         return True
 
 
 class ProcessDataUploadHandler(UploadHandler):  # Ekaterina
-    def __init__(self):
+    def __init__(
+        self,
+        mode: str = "full",  # "full" loads the whole file at once, "streaming" reads it record by record,
+                             # "incremental" only writes new or changed activities (activity schema)
+        batch_size: int = INGEST_BATCH_SIZE,  # Rows per executemany call in streaming mode
+        pragmas: Optional[dict] = None,  # PRAGMAs applied before a streaming load
+        schema: str = "tables",  # "tables" (one table per activity type) or "activity" (normalized)
+        fts: bool = False,  # Build the full-text index of the activity schema
+        period_index: bool = True,  # Build the interval index of the activity dates
+    ):
         super().__init__()
         self.file_path = find_file('process.json')
-        self.db_file = "json.db"
+        self.db_file = DEFAULT_PROCESS_DB
+        self.mode = mode
+        self.batch_size = batch_size
+        self.pragmas = pragmas
+        if schema not in ("tables", "activity"):
+            raise ValueError(f"Unknown storage schema: {schema}")
+        self.schema = schema
+        self.fts = fts
+        self.period_index = period_index
+        if mode == "incremental" and schema != "activity":
+            raise ValueError("Incremental ingestion needs the activity schema")
         
-        # Load the JSON file and set up the database
-        self.load_json_and_setup_db()
-
-    def load_json_and_setup_db(self):
-        try:
-            with open(self.file_path) as json_file:
-                data = json.load(json_file)
-
-            conn = sqlite3.connect(self.db_file)
-            c = conn.cursor()
+        # Load the JSON file and set up the database. The activity schema is only
+        # written by the streaming and incremental engines.
+        if mode == "incremental":
+            self.upsert_json_to_db(self.file_path, self.db_file)
+        elif mode == "streaming" or (mode == "full" and schema == "activity"):
+            self.stream_json_to_db(self.file_path, self.db_file)
+        elif mode == "full":
+            self.load_json_and_setup_db()
+        else:
+            raise ValueError(f"Unknown ingestion mode: {mode}")
 
-            # Create tables if they do not exist
+    def create_activity_tables(self, c):
+        # One table per activity type; only Acquisition has a technique column
+        for table in ACTIVITY_TABLES.values():
+            technique = "technique TEXT,\n                            " if table == "Acquisition" else ""
             c.execute(
-                """CREATE TABLE IF NOT EXISTS Acquisition (
+                f"""CREATE TABLE IF NOT EXISTS {table} (
                             object_id TEXT,
                             responsible_institute TEXT,
                             responsible_person TEXT,
-                            technique TEXT,
-                            tool TEXT,
+                            {technique}tool TEXT,
                             start_date TEXT,
                             end_date TEXT
                         )"""
             )
 
-            c.execute(
-                """CREATE TABLE IF NOT EXISTS Processing (
-                            object_id TEXT,
-                            responsible_institute TEXT,
-                            responsible_person TEXT,
-                            tool TEXT,
-                            start_date TEXT,
-                            end_date TEXT
-                        )"""
-            )
+    def upload_json_to_sqlite(self, file_path: str) -> bool:
+        # Process data files are streamed (or, in incremental mode, upserted) into the
+        # activity tables of dbPathOrUrl
+        if self.mode == "incremental":
+            self.upsert_json_to_db(file_path, self.dbPathOrUrl or self.db_file)
+        else:
+            self.stream_json_to_db(file_path, self.dbPathOrUrl or self.db_file)
+        return True
 
-            c.execute(
-                """CREATE TABLE IF NOT EXISTS Modelling (
-                            object_id TEXT,
-                            responsible_institute TEXT,
-                            responsible_person TEXT,
-                            tool TEXT,
-                            start_date TEXT,
-                            end_date TEXT
-                        )"""
-            )
+    @instrumented
+    def upsert_json_to_db(self, file_path: str, db_file: str) -> dict:
+        """
+        Loads a process data file into the activity schema, writing only what changed.
 
-            c.execute(
-                """CREATE TABLE IF NOT EXISTS Optimising (
-                            object_id TEXT,
-                            responsible_institute TEXT,
-                            responsible_person TEXT,
-                            tool TEXT,
-                            start_date TEXT,
-                            end_date TEXT
-                        )"""
-            )
+        Each activity block of each object is hashed and looked up in the manifest by its
+        (object id, type) key. Unchanged blocks are skipped, changed ones are updated in
+        place (keeping their activity id) and new ones are inserted. Activities loaded
+        before the manifest existed are matched on the same key, once, and their
+        duplicates removed. Objects missing from the file are left alone, so a file with
+        only the day's changes can be loaded as well as a full one. The full-text index, if
+        present, is kept in sync. Everything runs in one transaction.
 
-            c.execute(
-                """CREATE TABLE IF NOT EXISTS Exporting (
-                            object_id TEXT,
-                            responsible_institute TEXT,
-                            responsible_person TEXT,
-                            tool TEXT,
-                            start_date TEXT,
-                            end_date TEXT
-                        )"""
-            )
+        Args:
+            file_path (str): Path of the JSON file (an array of objects, like process.json).
+            db_file (str): Path of the SQLite database to load into.
+
+        Returns:
+            dict: Number of objects read, activities inserted, updated and unchanged, and
+                elapsed seconds.
+        """
+        pragmas = dict(BULK_LOAD_PRAGMAS)
+        pragmas.update(self.pragmas or {})
+        started = time.perf_counter()
+        stats = {"objects": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+
+        # Carry over rows stored in the per-type tables before adding new ones
+        migrate_to_activity_schema(db_file)
+
+        conn = sqlite3.connect(db_file, isolation_level=None)
+        try:
+            c = conn.cursor()
+            for name, value in pragmas.items():
+                c.execute(f"PRAGMA {name} = {value}")
+            c.execute("BEGIN")
+            create_activity_schema(c)
+            c.execute(ACTIVITY_MANIFEST_SCHEMA)
+            first_id = next_activity_id(c)
+            ids = itertools.count(first_id)
+            index_fts = self.fts or has_table(c, "activity_fts")
+            if index_fts:
+                # A new index first gets the activities already stored
+                index_activity_text(c, first_id)
+            index_periods = self.period_index or has_table(c, "activity_period")
+            if index_periods:
+                index_activity_periods(c, first_id)
+            has_manifest = c.execute("SELECT 1 FROM activity_manifest LIMIT 1").fetchone() is not None
+            unmanaged = not has_manifest and c.execute("SELECT 1 FROM activity LIMIT 1").fetchone() is not None
+
+            # New activities are buffered and written with executemany; `pending` holds the
+            # keys in the buffers, so a key repeated in the file sees its earlier version
+            activities, tools, manifest = [], [], []
+            pending = set()
+
+            def flush():
+                c.executemany(ACTIVITY_INSERT, activities)
+                c.executemany(ACTIVITY_TOOL_INSERT, tools)
+                c.executemany(ACTIVITY_MANIFEST_UPSERT, manifest)
+                activities.clear()
+                tools.clear()
+                manifest.clear()
+                pending.clear()
+
+            for item in iter_json_array(file_path):
+                stats["objects"] += 1
+                object_id = item["object id"]
+                for key, table in ACTIVITY_TABLES.items():
+                    activity = item.get(key, {})
+                    digest = activity_block_hash(activity)
+                    if (object_id, table) in pending:
+                        flush()
+                    known = c.execute(
+                        "SELECT activity_id, hash FROM activity_manifest WHERE object_id = ? AND type = ?",
+                        (object_id, table),
+                    ).fetchone()
+                    if known is not None and known[1] == digest:
+                        stats["unchanged"] += 1
+                        continue
+
+                    existing = None
+                    if known is not None:
+                        existing = known[0]
+                    elif unmanaged:
+                        # Rows from an earlier, non-incremental load: keep the first, drop duplicates
+                        matches = [row[0] for row in c.execute(
+                            "SELECT id FROM activity WHERE object_id = ? AND type = ? ORDER BY id", (object_id, table)
+                        )]
+                        if matches:
+                            existing = matches[0]
+                            for duplicate in matches[1:]:
+                                c.execute("DELETE FROM activity_tool WHERE activity_id = ?", (duplicate,))
+                                c.execute("DELETE FROM activity WHERE id = ?", (duplicate,))
+                                if index_fts:
+                                    c.execute("DELETE FROM activity_fts WHERE rowid = ?", (duplicate,))
+                                if index_periods:
+                                    c.execute("DELETE FROM activity_period WHERE id = ?", (duplicate,))
+
+                    block_tools = activity.get("tool") or []
+                    if isinstance(block_tools, str):
+                        block_tools = [block_tools]
+                    values = (
+                        activity.get("responsible institute"),
+                        activity.get("responsible person"),
+                        activity.get("technique"),
+                        activity.get("start date"),
+                        activity.get("end date"),
+                    )
+                    if existing is None:
+                        activity_id = next(ids)
+                        activities.append((activity_id, object_id, table) + values)
+                        tools.extend((activity_id, position, tool) for position, tool in enumerate(block_tools))
+                        manifest.append((object_id, table, activity_id, digest))
+                        pending.add((object_id, table))
+                        stats["inserted"] += 1
+                        if len(activities) >= self.batch_size:
+                            flush()
+                    else:
+                        c.execute(ACTIVITY_UPDATE, values + (existing,))
+                        c.execute("DELETE FROM activity_tool WHERE activity_id = ?", (existing,))
+                        c.executemany(ACTIVITY_TOOL_INSERT,
+                                      [(existing, position, tool) for position, tool in enumerate(block_tools)])
+                        c.execute(ACTIVITY_MANIFEST_UPSERT, (object_id, table, existing, digest))
+                        # Activities inserted by this load are indexed by the fills at the end
+                        if index_fts and existing < first_id:
+                            c.execute("DELETE FROM activity_fts WHERE rowid = ?", (existing,))
+                            c.execute(ACTIVITY_FTS_REFRESH, (existing,))
+                        if index_periods and existing < first_id:
+                            c.execute("DELETE FROM activity_period WHERE id = ?", (existing,))
+                            c.execute(ACTIVITY_PERIOD_REFRESH, (existing,))
+                        stats["updated"] += 1
+            flush()
+            if index_fts:
+                c.execute(ACTIVITY_FTS_FILL, (first_id,))
+            if index_periods:
+                c.execute(ACTIVITY_PERIOD_FILL, (first_id,))
+            c.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        stats["seconds"] = time.perf_counter() - started
+        logger.info("Upserted %d objects in %.3fs: %d activities inserted, %d updated, %d unchanged.",
+                    stats["objects"], stats["seconds"], stats["inserted"], stats["updated"], stats["unchanged"],
+                    extra=stats)
+        return stats
+
+    @instrumented
+    def stream_json_to_db(self, file_path: str, db_file: str) -> dict:
+        """
+        Loads a process data file into the activity tables without reading it into memory.
+
+        The JSON array is decoded one object at a time and its rows are buffered per
+        INSERT statement; each buffer is flushed with a single executemany call once it holds
+        `batch_size` rows. The whole load runs in one transaction, after the bulk-load
+        PRAGMAs have been applied to the connection.
+
+        Args:
+            file_path (str): Path of the JSON file (an array of objects, like process.json).
+            db_file (str): Path of the SQLite database to load into.
+
+        Returns:
+            dict: Number of objects and rows loaded (tool rows included for the activity
+                schema), elapsed seconds and rows per second.
+        """
+        pragmas = dict(BULK_LOAD_PRAGMAS)
+        pragmas.update(self.pragmas or {})
+        started = time.perf_counter()
+        objects = rows = 0
+
+        if self.schema == "activity":
+            # Carry over rows stored in the per-type tables before adding new ones
+            migrate_to_activity_schema(db_file)
+
+        conn = sqlite3.connect(db_file, isolation_level=None)
+        try:
+            c = conn.cursor()
+            for name, value in pragmas.items():
+                c.execute(f"PRAGMA {name} = {value}")
+
+            if self.schema == "activity":
+                create_activity_schema(c)
+                first_id = next_activity_id(c)
+                ids = itertools.count(first_id)
+                # Existing indexes are always kept in sync
+                index_fts = self.fts or has_table(c, "activity_fts")
+                index_periods = self.period_index or has_table(c, "activity_period")
+
+                def rows_of(item):
+                    return normalized_activity_rows(item, ids)
+            else:
+                self.create_activity_tables(c)
+                inserts = {}
+                for table in ACTIVITY_TABLES.values():
+                    columns = ACTIVITY_COLUMNS[table]
+                    inserts[table] = (
+                        f"INSERT INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))})"
+                    )
+
+                def rows_of(item):
+                    return ((inserts[table], row) for table, row in activity_rows(item))
+
+            # One buffer per INSERT statement
+            buffers = {}
+            c.execute("BEGIN")
+            for item in iter_json_array(file_path):
+                objects += 1
+                for statement, row in rows_of(item):
+                    buffer = buffers.setdefault(statement, [])
+                    buffer.append(row)
+                    if len(buffer) >= self.batch_size:
+                        c.executemany(statement, buffer)
+                        rows += len(buffer)
+                        buffer.clear()
+            for statement, buffer in buffers.items():
+                if buffer:
+                    c.executemany(statement, buffer)
+                    rows += len(buffer)
+            if self.schema == "activity" and index_fts:
+                index_activity_text(c, first_id)
+            if self.schema == "activity" and index_periods:
+                index_activity_periods(c, first_id)
+            c.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "objects": objects,
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_second": rows / elapsed if elapsed > 0 else float(rows),
+        }
+        logger.info("Streamed %d rows from %d objects in %.3fs (%.0f rows/s).", rows, objects, elapsed,
+                    stats["rows_per_second"], extra=stats)
+        return stats
+
+    def load_json_and_setup_db(self):
+        try:
+            with open(self.file_path) as json_file:
+                data = json.load(json_file)
+
+            conn = sqlite3.connect(self.db_file)
+            c = conn.cursor()
+
+            # Create tables if they do not exist
+            self.create_activity_tables(c)
 
             for item in data:
                 object_id = item["object id"]
@@ -477,11 +3442,11 @@ class ProcessDataUploadHandler(UploadHandler):  # Ekaterina
                 )
 
             conn.commit()
-            print("\nData insertion and querying completed successfully.")
+            logger.info("Data insertion and querying completed successfully.")
         except FileNotFoundError:
-            print("Error: JSON file not found.")
+            logger.error("JSON file not found: %s", self.file_path)
         except sqlite3.Error as e:
-            print("\nSQLite error:", e)
+            logger.error("SQLite error: %s", e)
         finally:
             if conn:
                 conn.close()
@@ -489,9 +3454,25 @@ class ProcessDataUploadHandler(UploadHandler):  # Ekaterina
 
 
 class MetadataUploadHandler(UploadHandler):  # Ekaterina
-    def __init__(self):
+    def __init__(
+        self,
+        chunk_size: int = SPARQL_UPLOAD_CHUNK_SIZE,  # Triples sent per HTTP request
+        retries: int = SPARQL_UPLOAD_RETRIES,  # Extra attempts for a failed request
+        backoff: float = SPARQL_UPLOAD_BACKOFF,  # Seconds before the first retry
+        mode: str = "full",  # "full" builds the whole graph first, "streaming" emits triples while reading,
+                             # "delta" only sends the triples of rows added, changed or removed since the last sync
+        sink=None,  # Destination of streamed triples; the Blazegraph endpoint by default
+        csv_chunk_size: int = CSV_READ_CHUNK_SIZE,  # CSV rows parsed at a time in streaming and delta mode
+        manifest: str = DEFAULT_METADATA_MANIFEST,  # SQLite file recording the rows synced, in delta mode
+    ):
         super().__init__()
         self.my_graph = Graph()
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.mode = mode
+        self.csv_chunk_size = csv_chunk_size
+        self.manifest = manifest
 
         # Define resource classes
         self.NauticalChart = URIRef("https://schema.org/NauticalChart")
@@ -518,69 +3499,51 @@ class MetadataUploadHandler(UploadHandler):  # Ekaterina
         # Base URL
         self.base_url = "https://github.com/katyakrsn/ds24project/"
         self.file_path_csv = "data/meta.csv"
-        
-        # Load heritage data from CSV
-        self.heritage = pd.read_csv(
-            find_file('meta.csv'),
-            keep_default_na=False,
-            dtype={
-                "Id": "string",
-                "Type": "string",
-                "Title": "string",
-                "Date": "string",
-                "Author": "string",
-                "Owner": "string",
-                "Place": "string",
-            },
-        )
 
-        # Process each row in the heritage DataFrame
-        self.process_heritage_data()
+        if mode == "streaming":
+            # Convert meta.csv chunk by chunk, without building the graph or a Turtle file
+            self.stream_heritage_data(find_file('meta.csv'), sink)
+        elif mode == "delta":
+            # Send only what changed in meta.csv since the last sync to the Blazegraph endpoint
+            self.sync_heritage_data(find_file('meta.csv'), BLAZEGRAPH_ENDPOINT)
+        elif mode == "full":
+            # Load heritage data from CSV
+            self.heritage = pd.read_csv(find_file('meta.csv'), keep_default_na=False, dtype=META_CSV_DTYPES)
+
+            # Process each row in the heritage DataFrame
+            self.process_heritage_data()
+        else:
+            raise ValueError(f"Unknown conversion mode: {mode}")
 
     def process_heritage_data(self):
     # Process each row of heritage data and add RDF triples to the graph
+        debug = logger.isEnabledFor(logging.DEBUG)
         for idx, row in self.heritage.iterrows():
-            class_uri = self.get_class_uri(row["Type"])
-            resource_uri = URIRef(f"{self.base_url}{row['Id']}")
-
             # Handle missing date values
             row["Date"] = row["Date"].strip() if row["Date"].strip() else "Unknown"
-            print(f"Missing Date at index {idx}" if row["Date"] == "Unknown" else "")
-            
-            # Handle missing and whitespace values
-            date = row["Date"].strip() if row["Date"].strip() else "Unknown"
-            title = row["Title"].strip() if row["Title"].strip() else "Unknown"
-            owner = row["Owner"].strip() if row["Owner"].strip() else "Unknown"
-            place = row["Place"].strip() if row["Place"].strip() else "Unknown"
+            if debug:
+                if row["Date"] == "Unknown":
+                    logger.debug("Missing Date at index %s", idx)
+                if not row["Author"].strip():
+                    logger.debug("Missing Author at index %s", idx)
 
             # Add triples to the graph
-            self.my_graph.add((resource_uri, RDF.type, class_uri))
-            self.my_graph.add((resource_uri, self.identifier, Literal(row["Id"])))
-            self.my_graph.add((resource_uri, self.title, Literal(title)))
-            self.my_graph.add((resource_uri, self.date, Literal(date)))
-            self.my_graph.add((resource_uri, self.owner, Literal(owner)))
-            self.my_graph.add((resource_uri, self.place, Literal(place)))
-
-            # Handle Author
-            author = row["Author"].strip() if row["Author"].strip() else "Unknown"
-            if author != "Unknown":
-                self.add_author_data(row, resource_uri, idx)
-            else:
-                print(f"Missing Author at index {idx}")
-                self.add_author_data({"Author": "Unknown"}, resource_uri, idx)  # Add placeholder author
+            for triple in self.heritage_row_triples(row):
+                self.my_graph.add(triple)
 
         # Serialize graph to a local file
         turtle_file_path = "output_triples.ttl"
         self.my_graph.serialize(destination=turtle_file_path, format="ttl")
 
         # Log the creation of the Turtle file
-        print(f"Turtle file created at: {turtle_file_path}")
-        with open(turtle_file_path, 'r') as f:
-            print(f"Contents of the Turtle file:\n{f.read()[:500]}")  # Log first 500 characters
+        logger.info("Turtle file created at: %s", turtle_file_path)
+        if logger.isEnabledFor(logging.DEBUG):
+            with open(turtle_file_path, 'r') as f:
+                logger.debug("Contents of the Turtle file:\n%s", f.read(500))  # Log first 500 characters
 
         # Upload triples to the Blazegraph database
-        if not self.upload_to_blazegraph(turtle_file_path, "http://127.0.0.1:9999/blazegraph/sparql"):
-            print("Failed to upload RDF to Blazegraph!")
+        if not self.upload_to_blazegraph(turtle_file_path, self._endpoint()):
+            logger.error("Failed to upload RDF to Blazegraph!")
             return
 
 
@@ -600,38 +3563,294 @@ class MetadataUploadHandler(UploadHandler):  # Ekaterina
         }
         return class_mapping.get(type_value, None)
 
-    def add_author_data(self, row, resource_uri, idx):
-        # Add author data to the RDF graph
-        author = row["Author"]
+    def heritage_row_triples(self, row, described: Optional[OrderedDict] = None):
+        """
+        Yields the triples describing one row of the metadata CSV.
+
+        Args:
+            row: The row, as a pandas Series or a dict keyed by the CSV header.
+            described (OrderedDict, optional): Recently described author IRIs. Authors found
+                in it only get their creator link, not their description again.
+        """
+        resource_uri = URIRef(f"{self.base_url}{row['Id']}")
+
+        # Handle missing and whitespace values
+        date = row["Date"].strip() if row["Date"].strip() else "Unknown"
+        title = row["Title"].strip() if row["Title"].strip() else "Unknown"
+        owner = row["Owner"].strip() if row["Owner"].strip() else "Unknown"
+        place = row["Place"].strip() if row["Place"].strip() else "Unknown"
+
+        yield (resource_uri, RDF.type, self.get_class_uri(row["Type"]))
+        yield (resource_uri, self.identifier, Literal(row["Id"]))
+        yield (resource_uri, self.title, Literal(title))
+        yield (resource_uri, self.date, Literal(date))
+        yield (resource_uri, self.owner, Literal(owner))
+        yield (resource_uri, self.place, Literal(place))
+
+        # Objects without an author get a placeholder one
+        author = row["Author"] if row["Author"].strip() else "Unknown"
+        yield from self.author_triples(author, resource_uri, described)
+
+    def author_triples(self, author: str, resource_uri: URIRef, described: Optional[OrderedDict] = None):
+        # Triples linking an object to its author and describing the author
         text_before_parentheses = author.split(" (")[0]
+        authorIRI = URIRef(self.base_url + text_before_parentheses.replace(" ", "_").replace(",", ""))
+        yield (resource_uri, self.hasAuthor, authorIRI)
+
+        if described is not None:
+            if authorIRI in described:
+                described.move_to_end(authorIRI)
+                return
+            described[authorIRI] = True
+            if len(described) > AUTHOR_CACHE_SIZE:
+                described.popitem(last=False)
+
         authorID = re.findall(r"\((.*?)\)", author)
         authorID = authorID[0] if authorID else "noID"
-        authorIRI = self.base_url + text_before_parentheses.replace(" ", "_").replace(",", "")
+        yield (authorIRI, self.identifier, Literal(authorID))
+        yield (authorIRI, RDF.type, self.Author)
+        yield (authorIRI, self.label, Literal(text_before_parentheses))
+
+    def add_author_data(self, row, resource_uri, idx):
+        # Add author data to the RDF graph
+        for triple in self.author_triples(row["Author"], resource_uri):
+            self.my_graph.add(triple)
+
+    @instrumented
+    def stream_heritage_data(self, file_path: str, sink=None) -> dict:
+        """
+        Converts a metadata CSV to RDF and writes the triples to a sink as they are produced.
+
+        The CSV is parsed `csv_chunk_size` rows at a time and the sink receives a single
+        generator over all of its triples, so neither the DataFrame nor the graph is ever
+        held in memory as a whole. The sink is closed once the file has been converted.
+
+        Args:
+            file_path (str): Path of the CSV file (same layout as meta.csv).
+            sink: A GraphSink, NTriplesFileSink, SPARQLUploadSink or EmbeddedStoreSink. By
+                default the triples are uploaded to the Blazegraph endpoint.
+
+        Returns:
+            dict: Number of rows read and triples written, and elapsed seconds.
+        """
+        if sink is None:
+            sink = SPARQLUploadSink(SPARQLBulkLoader(BLAZEGRAPH_ENDPOINT, self.chunk_size, self.retries, self.backoff))
+        started = time.perf_counter()
+        rows = 0
+        described = OrderedDict()
+
+        def triples():
+            nonlocal rows
+            chunks = pd.read_csv(file_path, keep_default_na=False, dtype=META_CSV_DTYPES, chunksize=self.csv_chunk_size)
+            for chunk in chunks:
+                for row in chunk.to_dict("records"):
+                    rows += 1
+                    yield from self.heritage_row_triples(row, described)
+
+        try:
+            written = sink.write(triples())
+        finally:
+            sink.close()
+            if isinstance(sink, SPARQLUploadSink):
+                invalidate_query_cache(sink.loader.endpoint)
+            elif isinstance(sink, EmbeddedStoreSink):
+                invalidate_query_cache(sink.store.url)
+
+        elapsed = time.perf_counter() - started
+        logger.info("Streamed %d triples from %d rows in %.3fs.", written, rows, elapsed,
+                    extra={"rows": rows, "triples": written, "seconds": elapsed})
+        return {"rows": rows, "triples": written, "seconds": elapsed}
+
+    def heritage_row_lines(self, row):
+        """
+        Splits the triples of one metadata row into the row's own triples and the
+        description of its author, as N-Triples lines.
+
+        Returns:
+            tuple: (object lines, author IRI, author description lines).
+        """
+        resource_uri = URIRef(f"{self.base_url}{row['Id']}")
+        own, described = [], []
+        author = None
+        for triple in self.heritage_row_triples(row):
+            if triple[0] == resource_uri:
+                own.append(ntriples_line(triple))
+                if triple[1] == self.hasAuthor:
+                    author = triple[2]
+            else:
+                described.append(ntriples_line(triple))
+        return own, str(author), described
+
+    @instrumented
+    def sync_heritage_data(self, file_path: str, target: Optional[str] = None) -> dict:
+        """
+        Brings a graph store in line with a metadata CSV by sending only the differences.
+
+        Every row is compared, by a hash of its content, with the row synced last time
+        according to the manifest. New rows get their triples inserted, removed rows get
+        them deleted and changed rows get the triples they lost deleted and the ones they
+        gained inserted, in DELETE DATA / INSERT DATA requests of up to `chunk_size`
+        triples. Authors are described once and their description is deleted when no row
+        links to them any more. The manifest is only committed once the store has taken
+        every request; as both kinds of update are idempotent, a failed sync is simply
+        run again. With an empty manifest the first sync inserts everything.
+
+        Args:
+            file_path (str): Path of the CSV file (same layout as meta.csv).
+            target (str, optional): URL of the SPARQL endpoint or embedded store;
+                dbPathOrUrl, or the Blazegraph endpoint, by default.
+
+        Returns:
+            dict: Number of rows read, added, changed, removed and unchanged, triples
+                deleted and inserted, update requests and elapsed seconds.
+        """
+        target = target or self.dbPathOrUrl or BLAZEGRAPH_ENDPOINT
+        store = get_embedded_store(target)
+        if store is not None:
+            sink = SPARQLDeltaSink(store=store, chunk_size=self.chunk_size)
+        else:
+            sink = SPARQLDeltaSink(SPARQLBulkLoader(target, self.chunk_size, self.retries, self.backoff),
+                                   chunk_size=self.chunk_size)
+        started = time.perf_counter()
+        stats = {"rows": 0, "added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+
+        conn = sqlite3.connect(self.manifest, isolation_level=None)
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN")
+            for statement in METADATA_MANIFEST_SCHEMA:
+                c.execute(statement)
+            c.execute("CREATE TEMP TABLE seen (id TEXT PRIMARY KEY) WITHOUT ROWID")
+
+            chunks = pd.read_csv(file_path, keep_default_na=False, dtype=META_CSV_DTYPES, chunksize=self.csv_chunk_size)
+            for chunk in chunks:
+                records = chunk.to_dict("records")
+                ids = [row["Id"] for row in records]
+                c.executemany("INSERT OR IGNORE INTO temp.seen (id) VALUES (?)", ((i,) for i in ids))
+                known = {}
+                for batch in batched(list(dict.fromkeys(ids)), ID_FILTER_BATCH_SIZE):
+                    known.update((i, (digest, row)) for i, digest, row in c.execute(
+                        f"SELECT id, hash, row FROM metadata_manifest WHERE target = ? "
+                        f"AND id IN ({', '.join('?' * len(batch))})", (target, *batch)
+                    ))
+
+                for row in records:
+                    stats["rows"] += 1
+                    encoded = json.dumps({column: row[column] for column in META_CSV_DTYPES},
+                                         separators=(",", ":"), ensure_ascii=False)
+                    digest = hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+                    old = known.get(row["Id"])
+                    if old is not None and old[0] == digest:
+                        stats["unchanged"] += 1
+                        continue
+
+                    own, author, description = self.heritage_row_lines(row)
+                    if old is None:
+                        sink.insert(own)
+                        stats["added"] += 1
+                    else:
+                        old_own = self.heritage_row_lines(json.loads(old[1]))[0]
+                        kept = set(own).intersection(old_own)
+                        sink.delete(line for line in old_own if line not in kept)
+                        sink.insert(line for line in own if line not in kept)
+                        stats["changed"] += 1
+                    if c.execute(
+                        "SELECT 1 FROM metadata_manifest_author WHERE target = ? AND iri = ?", (target, author)
+                    ).fetchone() is None:
+                        sink.insert(description)
+                        c.execute("INSERT INTO metadata_manifest_author (target, iri, triples) VALUES (?, ?, ?)",
+                                  (target, author, "".join(description)))
+                    c.execute(METADATA_MANIFEST_UPSERT, (target, row["Id"], digest, encoded, author))
+                    known[row["Id"]] = (digest, encoded)
+
+            # Rows no longer in the file, then authors no row links to
+            removed = c.execute(
+                "SELECT id, row FROM metadata_manifest WHERE target = ? AND id NOT IN (SELECT id FROM temp.seen)",
+                (target,),
+            ).fetchall()
+            for object_id, row in removed:
+                sink.delete(self.heritage_row_lines(json.loads(row))[0])
+                c.execute("DELETE FROM metadata_manifest WHERE target = ? AND id = ?", (target, object_id))
+            stats["removed"] = len(removed)
+            for iri, description in c.execute(METADATA_ORPHAN_AUTHORS, (target,)).fetchall():
+                sink.delete(description.splitlines(keepends=True))
+                c.execute("DELETE FROM metadata_manifest_author WHERE target = ? AND iri = ?", (target, iri))
+
+            sink.close()
+            c.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+            # Cached query results may be stale now, even after a partial sync
+            if sink.stats["requests"] or sink.deletes or sink.inserts:
+                invalidate_query_cache(target)
 
-        self.my_graph.add((resource_uri, self.hasAuthor, URIRef(authorIRI)))
-        self.my_graph.add((URIRef(authorIRI), self.identifier, Literal(authorID)))
-        self.my_graph.add((URIRef(authorIRI), RDF.type, self.Author))
-        self.my_graph.add((URIRef(authorIRI), self.label, Literal(text_before_parentheses)))
+        stats.update(sink.stats)
+        stats["seconds"] = time.perf_counter() - started
+        logger.info("Synced %d rows in %.3fs: %d added, %d changed, %d removed; %d triples deleted, %d inserted.",
+                    stats["rows"], stats["seconds"], stats["added"], stats["changed"], stats["removed"],
+                    stats["deleted"], stats["inserted"], extra=stats)
+        return stats
+
+    def upload_csv_to_blazegraph(self, file_path: str, sparql_endpoint: str) -> bool:
+        if self.mode == "delta":
+            try:
+                self.sync_heritage_data(file_path, self.dbPathOrUrl or sparql_endpoint)
+            except Exception as e:
+                logger.error("Error during upload to Blazegraph: %s", e)
+                return False
+            return True
+        if self.mode != "streaming":
+            return super().upload_csv_to_blazegraph(file_path, sparql_endpoint)
+
+        # Stream the file straight to the store or endpoint, a chunk of triples per request
+        target = self.dbPathOrUrl or sparql_endpoint
+        store = get_embedded_store(target)
+        if store is not None:
+            sink = EmbeddedStoreSink(store)
+        else:
+            sink = SPARQLUploadSink(SPARQLBulkLoader(target, self.chunk_size, self.retries, self.backoff))
+        try:
+            self.stream_heritage_data(file_path, sink)
+        except Exception as e:
+            logger.error("Error during upload to Blazegraph: %s", e)
+            return False
+        return True
 
     def upload_to_blazegraph(self, turtle_file, sparql_endpoint):
-        # Upload RDF triples to Blazegraph
-        store = SPARQLUpdateStore()
-        store.open((sparql_endpoint, sparql_endpoint))
-        
+        store = get_embedded_store(self.dbPathOrUrl)
+        if store is not None:
+            # Load the graph into the embedded store set with setDbPathOrUrl instead
+            sink = EmbeddedStoreSink(store)
+            try:
+                sink.write(self.my_graph.triples((None, None, None)))
+            finally:
+                sink.close()
+                invalidate_query_cache(store.url)
+            logger.info("Loaded %d triples into %s.", sink.count, store.url, extra={"triples": sink.count})
+            return True
+
+        # Upload RDF triples to Blazegraph, a chunk of triples per request
+        loader = SPARQLBulkLoader(sparql_endpoint, self.chunk_size, self.retries, self.backoff)
+
         # Upload triples to the Blazegraph database
         try:
-            for triple in self.my_graph.triples((None, None, None)):
-                store.add(triple)
-            store.close()
+            sent = loader.load(self.my_graph.triples((None, None, None)))
         except Exception as e:
-            print(f"Error during upload to Blazegraph: {e}")
-            store.close() 
+            logger.error("Error during upload to Blazegraph: %s", e)
             raise Exception("Failed to upload RDF to Blazegraph!")
+        finally:
+            # Cached query results may be stale now, even after a partial upload
+            invalidate_query_cache(sparql_endpoint)
+        logger.info("Uploaded %d triples in %d requests.", sent, loader.stats["requests"], extra={"triples": sent})
 
         # Run a SPARQL query to confirm upload
-        return self.run_sparql_query()
+        return self.run_sparql_query(sparql_endpoint)
 
-    def run_sparql_query(self):
+    def run_sparql_query(self, sparql_endpoint: Optional[str] = None):
         # Run a SPARQL query to confirm that data has been uploaded
         sparql_query = """
             SELECT ?subject ?predicate ?object
@@ -640,200 +3859,377 @@ class MetadataUploadHandler(UploadHandler):  # Ekaterina
             }
             ORDER BY ASC(xsd:integer(REPLACE(str(?subject), "https://github.com/katyakrsn/ds24project/", "")))
         """
-        sparql_endpoint = "http://127.0.0.1:9999/blazegraph/sparql"
-        response = requests.post(sparql_endpoint, data={"query": sparql_query})
+        sparql_endpoint = sparql_endpoint or self._endpoint()
+        response = get_http_session(sparql_endpoint).post(
+            sparql_endpoint, data={"query": sparql_query}, timeout=(SPARQL_CONNECT_TIMEOUT, SPARQL_QUERY_TIMEOUT)
+        )
         
         if response.status_code != 200:
-            print(f"Error during SPARQL query: {response.status_code} - {response.reason}")
+            logger.error("Error during SPARQL query: %s - %s", response.status_code, response.reason)
             return False
         else:
-            print("SPARQL query executed successfully.")
-            print(f"Response: {response.text}")
+            logger.info("SPARQL query executed successfully.")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response: %s", response.text)
             return True
                 
 class QueryHandler(Handler):
     def __init__(self):
         super().__init__()
 
+    @instrumented
     def getById(self, input_id: str) -> pd.DataFrame:  # Ekaterina/Rubens
-        endpoint = self.blazegraph_endpoint
-        id_author_query = f"""
-        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX schema: <https://schema.org/>
-
-        SELECT ?identifier ?name ?title
-        WHERE {{
-            ?entity schema:identifier "{input_id}" .
-            ?entity schema:creator ?Author .
-            ?Author rdfs:label ?name .
-            ?Author schema:identifier ?identifier .
-            ?entity schema:name ?title
-        }}
-        """
-        df_sparql = get(endpoint, id_author_query, True)
+        df_sparql = self._sparql(ENTITY_BY_ID_QUERY % {"id": input_id})
         return df_sparql
 
 class MetadataQueryHandler(QueryHandler):
-    def __init__(self):
+    def __init__(
+        self,
+        cache: Union[QueryResultCache, bool, None] = None,  # None for the shared cache, False to disable caching
+        pool_size: int = SPARQL_POOL_SIZE,  # Keep-alive connections to the endpoint's host
+        timeout: float = SPARQL_QUERY_TIMEOUT,  # Seconds to wait for the result of a query
+        result_format: str = "csv",  # "csv", or "json" for columns typed by the literals' datatypes
+    ):
+        super().__init__()
+        if result_format not in SPARQL_RESULT_FORMATS:
+            raise ValueError(f"Unknown result format: {result_format}")
         self.blazegraph_endpoint = BLAZEGRAPH_ENDPOINT
         self.csv_file_path = CSV_FILEPATH
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.result_format = result_format
+        if cache is None or cache is True:
+            cache = get_query_cache()
+        self.cache = cache or None
+
+    def _endpoint(self) -> str:
+        # The endpoint set with setDbPathOrUrl, or the default Blazegraph one
+        return self.dbPathOrUrl or self.blazegraph_endpoint
+
+    def _cache_key(self, query: str) -> str:
+        # Results in either format are cached apart
+        return query if self.result_format == "csv" else f"#{self.result_format}\n{query}"
+
+    def _sparql(self, query: str) -> pd.DataFrame:
+        # Run a SELECT query on the endpoint, answering from the result cache when possible
+        endpoint = self._endpoint()
+        key = self._cache_key(query)
+        if self.cache is not None:
+            df = self.cache.get(endpoint, key)
+            if df is not None:
+                return df
+            generation = self.cache.generation()
+        store = get_embedded_store(endpoint)
+        if store is not None:
+            df = store.query(query, self.result_format)
+        else:
+            df = sparql_select(endpoint, query, self.timeout, self.pool_size, self.result_format)
+        if self.cache is not None:
+            self.cache.put(endpoint, key, df, generation)
+        return df
+
+    def getCacheStats(self) -> dict:
+        # Counters of the result cache used by this handler
+        return self.cache.getStats() if self.cache is not None else {}
 
+    @instrumented
     def getAllPeople(self) -> pd.DataFrame:  # Rubens
-        sparql_query = """
-        PREFIX schema: <https://schema.org/>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        
-        SELECT ?id ?name
-        WHERE {
-            ?entity schema:creator ?Author .
-            ?Author rdfs:label ?name .
-            ?Author schema:identifier ?id .
-        }
-        """
-        df_sparql = get(self.blazegraph_endpoint, sparql_query, True)
+        df_sparql = self._sparql(PEOPLE_QUERY)
         return df_sparql
 
+    @instrumented
     def getAllCulturalHeritageObjects(self) -> pd.DataFrame:  # Ekaterina
-        endpoint = self.blazegraph_endpoint
-        cultural_object_query = """
-        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX schema: <https://schema.org/>
+        cultural_object_query = CULTURAL_OBJECTS_QUERY % {"page": ""}
+        df_sparql = self._sparql(cultural_object_query)
+        return df_sparql
 
-        SELECT (REPLACE(STR(?type), "https://schema.org/", "") AS ?type_name) ?id ?title ?date ?owner ?place ?author_id ?author_name
-        WHERE {
-        ?cultural_object rdf:type ?type .
-        ?cultural_object schema:name ?title .
-        OPTIONAL { ?cultural_object schema:identifier ?id }
-        OPTIONAL { ?cultural_object schema:dateCreated ?date }
-        OPTIONAL { ?cultural_object schema:provider ?owner }
-        OPTIONAL { ?cultural_object schema:contentLocation ?place }
-        OPTIONAL { ?cultural_object schema:creator ?author }
-        OPTIONAL { ?author schema:identifier ?author_id }
-        OPTIONAL { ?author rdfs:label ?author_name }
-        
-        FILTER(?type IN (
-        <https://schema.org/NauticalChart>,
-        <https://schema.org/ManuscriptPlate>,
-        <https://schema.org/ManuscriptVolume>,
-        <https://schema.org/PrintedVolume>,
-        <https://schema.org/PrintedMaterial>,
-        <https://schema.org/Herbarium>,
-        <https://schema.org/Specimen>,
-        <https://schema.org/Painting>,
-        <https://schema.org/Model>,
-        <https://schema.org/Map>
-        ))
-        FILTER(?author_name != "NaN")
-        FILTER(?author_id != "NaN")
-        }
+    @instrumented
+    def getCulturalHeritageObjectsByIds(self, ids: list, batch_size: int = ID_FILTER_BATCH_SIZE) -> pd.DataFrame:
         """
-        df_sparql = get(endpoint, cultural_object_query, True)
-        return df_sparql
+        Returns the rows of getAllCulturalHeritageObjects for the objects with the given ids.
 
-    def getAuthorsOfCulturalHeritageObject(self, input_id) -> pd.DataFrame:  # Rubens
-        endpoint = self.blazegraph_endpoint
-        id_author_query = f"""
-        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX schema: <https://schema.org/>
+        The ids are sent to the endpoint in a VALUES clause, `batch_size` per query, so
+        only the objects asked for are transferred.
+        """
+        ids = list(dict.fromkeys(str(object_id) for object_id in ids))
+        frames = []
+        for batch in batched(ids, batch_size):
+            page = CULTURAL_OBJECTS_BY_ID % {"ids": sparql_values(batch)}
+            frames.append(self._sparql(CULTURAL_OBJECTS_QUERY % {"page": page}))
+        if not frames:
+            return pd.DataFrame(columns=CULTURAL_OBJECTS_COLUMNS)
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def iterAllPeople(self, page_size: int = ITER_PAGE_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        Yields the distinct people of getAllPeople, `page_size` at a time.
 
-        SELECT ?id ?name
-        WHERE {{
-            ?entity schema:identifier "{input_id}" .
-            ?entity schema:creator ?Author .
-            ?Author rdfs:label ?name .
-            ?Author schema:identifier ?id .
-        }}
+        Each page is one query (ordered by id, with LIMIT and OFFSET), run only when the
+        consumer asks for it.
+        """
+        offset = 0
+        while True:
+            df = self._sparql(PEOPLE_PAGE_QUERY % {"limit": page_size, "offset": offset})
+            if not df.empty:
+                yield df
+            if len(df) < page_size:
+                return
+            offset += page_size
+
+    def iterAllCulturalHeritageObjects(self, page_size: int = ITER_PAGE_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        Yields the rows of getAllCulturalHeritageObjects for `page_size` objects at a time.
+
+        Pages select objects, not rows, so all the author rows of an object come in the same
+        page. Each page is one query, run only when the consumer asks for it.
         """
-        df_sparql = get(endpoint, id_author_query, True)
+        offset = 0
+        while True:
+            page = CULTURAL_OBJECTS_PAGE % {"limit": page_size, "offset": offset}
+            df = self._sparql(CULTURAL_OBJECTS_QUERY % {"page": page})
+            if not df.empty:
+                yield df
+            if df.empty or df["id"].nunique() < page_size:
+                return
+            offset += page_size
+
+    @instrumented
+    def getAuthorsOfCulturalHeritageObject(self, input_id) -> pd.DataFrame:  # Rubens
+        df_sparql = self._sparql(AUTHORS_OF_OBJECT_QUERY % {"id": input_id})
         return df_sparql
 
+    @instrumented
+    def getAuthorsOfCulturalHeritageObjects(self, ids: list, batch_size: int = ID_FILTER_BATCH_SIZE) -> pd.DataFrame:
+        """
+        Returns the authors of several objects at once, one row per object and author.
+
+        The ids are sent to the endpoint in a VALUES clause, `batch_size` per query, instead
+        of one getAuthorsOfCulturalHeritageObject query per object.
+
+        Returns:
+            pd.DataFrame: The columns object_id, id and name.
+        """
+        ids = list(dict.fromkeys(str(object_id) for object_id in ids))
+        frames = [
+            self._sparql(AUTHORS_BY_OBJECT_QUERY % {"ids": sparql_values(batch)})
+            for batch in batched(ids, batch_size)
+        ]
+        if not frames:
+            return pd.DataFrame(columns=["object_id", "id", "name"])
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    @instrumented
     def getCulturalHeritageObjectsAuthoredBy(
         self, input_id
     ) -> pd.DataFrame:  # Ekaterina
-        endpoint = self.blazegraph_endpoint
-        id_cultural_query = f"""
-        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX schema: <https://schema.org/>
-
-        SELECT ?object ?type_name ?id ?title ?date ?owner ?place ?name ?author_id
-            WHERE {{
-            ?entity schema:identifier "{input_id}" .
-            ?entity schema:creator ?Author .
-            ?object schema:creator ?Author .
-            ?object rdf:type ?type .
-            ?object schema:name ?title .
-            ?object schema:identifier ?id .
-            ?object schema:dateCreated ?date .
-            ?object schema:provider ?owner .
-            ?object schema:contentLocation ?place .
-            OPTIONAL {{
-                ?object schema:creator ?Author .
-                ?Author rdfs:label ?name .
-                ?Author schema:identifier ?author_id .
-            }}
-            BIND(REPLACE(STR(?type), "https://schema.org/", "") AS ?type_name)
-            FILTER(?type IN (
-                    <https://schema.org/NauticalChart>,
-                    <https://schema.org/ManuscriptPlate>,
-                    <https://schema.org/ManuscriptVolume>,
-                    <https://schema.org/PrintedVolume>,
-                    <https://schema.org/PrintedMaterial>,
-                    <https://schema.org/Herbarium>,
-                    <https://schema.org/Specimen>,
-                    <https://schema.org/Painting>,
-                    <https://schema.org/Model>,
-                    <https://schema.org/Map>
-                    ))
-            }}
-            """
-
-        df_sparql = get(endpoint, id_cultural_query, True)
+        df_sparql = self._sparql(OBJECTS_AUTHORED_BY_QUERY % {"id": input_id})
         df_sparql.drop_duplicates(inplace=True)
         return df_sparql
 
 
 class ProcessDataQueryHandler(QueryHandler):
-    def __init__(self):
+    def __init__(
+        self,
+        pool_size: int = SQLITE_POOL_SIZE,  # Maximum number of open connections to the database
+        pool_idle_timeout: float = SQLITE_POOL_IDLE_TIMEOUT,  # Seconds before an idle connection is closed
+        serving: bool = False,  # Read-only serving: the database is immutable and memory-mapped, and only
+                                # ever replaced by an atomic rename, picked up without a restart
+    ):
         super().__init__()
+        self.pool_size = pool_size
+        self.pool_idle_timeout = pool_idle_timeout
+        self.serving = serving
+
+    def setDbPathOrUrl(self, pathOrUrl: str) -> bool:
+        result = super().setDbPathOrUrl(pathOrUrl)
+        if self.serving and self._snapshot() is None:
+            # Open and warm up the connections before the first query
+            self._pool().prepare()
+        return result
+
+    def _db_file(self) -> str:
+        # The database set with setDbPathOrUrl, or the one the upload handler writes by default
+        return self.dbPathOrUrl or DEFAULT_PROCESS_DB
+
+    def _pool(self) -> SQLiteConnectionPool:
+        return get_sqlite_pool(
+            self._db_file(), self.pool_size, self.pool_idle_timeout,
+            self.serving, self._statements if self.serving else None,
+        )
+
+    def _tables(self) -> set:
+        # Names of the tables in the database, used to pick the queries for its schema
+        return self._pool().tables()
+
+    def _statements(self, tables: set) -> List[str]:
+        # The statements of the query methods for a database with `tables`, prepared up
+        # front by serving pools
+        if "activity" not in tables:
+            return [TABLES_ACTIVITY_SELECT, TABLES_TIME_FRAME_OBJECTS_SELECT]
+        statements = [
+            ACTIVITY_SELECT,
+            self._time_frame_query(tables, "2000-01-01", "2000-01-01")[0],
+            ACQUISITION_SELECT + " AND " + self._text_filter(tables, "technique", "")[0],
+        ]
+        for column in ("responsible_institute", "responsible_person", "tool"):
+            statements.append(ACTIVITY_SELECT + " WHERE " + self._text_filter(tables, column, "")[0])
+        for condition in ACTIVITY_PERIOD_CONDITIONS:
+            dates = ("2000-01-01",) * ACTIVITY_PERIOD_CONDITIONS[condition][0].count("?")
+            statements.append(ACTIVITY_SELECT + " WHERE " + self._period_filter(tables, condition, *dates)[0])
+        return statements
+
+    def _snapshot(self) -> Optional[str]:
+        # The directory of the Parquet snapshot set with setDbPathOrUrl, if any
+        return parquet_snapshot_path(self.dbPathOrUrl)
+
+    def _read_snapshot(self, filter=None, column: Optional[str] = None, value: Optional[str] = None) -> pd.DataFrame:
+        """
+        Reads the activities matching `filter` from the Parquet snapshot, with the columns
+        of the SQL queries, keeping only those whose `column` contains `value` if given.
+        The tool lists are only read when matching against them; like the SQL results,
+        the rows have no tool and are distinct.
+        """
+        columns = [name for name in ACTIVITY_RESULT_COLUMNS if name != "tool"]
+        table = open_activity_parquet(self._snapshot()).to_table(
+            columns=columns + (["tool"] if column == "tool" else []), filter=filter
+        )
+        if column is not None:
+            table = table.take(substring_rows(table.column(column), value))
+        df = decode_activity_table(table.select(columns)).to_pandas().drop_duplicates(ignore_index=True)
+        for name in df.columns:
+            # Like pandas.read_sql, columns without values hold None rather than NaN
+            if df[name].isna().all():
+                df[name] = None
+        df.insert(ACTIVITY_RESULT_COLUMNS.index("tool"), "tool", None)
+        return df
+
+    @timed_stage("sql")
+    def _read_sql(self, query: str, params=()) -> pd.DataFrame:
+        # Run a query on a pooled connection to the handler's database
+        with self._pool().connection() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def _text_filter(self, tables: set, column: str, value: str):
+        """
+        Returns the WHERE clause and parameters matching `value` as a substring of `column`
+        in the activity schema. With a full-text index, candidate rows come from the index
+        and the LIKE is only re-checked on them, so results are the same as without it.
+        """
+        like_param = f"%{value}%"
+        if column == "tool":
+            clause = "EXISTS (SELECT 1 FROM activity_tool t WHERE t.activity_id = activity.id AND t.tool LIKE ?)"
+        else:
+            clause = f"{column} LIKE ?"
+        if "activity_fts" in tables:
+            return f"id IN (SELECT rowid FROM activity_fts WHERE {column} LIKE ?) AND {clause}", (like_param, like_param)
+        return clause, (like_param,)
+
+    def _period_filter(self, tables: set, condition: str, *dates: str):
+        """
+        Returns the WHERE clause and parameters of a date condition of
+        ACTIVITY_PERIOD_CONDITIONS in the activity schema. With the interval index, and
+        ISO dates, the matching activities come from a range search in the index on day
+        numbers; otherwise the date columns are compared as text.
+        """
+        on_index, on_columns = ACTIVITY_PERIOD_CONDITIONS[condition]
+        days = tuple(period_day(date) for date in dates)
+        if "activity_period" in tables and None not in days:
+            return f"id IN (SELECT id FROM activity_period WHERE {on_index})", days
+        return on_columns, tuple(dates)
+
+    def _time_frame_query(self, tables: set, start_date: str, end_date: str):
+        # The query and parameters of getObjectIdsInTimeFrame for the activity schema
+        acquired, acquired_params = self._period_filter(tables, "started_after", start_date)
+        exported, exported_params = self._period_filter(tables, "ended_before", end_date)
+        return TIME_FRAME_OBJECTS_SELECT % {"acquired": acquired, "exported": exported}, acquired_params + exported_params
+
+    def _activities_in_period(self, condition: str, *dates: str) -> pd.DataFrame:
+        # The activities matching a date condition of ACTIVITY_PERIOD_CONDITIONS
+        snapshot = self._snapshot()
+        if snapshot is not None:
+            pc = require_pyarrow()[2]
+            start, end = (dates[1], dates[0]) if condition == "overlapping" else dates
+            if condition == "overlapping":
+                return self._read_snapshot((pc.field("start_date") <= end) & (pc.field("end_date") >= start))
+            return self._read_snapshot(self._snapshot_started_after(start) & (pc.field("end_date") <= end))
+        try:
+            tables = self._tables()
+            if "activity" in tables:
+                where, params = self._period_filter(tables, condition, *dates)
+                return self._read_sql(ACTIVITY_SELECT + " WHERE " + where, params=params)
+            return self._read_sql(
+                f"SELECT * FROM ({TABLES_ACTIVITY_SELECT}) WHERE {ACTIVITY_PERIOD_CONDITIONS[condition][1]}",
+                params=dates,
+            )
 
+        except sqlite3.Error as e:
+            logger.error("SQLite error: %s", e)
+
+    def _snapshot_started_after(self, start_date: str):
+        # Snapshot filter for start_date >= `start_date`, also skipping the earlier years'
+        # partitions (dates not starting with a year are in the partition without one)
+        pc = require_pyarrow()[2]
+        condition = pc.field("start_date") >= start_date
+        if start_date[:4].isdigit():
+            year = pc.field("start_year")
+            condition = condition & ((year >= int(start_date[:4])) | year.is_null())
+        return condition
+
+    @instrumented
     def getById(self, id: str):  # Rubens
         return pd.DataFrame()
 
+    @instrumented
     def getAllActivities(self) -> pd.DataFrame:  # Rubens
-        db_file = "json.db"
+        if self._snapshot() is not None:
+            return self._read_snapshot()
         try:
-            conn = sqlite3.connect(db_file)
+            if "activity" in self._tables():
+                return self._read_sql(ACTIVITY_SELECT)
 
-            # Use LIKE operator to match partially with the technique string
-            query = """
-                SELECT object_id, responsible_institute, responsible_person, technique, NULL as tool, start_date, end_date, 'Acquisition' as type  FROM Acquisition
-                UNION
-                SELECT object_id, responsible_institute, responsible_person, NULL as technique, NULL as tool, start_date, end_date, 'Processing' as type  FROM Processing
-                UNION
-                SELECT object_id, responsible_institute, responsible_person, NULL as technique, NULL as tool, start_date, end_date, 'Modelling' as type  FROM Modelling
-                UNION
-                SELECT object_id, responsible_institute, responsible_person, NULL as technique, NULL as tool, start_date, end_date, 'Optimising' as type  FROM Optimising
-                UNION
-                SELECT object_id, responsible_institute, responsible_person, NULL as technique, NULL as tool, start_date, end_date, 'Exporting' as type  FROM Exporting
-            """
-            df = pd.read_sql_query(query, conn)
+            df = self._read_sql(TABLES_ACTIVITY_SELECT)
             return df
 
         except sqlite3.Error as e:
-            print("SQLite error:", e)
-        finally:
-            conn.close()
+            logger.error("SQLite error: %s", e)
+
+    def iterAllActivities(self, page_size: int = ITER_PAGE_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        Yields the rows of getAllActivities as DataFrames of at most `page_size` rows.
 
+        The rows are fetched from an open cursor one page at a time, so a consumer that
+        stops early never reads the rest of the result. The pooled connection is held until
+        the iterator is exhausted or closed. A Parquet snapshot is read at once and paged.
+        """
+        if self._snapshot() is not None:
+            df = self._read_snapshot()
+            for start in range(0, len(df), page_size):
+                yield df.iloc[start:start + page_size].reset_index(drop=True)
+            return
+        query = ACTIVITY_SELECT if "activity" in self._tables() else TABLES_ACTIVITY_SELECT
+        with self._pool().connection() as conn:
+            cursor = conn.execute(query)
+            try:
+                columns = [description[0] for description in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(page_size)
+                    if not rows:
+                        return
+                    yield pd.DataFrame.from_records(rows, columns=columns)
+            finally:
+                cursor.close()
+
+    @instrumented
     def getActivitiesByResponsibleInstitution(
         self, institution_str: str
     ) -> pd.DataFrame:  # Ekaterina
-        db_file = "json.db"
+        if self._snapshot() is not None:
+            return self._read_snapshot(column="responsible_institute", value=institution_str)
         try:
-            conn = sqlite3.connect(db_file)
+            tables = self._tables()
+            if "activity" in tables:
+                where, params = self._text_filter(tables, "responsible_institute", institution_str)
+                return self._read_sql(ACTIVITY_SELECT + " WHERE " + where, params=params)
 
             # Use LIKE operator to match partially with the technique string
             query = """
@@ -851,15 +4247,14 @@ class ProcessDataQueryHandler(QueryHandler):
             params = (like_param, like_param, like_param, like_param, like_param)
 
             # Fetch the data using pandas
-            df = pd.read_sql_query(query, conn, params=params)
+            df = self._read_sql(query, params=params)
             return df
 
         except sqlite3.Error as e:
-            print("SQLite error:", e)
-        finally:
-            conn.close()
+            logger.error("SQLite error: %s", e)
 
     # Ben
+    @instrumented
     def getActivitiesByResponsiblePerson(
         self, responsible_person_str: str
     ) -> pd.DataFrame:
@@ -879,14 +4274,15 @@ class ProcessDataQueryHandler(QueryHandler):
                         for object ID, responsible institute, responsible person, 
                         technique, tool, start date, end date, and activity type.
         """
-        
-        # Define the database file name
-        db_file = "json.db"
-        
+
+        if self._snapshot() is not None:
+            return self._read_snapshot(column="responsible_person", value=responsible_person_str)
         try:
-            # Establish a connection to the SQLite database
-            conn = sqlite3.connect(db_file)
-            
+            tables = self._tables()
+            if "activity" in tables:
+                where, params = self._text_filter(tables, "responsible_person", responsible_person_str)
+                return self._read_sql(ACTIVITY_SELECT + " WHERE " + where, params=params)
+
             # SQL query that uses the LIKE operator for partial matching on responsible_person
             # The UNION operator combines rows from multiple tables into one query result.
             query = """
@@ -934,23 +4330,23 @@ class ProcessDataQueryHandler(QueryHandler):
             params = (like_param, like_param, like_param, like_param, like_param)
             
             # Execute the SQL query and load the results into a DataFrame
-            df = pd.read_sql_query(query, conn, params=params)
+            df = self._read_sql(query, params=params)
             return df  # Return the DataFrame containing the query results
 
         except sqlite3.Error as e:
             # Handle potential SQLite errors by printing the error message
-            print("SQLite error:", e)
-        
-        finally:
-            # Ensure the database connection is closed even if an error occurs
-            conn.close()
+            logger.error("SQLite error: %s", e)
 
 
+    @instrumented
     def getActivitiesUsingTool(self, tool_str: str) -> pd.DataFrame:  # Rubens
-        db_file = "json.db"
-
+        if self._snapshot() is not None:
+            return self._read_snapshot(column="tool", value=tool_str)
         try:
-            conn = sqlite3.connect(db_file)
+            tables = self._tables()
+            if "activity" in tables:
+                where, params = self._text_filter(tables, "tool", tool_str)
+                return self._read_sql(ACTIVITY_SELECT + " WHERE " + where, params=params)
 
             # Use LIKE operator to match partially with the tool string
             query = """
@@ -967,14 +4363,13 @@ class ProcessDataQueryHandler(QueryHandler):
             like_param = f"%{tool_str}%"
             params = (like_param, like_param, like_param, like_param, like_param)
 
-            df = pd.read_sql_query(query, conn, params=params)
+            df = self._read_sql(query, params=params)
             return df
 
         except sqlite3.Error as e:
-            print("SQLite error:", e)
-        finally:
-            conn.close()
+            logger.error("SQLite error: %s", e)
 
+    @instrumented
     def getActivitiesStartedAfter(self, start_date: str) -> pd.DataFrame:  # Amanda
         """
         Fetches activities from multiple tables in a database that have a start_date greater than or equal to the provided date.
@@ -986,13 +4381,14 @@ class ProcessDataQueryHandler(QueryHandler):
             pd.DataFrame: A pandas DataFrame containing all matching activities from the Acquisition, Processing, Modelling,
                         Optimising, and Exporting tables, with their relevant columns and activity type.
         """
-    
-        # Name of the SQLite database file to connect to
-        db_file = "json.db"
 
+        if self._snapshot() is not None:
+            return self._read_snapshot(self._snapshot_started_after(start_date))
         try:
-            # Establish a connection to the SQLite database
-            conn = sqlite3.connect(db_file)
+            tables = self._tables()
+            if "activity" in tables:
+                where, params = self._period_filter(tables, "started_after", start_date)
+                return self._read_sql(ACTIVITY_SELECT + " WHERE " + where, params=params)
 
             # Define a SQL query to fetch activities from multiple tables where start_date >= start_date.
             # UNION is used to combine the results from multiple tables, standardizing the output columns.
@@ -1016,24 +4412,18 @@ class ProcessDataQueryHandler(QueryHandler):
             # Use pandas to execute the query and return the results as a DataFrame.
             # The query uses parameterized queries (`?`) to prevent SQL injection attacks.
             # The same start_date parameter is passed for all subqueries.
-            df = pd.read_sql_query(
+            df = self._read_sql(
                 query,  # SQL query string
-                conn,   # Database connection object
                 params=(start_date, start_date, start_date, start_date, start_date),  # Parameters for the query
             )
 
             # Return the resulting DataFrame
             return df
 
-        # No error handling or closing of the database connection is implemented here,
-        # which could be added to improve robustness (e.g., using `with sqlite3.connect(db_file) as conn:`).
-
-
-        except sqlite3.Error as e:
-            print("SQLite error:", e)
-        finally:
-            conn.close()
+        except sqlite3.Error as e:
+            logger.error("SQLite error: %s", e)
 
+    @instrumented
     def getActivitiesEndedBefore(self, end_date: str) -> pd.DataFrame:  # Amanda
         """
         Fetches activities from multiple tables in a database that have an end_date less than or equal to the provided date.
@@ -1048,13 +4438,14 @@ class ProcessDataQueryHandler(QueryHandler):
         Handles:
             - SQLite database errors and logs them to the console.
         """
-        
-        # Name of the SQLite database file to connect to
-        db_file = "json.db"
 
+        if self._snapshot() is not None:
+            return self._read_snapshot(require_pyarrow()[2].field("end_date") <= end_date)
         try:
-            # Establish a connection to the SQLite database
-            conn = sqlite3.connect(db_file)
+            tables = self._tables()
+            if "activity" in tables:
+                where, params = self._period_filter(tables, "ended_before", end_date)
+                return self._read_sql(ACTIVITY_SELECT + " WHERE " + where, params=params)
 
             # Define the SQL query to fetch activities from multiple tables where end_date <= end_date.
             # UNION combines rows from five tables, standardizing the output columns.
@@ -1069,9 +4460,8 @@ class ProcessDataQueryHandler(QueryHandler):
             # Use pandas to execute the query and return the results as a DataFrame.
             # The query uses parameterized queries (`?`) to prevent SQL injection attacks.
             # The same end_date parameter is passed for all subqueries.
-            df = pd.read_sql_query(
+            df = self._read_sql(
                 query,               # SQL query string
-                conn,                # Database connection object
                 params=(end_date, end_date, end_date, end_date, end_date),  # Parameters for the query
             )
 
@@ -1080,32 +4470,249 @@ class ProcessDataQueryHandler(QueryHandler):
 
         except sqlite3.Error as e:
             # Handle SQLite-specific errors and print the error message to the console
-            print("SQLite error:", e)
+            logger.error("SQLite error: %s", e)
 
-        finally:
-            # Ensure the database connection is closed after the query, even if an error occurs
-            conn.close()
 
+    @instrumented
+    def getObjectIdsInTimeFrame(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        Finds, in one query, the objects whose Acquisition started on or after `start_date`
+        and those whose Exporting ended on or before `end_date`.
 
-    def getAcquisitionsByTechnique(self, technique_str: str) -> pd.DataFrame:  # Rubens
-        db_file = "json.db"
+        Returns:
+            pd.DataFrame: The columns object_id and type ('Acquisition' or 'Exporting'), one
+                row per object and matching type. Objects with both rows were acquired and
+                exported within the time frame.
+        """
+        if self._snapshot() is not None:
+            pc = require_pyarrow()[2]
+            acquired = (pc.field("type") == "Acquisition") & self._snapshot_started_after(start_date)
+            exported = (pc.field("type") == "Exporting") & (pc.field("end_date") <= end_date)
+            table = open_activity_parquet(self._snapshot()).to_table(
+                columns=["object_id", "type"], filter=acquired | exported
+            )
+            return table.to_pandas().drop_duplicates(ignore_index=True)
         try:
-            conn = sqlite3.connect(db_file)
+            tables = self._tables()
+            if "activity" in tables:
+                return self._read_sql(*self._time_frame_query(tables, start_date, end_date))
+            return self._read_sql(TABLES_TIME_FRAME_OBJECTS_SELECT, params=(start_date, end_date))
+
+        except sqlite3.Error as e:
+            logger.error("SQLite error: %s", e)
+
+    @instrumented
+    def getActivitiesOverlapping(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        Fetches the activities whose period overlaps the window from `start_date` to
+        `end_date`: started on or before its end and ended on or after its start.
+        """
+        return self._activities_in_period("overlapping", end_date, start_date)
+
+    @instrumented
+    def getActivitiesContainedIn(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        Fetches the activities whose period lies within the window from `start_date` to
+        `end_date`: started on or after its start and ended on or before its end.
+        """
+        return self._activities_in_period("contained", start_date, end_date)
 
+    @instrumented
+    def getAcquisitionsByTechnique(self, technique_str: str) -> pd.DataFrame:  # Rubens
+        snapshot = self._snapshot()
+        if snapshot is not None:
+            pc = require_pyarrow()[2]
+            table = open_activity_parquet(snapshot).to_table(
+                columns=[name for name in ACTIVITY_RESULT_COLUMNS if name != "type"],
+                filter=pc.field("type") == "Acquisition",
+            )
+            table = table.take(substring_rows(table.column("technique"), technique_str))
+            df = decode_activity_table(table).to_pandas()
+            # The comma-joined tool column of the Acquisition table
+            df["tool"] = [", ".join(tools) if len(tools) else None for tools in df["tool"]]
+            df["type"] = "Acquisition"
+            return df
+        try:
             # Use LIKE operator to match partially with the technique string
-            query = f"SELECT * FROM Acquisition WHERE technique LIKE ?"
+            tables = self._tables()
+            if "activity" in tables:
+                where, params = self._text_filter(tables, "technique", technique_str)
+                query = ACQUISITION_SELECT + " AND " + where
+            else:
+                query = f"SELECT * FROM Acquisition WHERE technique LIKE ?"
+                params = ("%" + technique_str + "%",)
 
             # Execute the query and pass the technique_str wrapped with '%' for partial match
-            df = pd.read_sql_query(query, conn, params=("%" + technique_str + "%",))
+            df = self._read_sql(query, params=params)
 
             # Add the type column
             df["type"] = "Acquisition"
             return df
 
         except sqlite3.Error as e:
-            print("SQLite error:", e)
-        finally:
-            conn.close()
+            logger.error("SQLite error: %s", e)
+
+
+class AsyncMetadataQueryHandler(MetadataQueryHandler):
+    """
+    The query methods of MetadataQueryHandler as coroutines, for asyncio applications.
+
+    Queries go to the endpoint through sparql_select_async, so waiting for Blazegraph
+    never blocks the event loop, and the batches of the *ByIds methods are sent
+    concurrently. Embedded stores are queried in the loop's default executor. Results are
+    cached as MetadataQueryHandler caches them. The iter* methods are inherited unchanged
+    and block.
+
+    Used as an async context manager (or through aclose), the handler closes the aiohttp
+    session of its endpoint's host on the running loop when done.
+    """
+
+    async def aclose(self):
+        # Close the HTTP session of the endpoint's host; a later query opens a new one
+        await close_async_http_sessions(self._endpoint())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _sparql_async(self, query: str) -> pd.DataFrame:
+        # Coroutine counterpart of _sparql
+        endpoint = self._endpoint()
+        key = self._cache_key(query)
+        if self.cache is not None:
+            df = self.cache.get(endpoint, key)
+            if df is not None:
+                return df
+            generation = self.cache.generation()
+        store = get_embedded_store(endpoint)
+        if store is not None:
+            df = await asyncio.get_running_loop().run_in_executor(None, store.query, query, self.result_format)
+        else:
+            df = await sparql_select_async(endpoint, query, self.timeout, self.pool_size, self.result_format)
+        if self.cache is not None:
+            self.cache.put(endpoint, key, df, generation)
+        return df
+
+    @instrumented
+    async def getById(self, input_id: str) -> pd.DataFrame:
+        return await self._sparql_async(ENTITY_BY_ID_QUERY % {"id": input_id})
+
+    @instrumented
+    async def getAllPeople(self) -> pd.DataFrame:
+        return await self._sparql_async(PEOPLE_QUERY)
+
+    @instrumented
+    async def getAllCulturalHeritageObjects(self) -> pd.DataFrame:
+        return await self._sparql_async(CULTURAL_OBJECTS_QUERY % {"page": ""})
+
+    @instrumented
+    async def getCulturalHeritageObjectsByIds(self, ids: list, batch_size: int = ID_FILTER_BATCH_SIZE) -> pd.DataFrame:
+        ids = list(dict.fromkeys(str(object_id) for object_id in ids))
+        frames = await asyncio.gather(*(
+            self._sparql_async(CULTURAL_OBJECTS_QUERY % {"page": CULTURAL_OBJECTS_BY_ID % {"ids": sparql_values(batch)}})
+            for batch in batched(ids, batch_size)
+        ))
+        if not frames:
+            return pd.DataFrame(columns=CULTURAL_OBJECTS_COLUMNS)
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    @instrumented
+    async def getAuthorsOfCulturalHeritageObject(self, input_id) -> pd.DataFrame:
+        return await self._sparql_async(AUTHORS_OF_OBJECT_QUERY % {"id": input_id})
+
+    @instrumented
+    async def getAuthorsOfCulturalHeritageObjects(self, ids: list, batch_size: int = ID_FILTER_BATCH_SIZE) -> pd.DataFrame:
+        ids = list(dict.fromkeys(str(object_id) for object_id in ids))
+        frames = await asyncio.gather(*(
+            self._sparql_async(AUTHORS_BY_OBJECT_QUERY % {"ids": sparql_values(batch)})
+            for batch in batched(ids, batch_size)
+        ))
+        if not frames:
+            return pd.DataFrame(columns=["object_id", "id", "name"])
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    @instrumented
+    async def getCulturalHeritageObjectsAuthoredBy(self, input_id) -> pd.DataFrame:
+        df_sparql = await self._sparql_async(OBJECTS_AUTHORED_BY_QUERY % {"id": input_id})
+        df_sparql.drop_duplicates(inplace=True)
+        return df_sparql
+
+
+class AsyncProcessDataQueryHandler(ProcessDataQueryHandler):
+    """
+    The query methods of ProcessDataQueryHandler as coroutines, for asyncio applications.
+
+    sqlite3 has no asynchronous interface, so each query runs on a thread of `executor`
+    (the event loop's default executor unless one is given) with a connection of the
+    handler's pool; the event loop only waits for the result, and the calls are counted
+    in the metrics as ProcessDataQueryHandler's. The iter* methods are inherited
+    unchanged and block.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = SQLITE_POOL_SIZE,
+        pool_idle_timeout: float = SQLITE_POOL_IDLE_TIMEOUT,
+        serving: bool = False,
+        executor=None,  # concurrent.futures.Executor running the queries; None for the loop's default
+    ):
+        super().__init__(pool_size, pool_idle_timeout, serving)
+        self.executor = executor
+
+    async def aclose(self):
+        # Nothing to release: connections go back to the shared pool after each query and
+        # the executor belongs to the caller. Here so both async handlers close alike.
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _run(self, method, *args) -> pd.DataFrame:
+        # Run a blocking query method on the executor
+        return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    async def getById(self, id: str) -> pd.DataFrame:
+        return await self._run(super().getById, id)
+
+    async def getAllActivities(self) -> pd.DataFrame:
+        return await self._run(super().getAllActivities)
+
+    async def getActivitiesByResponsibleInstitution(self, institution_str: str) -> pd.DataFrame:
+        return await self._run(super().getActivitiesByResponsibleInstitution, institution_str)
+
+    async def getActivitiesByResponsiblePerson(self, responsible_person_str: str) -> pd.DataFrame:
+        return await self._run(super().getActivitiesByResponsiblePerson, responsible_person_str)
+
+    async def getActivitiesUsingTool(self, tool_str: str) -> pd.DataFrame:
+        return await self._run(super().getActivitiesUsingTool, tool_str)
+
+    async def getActivitiesStartedAfter(self, start_date: str) -> pd.DataFrame:
+        return await self._run(super().getActivitiesStartedAfter, start_date)
+
+    async def getActivitiesEndedBefore(self, end_date: str) -> pd.DataFrame:
+        return await self._run(super().getActivitiesEndedBefore, end_date)
+
+    async def getObjectIdsInTimeFrame(self, start_date: str, end_date: str) -> pd.DataFrame:
+        return await self._run(super().getObjectIdsInTimeFrame, start_date, end_date)
+
+    async def getActivitiesOverlapping(self, start_date: str, end_date: str) -> pd.DataFrame:
+        return await self._run(super().getActivitiesOverlapping, start_date, end_date)
+
+    async def getActivitiesContainedIn(self, start_date: str, end_date: str) -> pd.DataFrame:
+        return await self._run(super().getActivitiesContainedIn, start_date, end_date)
+
+    async def getAcquisitionsByTechnique(self, technique_str: str) -> pd.DataFrame:
+        return await self._run(super().getAcquisitionsByTechnique, technique_str)
+
+
+# Mashups query all their handlers at once, each call on a worker thread
+MASHUP_MAX_WORKERS = 8  # Handler calls running at the same time
+MASHUP_HANDLER_TIMEOUT = 60.0  # Seconds a handler call may run before its result is dropped
 
 
 class BasicMashup(object):
@@ -1113,9 +4720,86 @@ class BasicMashup(object):
         self,
         metadataQuery: List[MetadataQueryHandler],
         processQuery: List[ProcessDataQueryHandler],
+        max_workers: int = MASHUP_MAX_WORKERS,  # Handler calls running at the same time
+        timeout: float = MASHUP_HANDLER_TIMEOUT,  # Seconds to wait for each handler call
     ) -> None:  # Rubens
         self.metadataQuery = metadataQuery if metadataQuery is not None else []
         self.processQuery = processQuery if processQuery is not None else []
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.objects = CulturalHeritageObjectMap()  # One instance per cultural heritage object id
+
+    def _fan_out(self, handlers: list, method: str, *args) -> pd.DataFrame:
+        """
+        Calls `method` on every handler concurrently and merges the DataFrames they return.
+
+        At most `max_workers` calls run at once. A call that raises, or is still running
+        `timeout` seconds after it started, is reported and its handler left out of the
+        result. Rows returned by more than one handler appear once. A call that timed out
+        cannot be interrupted: it keeps running, and holding its worker, until it returns.
+
+        Args:
+            handlers (list): The query handlers to call.
+            method (str): Name of the query method, e.g. "getAllActivities".
+            *args: Arguments passed to the method.
+
+        Returns:
+            pd.DataFrame: The merged results (empty, with the handlers' columns if known,
+                when no handler returned rows).
+        """
+        if not handlers:
+            return pd.DataFrame()
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="mashup")
+                # Stop the workers once the mashup is garbage collected without close()
+                weakref.finalize(self, self._executor.shutdown, wait=False)
+        started = {}
+
+        def call(position, handler):
+            started[position] = time.monotonic()
+            return getattr(handler, method)(*args)
+
+        futures = [self._executor.submit(call, position, handler) for position, handler in enumerate(handlers)]
+        frames = []
+        for position, future in enumerate(futures):
+            handler_name = f"{type(handlers[position]).__name__}.{method}"
+            df = None
+            while True:
+                # Calls queued behind busy workers get their full timeout once they start
+                begun = started.get(position)
+                remaining = self.timeout if begun is None else begun + self.timeout - time.monotonic()
+                try:
+                    df = future.result(timeout=max(remaining, 0))
+                except FutureTimeoutError:
+                    if started.get(position) is None or time.monotonic() < started[position] + self.timeout:
+                        continue
+                    logger.warning("%s did not answer within %ss, skipping its results", handler_name, self.timeout)
+                except Exception as e:
+                    logger.warning("%s failed, skipping its results: %s", handler_name, e)
+                break
+            if df is not None:
+                frames.append(df)
+        return merge_handler_frames(frames)
+
+    def close(self):
+        """
+        Shuts down the worker threads of the mashup. Queued calls are cancelled; calls
+        still running, such as ones that timed out, finish in the background. A later
+        query starts new workers.
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def cleanMetadataHandlers(self) -> bool:  # Rubens
         self.metadataQuery.clear()
@@ -1133,25 +4817,18 @@ class BasicMashup(object):
         self.processQuery.append(handler)
         return True
 
+    @instrumented
     def getEntityById(self, id: str) -> IdentifiableEntity:  # Rubens
-        id_entity: List[Person] = []
-        processed_ids = set()  # Set to keep track of processed IDs
-
-        for handler in self.metadataQuery:
-            people_df = handler.getById(id)
-            for _, row in people_df.iterrows():
-                person_id = row["identifier"]
-                # Check if the ID has already been processed
-                if person_id not in processed_ids:
-                    person = Person(id=person_id, name=row["name"])
-                id_entity.append(person)
-                processed_ids.add(person_id)  # Add the ID to the set of processed IDs
-
-        print("Entity found by Id:")
-        for person in id_entity:
-            print(
-                f"Name: {person.name}, Id: {person.id}, Type: {type(person).__name__}"
-            )
+        return self._entity(self._fan_out(self.metadataQuery, "getById", id))
+
+    def _entity(self, people_df: pd.DataFrame):
+        # The people getById found, or None
+        id_entity = people_from_frame(people_df, "identifier", "name")
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Entity found by Id:")
+            for person in id_entity:
+                logger.debug("Name: %s, Id: %s, Type: %s", person.name, person.id, type(person).__name__)
         if id_entity == []:
             id_entity = None
             
@@ -1159,324 +4836,155 @@ class BasicMashup(object):
 
 
     # Ben/Rubens
+    @instrumented
     def getAllPeople(self) -> List[Person]:
         """
         Retrieves a list of unique Person objects from multiple metadata sources.
         
-        This function iterates through metadata query handlers to gather information 
+        This function queries all metadata query handlers concurrently to gather information 
         about people, ensuring that each person is only added once based on their ID. 
-        It also prints a summary of the created list.
+        It also logs a summary of the created list at DEBUG level.
         
         Returns:
             List[Person]: A list of unique Person objects.
         """
         
-        # Initialize an empty list to store unique Person objects
-        all_people: List[Person] = []
-        # Initialize a set to keep track of processed person IDs, avoiding duplicates
-        processed_ids = set()
-
-        # Iterate through each handler in the metadata query list
-        for handler in self.metadataQuery:
-            # Retrieve a DataFrame of all people from the current handler
-            people_df = handler.getAllPeople()
-            
-            # Iterate over each row in the DataFrame
-            for _, row in people_df.iterrows():
-                person_id = row["id"]
-                
-                # Check if this person's ID has already been processed
-                if person_id not in processed_ids:
-                    # Create a Person object if the ID is unique
-                    person = Person(id=person_id, name=row["name"])
-                    
-                    # Append the new Person object to the all_people list
-                    all_people.append(person)
-                    
-                    # Add the person's ID to the processed set to prevent reprocessing
-                    processed_ids.add(person_id)
-
-        # Print a summary of each Person object in the final list
-        print("Person list created:")
-        for person in all_people:
-            print(f"Name: {person.name}, Type: {type(person).__name__}")
+        # Retrieve a DataFrame of all people from all the metadata handlers at once
+        return self._people(self._fan_out(self.metadataQuery, "getAllPeople"))
+
+    def _people(self, people_df: pd.DataFrame) -> List[Person]:
+        # One Person object per distinct ID
+        all_people = people_from_frame(people_df, "id", "name")
+
+        # Log a summary of each Person object in the final list
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Person list created:")
+            for person in all_people:
+                logger.debug("Name: %s, Type: %s", person.name, type(person).__name__)
         
         # Return the list of unique Person objects
         return all_people
 
 
+    @instrumented
     def getAllCulturalHeritageObjects(
         self,
     ) -> List[CulturalHeritageObject]:  # Ekaterina
-        objects_list = []
-        df = pd.DataFrame()
-
-        if len(self.metadataQuery) > 0:
-            df = self.metadataQuery[0].getAllCulturalHeritageObjects()
-            print("DataFrame returned from SPARQL query:")
+        return self._objects(self._fan_out(self.metadataQuery, "getAllCulturalHeritageObjects"))
 
+    def _objects(self, df: pd.DataFrame) -> List[CulturalHeritageObject]:
+        # The objects of getAllCulturalHeritageObjects results
+        objects_list = []
         if df.empty:
-            print("The DataFrame is empty.")
+            logger.debug("The DataFrame is empty.")
         else:
-            for _, row in df.iterrows():
-                id = str(row["id"])
-                title = row["title"]
-                date = row["date"]
-                owner = str(row["owner"])
-                place = row["place"]
-                author_id = str(row["author_id"])
-                author_name = row["author_name"]
-
-                hasAuthor = None
-                if author_id and author_name:
-                    hasAuthor = [Person(author_id, author_name)]
-
-                try:
-                    # Use if-elif-else to instantiate objects based on type name
-                    type_name = row["type_name"]
-                    if type_name == "NauticalChart":
-                        obj = NauticalChart(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "ManuscriptPlate":
-                        obj = ManuscriptPlate(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "ManuscriptVolume":
-                        obj = ManuscriptVolume(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "PrintedVolume":
-                        obj = PrintedVolume(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "PrintedMaterial":
-                        obj = PrintedMaterial(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Herbarium":
-                        obj = Herbarium(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Specimen":
-                        obj = Specimen(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Painting":
-                        obj = Painting(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Model":
-                        obj = Model(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Map":
-                        obj = Map(id, title, date, owner, place, hasAuthor)
-                    else:
-                        print(f"No class defined for type: {type_name}")
-
-                    # Append the instantiated object to the list
-                    objects_list.append(obj)
-                except ValueError as e:
-                    print(f"Error creating CulturalHeritageObject: {e}")
-
-            print("Objects list created:")
-            for obj in objects_list:
-                print(
-                    f"Object ID: {obj.id}, Title: {obj.title}, Type: {obj.__class__.__name__}, hasAuthor: {', '.join([f'{author.name} ({author.id})' for author in obj.hasAuthor]) if obj.hasAuthor else 'None'}"
-                )
+            objects_list = cultural_heritage_objects_from_frame(df, self.objects)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Objects list created:")
+                for obj in objects_list:
+                    logger.debug(
+                        "Object ID: %s, Title: %s, Type: %s, hasAuthor: %s", obj.id, obj.title, obj.__class__.__name__,
+                        ", ".join(f"{author.name} ({author.id})" for author in obj.hasAuthor) if obj.hasAuthor else "None",
+                    )
 
         return objects_list
 
+    @instrumented
     def getAuthorsOfCulturalHeritageObject(
         self, object_id: str
     ) -> List[Person]:  # Ekaterina
-        authors_list = []
+        return self._authors(self._fan_out(self.metadataQuery, "getAuthorsOfCulturalHeritageObject", object_id))
 
-        for metadata_qh in self.metadataQuery:
-            authors_df = metadata_qh.getAuthorsOfCulturalHeritageObject(object_id)
-            print(authors_df)
+    def _authors(self, authors_df: pd.DataFrame) -> List[Person]:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("DataFrame returned from SPARQL query:\n%s", authors_df)
 
-            for _, row in authors_df.iterrows():
-                author = Person(row["id"], row["name"])
-                authors_list.append(author)
-
-        return authors_list
+        return people_from_frame(authors_df, "id", "name")
 
+    @instrumented
     def getCulturalHeritageObjectsAuthoredBy(
         self, input_id: str
     ) -> List[CulturalHeritageObject]:  # Ekaterina
-        objects_list = []
-        df = pd.DataFrame()
+        return self._objects_authored(self._fan_out(self.metadataQuery, "getCulturalHeritageObjectsAuthoredBy", input_id))
 
-        if len(self.metadataQuery) > 0:
-            df = self.metadataQuery[0].getCulturalHeritageObjectsAuthoredBy(input_id)
-            print("DataFrame returned from SPARQL query:")
-            print(df)
+    def _objects_authored(self, df: pd.DataFrame) -> List[CulturalHeritageObject]:
+        # The objects of getCulturalHeritageObjectsAuthoredBy results
+        objects_list = []
+        if logger.isEnabledFor(logging.DEBUG) and not df.empty:
+            logger.debug("DataFrame returned from SPARQL query:\n%s", df)
 
         if not df.empty:
-            for _, row in df.iterrows():
-                id = str(row["id"])
-                title = row["title"]
-                date = str(row["date"])
-                owner = str(row["owner"])
-                place = row["place"]
-                author_id = str(row["author_id"]) if "author_id" in df.columns else None
-                author_name = (
-                    row["author_name"] if "author_name" in df.columns else None
-                )
+            # The query names the author's label "name"
+            objects_list = cultural_heritage_objects_from_frame(df.rename(columns={"name": "author_name"}), self.objects)
 
-                hasAuthor = None
-                if author_id and author_name:
-                    hasAuthor = [Person(author_id, author_name)]
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Objects list created:")
+                for obj in objects_list:
+                    logger.debug("Object ID: %s, Title: %s, Type: %s", obj.id, obj.title, type(obj).__name__)
 
-                try:
-                    # Use if-elif-else to instantiate objects based on type name
-                    type_name = row["type_name"]
-                    if type_name == "NauticalChart":
-                        obj = NauticalChart(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "ManuscriptPlate":
-                        obj = ManuscriptPlate(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "ManuscriptVolume":
-                        obj = ManuscriptVolume(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "PrintedVolume":
-                        obj = PrintedVolume(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "PrintedMaterial":
-                        obj = PrintedMaterial(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Herbarium":
-                        obj = Herbarium(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Specimen":
-                        obj = Specimen(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Painting":
-                        obj = Painting(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Model":
-                        obj = Model(id, title, date, owner, place, hasAuthor)
-                    elif type_name == "Map":
-                        obj = Map(id, title, date, owner, place, hasAuthor)
-                    else:
-                        print(f"No class defined for type: {type_name}")
-                        continue
+        return objects_list
+
+    def _activities(self, method: str, *args, types: Optional[set] = None) -> List[Activity]:
+        # Run a process query on every handler and build the activities it returns
+        if len(self.processQuery) > 0:
+            return self._activities_from(self._fan_out(self.processQuery, method, *args), types)
+        return []
+
+    def _activities_from(self, activities_df: pd.DataFrame, types: Optional[set] = None) -> List[Activity]:
+        # The activities of process query results, of the given types only if any
+        all_activities = []
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("DataFrame returned from SQL query:\n%s", activities_df)
 
-                    # Append the instantiated object to the list
-                    objects_list.append(obj)
-                except ValueError as e:
-                    print(f"Error creating CulturalHeritageObject: {e}")
+        # Check if the required 'type' column exists in the DataFrame
+        if "type" not in activities_df.columns:
+            logger.warning("'type' column not found in the DataFrame.")
+            return all_activities
 
-            print("Objects list created:")
-            for obj in objects_list:
-                print(
-                    f"Object ID: {obj.id}, Title: {obj.title}, Type: {type(obj).__name__}"
+        all_activities = activities_from_frame(activities_df, types, self.objects)
+
+        # Log a summary of each created activity for verification
+        if debug:
+            logger.debug("Activities list created:")
+            for activity in all_activities:
+                logger.debug(
+                    "Activity Type: %s, Responsible Institute: %s, Responsible Person: %s, "
+                    "Tool: %s, Start Date: %s, End Date: %s",
+                    type(activity).__name__, activity.institute, activity.person,
+                    activity.tool, activity.start, activity.end,
                 )
 
-        return objects_list
+        return all_activities
 
     #Ben/Ekaterina
+    @instrumented
     def getAllActivities(self) -> List[Activity]:
         """
         Retrieves and categorizes all activities based on their types.
         
-        This function queries activity data from the processQuery object, processes each row 
-        to create corresponding activity instances (e.g., Acquisition, Processing), and appends 
-        these instances to a list of activities. It also outputs a summary of the activities 
-        created for verification purposes.
+        This function queries activity data from the process query handlers, creates the
+        corresponding activity instances (e.g., Acquisition, Processing) and returns them
+        in a list. It also outputs a summary of the activities created for verification
+        purposes.
         
         Returns:
             List[Activity]: A list of Activity objects of different types.
         """
-        
-        # Initialize an empty list to store all activity instances
-        all_activities = []
-        # Initialize an empty DataFrame to store activity data from the SQL query
-        activities_df = pd.DataFrame()
-
-        # Check if the processQuery list contains any query handlers
-        if len(self.processQuery) > 0:
-            # Get the DataFrame of all activities from the first query handler in processQuery      
-            print("DataFrame returned from SQL query:")
-            print(activities_df)
-
-            # Iterate over each row in the DataFrame
-            for _, row in activities_df.iterrows():
-                activity_type = row["type"]  # Type of activity (e.g., Acquisition)
-                activity = None  # Initialize activity variable
-
-                # Convert key fields to strings to ensure consistent data format
-                object_id = str(row["object_id"])
-                responsible_institute = str(row["responsible_institute"])
-                responsible_person = str(row["responsible_person"])
-                tool = str(row["tool"])
-                start_date = str(row["start_date"])
-                end_date = str(row["end_date"])
-
-
-                # ERROR FIX
-
-                # Create a CulturalHeritageObject instance using the object ID
-                cultural_heritage_object = CulturalHeritageObject(
-                    object_id, "", "", "", ""
-                )
-
-                # Determine the activity type and create an instance of the corresponding class
-                if activity_type == "Acquisition":
-                    technique = str(row["technique"])
-                    activity = Acquisition(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        technique,
-                        responsible_person,
-                        start_date,
-                        end_date,
-                        tool,
-                    )
-                elif activity_type == "Processing":
-                    activity = Processing(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Modelling":
-                    activity = Modelling(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Optimising":
-                    activity = Optimising(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Exporting":
-                    activity = Exporting(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-
-                # Append the created activity instance to the list if it exists
-                if activity:
-                    all_activities.append(activity)
-
-            # Print a summary of each created activity for verification
-            print("Activities list created:")
-            for activity in all_activities:
-                print(
-                    f"Activity Type: {type(activity).__name__}, "
-                    f"Responsible Institute: {activity.institute}, "
-                    f"Responsible Person: {activity.person}, "
-                    f"Tool: {activity.tool}, "
-                    f"Start Date: {activity.start}, "
-                    f"End Date: {activity.end}"
-                )
-
-        # Return the list of all created Activity instances
-        return all_activities
+        return self._activities("getAllActivities")
 
     # Ben/Ekaterina
+    @instrumented
     def getActivitiesByResponsibleInstitution(
         self, institute_name: str
     ) -> List[Activity]:
         """
         Retrieves activities associated with a specified responsible institution.
         
-        This function filters activities by checking if the specified institution name 
-        is a substring of the 'responsible_institute' field in each activity record.
-        The function creates corresponding activity instances based on their types, 
-        and appends them to a list. A summary of the created activities is printed for 
+        This function asks every process query handler for the activities whose
+        'responsible_institute' contains the specified institution name, and re-checks the
+        match case-insensitively. A summary of the created activities is printed for 
         verification purposes.
         
         Args:
@@ -1486,124 +4994,21 @@ class BasicMashup(object):
         Returns:
             List[Activity]: A list of Activity objects filtered by the specified institution.
         """
-        
-        # Initialize an empty list to store activity instances associated with the institution
-        all_activities = []
-        # Initialize an empty DataFrame to store activity data from the SQL query
-        activities_df = pd.DataFrame()
-
-        # Check if there are any query handlers in the processQuery list
-        if len(self.processQuery) > 0:
-            # Retrieve a DataFrame of all activities from the first query handler
-            activities_df = self.processQuery[0].getAllActivities()
-            print("DataFrame returned from SQL query:")
-            print(activities_df)
-
-            # Check if the required 'type' column exists in the DataFrame
-            if "type" not in activities_df.columns:
-                print("Warning: 'type' column not found in the DataFrame.")
-                return all_activities
-
-            # Iterate over each row in the DataFrame to filter and create activities
-            for _, row in activities_df.iterrows():
-                responsible_institute = str(row["responsible_institute"])
-
-                # Check if the given institute name is a substring (case-insensitive) of the responsible_institute
-                if institute_name.lower() in responsible_institute.lower():
-                    activity_type = row["type"]  # Type of activity (e.g., Acquisition)
-                    object_id = str(row["object_id"])
-                    responsible_person = str(row["responsible_person"])
-                    tool = str(row["tool"])
-                    start_date = str(row["start_date"])
-                    end_date = str(row["end_date"])
-
-                    # Create a CulturalHeritageObject instance for the activity
-                    cultural_heritage_object = CulturalHeritageObject(
-                        object_id, "", "", "", ""
-                    )
-
-                    # Initialize the activity variable to None
-                    activity = None
-                    
-                    # Determine the activity type and create an instance of the corresponding class
-                    if activity_type == "Acquisition":
-                        technique = str(row["technique"])
-                        activity = Acquisition(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            technique,
-                            responsible_person,
-                            start_date,
-                            end_date,
-                            tool,
-                        )
-                    elif activity_type == "Processing":
-                        activity = Processing(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Modelling":
-                        activity = Modelling(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Optimising":
-                        activity = Optimising(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Exporting":
-                        activity = Exporting(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-
-                    # Append the created activity instance to the list if it exists
-                    if activity:
-                        all_activities.append(activity)
-
-            # Print a summary of each created activity for verification
-            print("Activities list created:")
-            for activity in all_activities:
-                print(
-                    f"Activity Type: {type(activity).__name__}, "
-                    f"Responsible Institute: {activity.institute}, "
-                    f"Responsible Person: {activity.person}, "
-                    f"Tool: {activity.tool}, "
-                    f"Start Date: {activity.start}, "
-                    f"End Date: {activity.end}"
-                )
-
-        # Return the list of filtered Activity instances
-        return all_activities
+        activities = self._activities("getActivitiesByResponsibleInstitution", institute_name)
+        return [a for a in activities if institute_name.lower() in (a.institute or "").lower()]
 
     # Ben/Ekaterina
+    @instrumented
     def getActivitiesByResponsiblePerson(
         self, person_name: str
     ) -> List[Activity]:
         """
         Retrieves activities associated with a specified responsible person.
         
-        This function filters activities by checking if the specified person's name 
-        is a substring of the 'responsible_person' field in each activity record.
-        Activity instances are created based on their types and appended to a list.
-        A summary of the created activities is printed for verification purposes.
+        This function asks every process query handler for the activities whose
+        'responsible_person' contains the specified person's name, and re-checks the
+        match case-insensitively. A summary of the created activities is printed for
+        verification purposes.
         
         Args:
             person_name (str): Name or partial name of the responsible person to filter 
@@ -1612,122 +5017,17 @@ class BasicMashup(object):
         Returns:
             List[Activity]: A list of Activity objects filtered by the specified person.
         """
-        
-        # Initialize an empty list to store activity instances associated with the person
-        all_activities = []
-        # Initialize an empty DataFrame to store activity data from the SQL query
-        activities_df = pd.DataFrame()
-
-        # Check if there are any query handlers in the processQuery list
-        if len(self.processQuery) > 0:
-            # Retrieve a DataFrame of all activities from the first query handler
-            activities_df = self.processQuery[0].getAllActivities()
-            print("DataFrame returned from SQL query:")
-            print(activities_df)
-
-            # Check if the required 'type' column exists in the DataFrame
-            if "type" not in activities_df.columns:
-                print("Warning: 'type' column not found in the DataFrame.")
-                return all_activities
-
-            # Iterate over each row in the DataFrame to filter and create activities
-            for _, row in activities_df.iterrows():
-                responsible_person = str(row["responsible_person"])
-
-                # Check if the given person's name is a substring (case-insensitive) of responsible_person
-                if person_name.lower() in responsible_person.lower():
-                    activity_type = row["type"]  # Type of activity (e.g., Acquisition)
-                    object_id = str(row["object_id"])
-                    responsible_institute = str(row["responsible_institute"])
-                    tool = str(row["tool"])
-                    start_date = str(row["start_date"])
-                    end_date = str(row["end_date"])
-
-                    # Create a CulturalHeritageObject instance for the activity
-                    cultural_heritage_object = CulturalHeritageObject(
-                        object_id, "", "", "", ""
-                    )
-
-                    # Initialize the activity variable to None
-                    activity = None
-                    
-                    # Determine the activity type and create an instance of the corresponding class
-                    if activity_type == "Acquisition":
-                        technique = str(row["technique"])
-                        activity = Acquisition(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            technique,
-                            responsible_person,
-                            start_date,
-                            end_date,
-                            tool,
-                        )
-                    elif activity_type == "Processing":
-                        activity = Processing(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Modelling":
-                        activity = Modelling(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Optimising":
-                        activity = Optimising(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Exporting":
-                        activity = Exporting(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-
-                    # Append the created activity instance to the list if it exists
-                    if activity:
-                        all_activities.append(activity)
-
-            # Print a summary of each created activity for verification
-            print("Activities list created:")
-            for activity in all_activities:
-                print(
-                    f"Activity Type: {type(activity).__name__}, "
-                    f"Responsible Institute: {activity.institute}, "
-                    f"Responsible Person: {activity.person}, "
-                    f"Tool: {activity.tool}, "
-                    f"Start Date: {activity.start}, "
-                    f"End Date: {activity.end}"
-                )
-
-        # Return the list of filtered Activity instances
-        return all_activities
+        activities = self._activities("getActivitiesByResponsiblePerson", person_name)
+        return [a for a in activities if person_name.lower() in (a.person or "").lower()]
 
     # Ben/Ekaterina
+    @instrumented
     def getActivitiesUsingTool(self, tool_name: str) -> List[Activity]:
         """
         Retrieves activities that use a specified tool.
 
-        This function filters activities by checking if the specified tool name is 
-        a substring of the 'tool' field in each activity record.
-        For each matching activity type, an instance of the appropriate class is created 
-        and added to the output list.
+        This function asks every process query handler for the activities whose tools
+        include the specified tool name as a substring.
 
         Args:
             tool_name (str): Name or partial name of the tool to filter activities by.
@@ -1735,856 +5035,361 @@ class BasicMashup(object):
         Returns:
             List[Activity]: A list of Activity objects filtered by the specified tool.
         """
-        
-        # Initialize an empty list to store activities that use the specified tool
-        all_activities = []
-        # Initialize an empty DataFrame to store the query result data
-        activities_df = pd.DataFrame()
-
-        # Check if there is at least one processQuery handler
-        if len(self.processQuery) > 0:
-            # Retrieve a DataFrame of all activities from the first query handler
-            activities_df = self.processQuery[0].getAllActivities()
-            print("DataFrame returned from SQL query:")
-            print(activities_df)
-
-            # Verify that the DataFrame contains a 'type' column
-            if "type" not in activities_df.columns:
-                print("Warning: 'type' column not found in the DataFrame.")
-                return all_activities
-
-            # Iterate over each row in the DataFrame to filter and create activities
-            for _, row in activities_df.iterrows():
-                tool = str(row["tool"])
-
-                # Check if the tool name is a substring (case-insensitive) of the row's tool
-                if tool_name.lower() in tool.lower():
-                    activity_type = row["type"]
-                    object_id = str(row["object_id"])
-                    responsible_person = str(row["responsible_person"])
-                    responsible_institute = str(row["responsible_institute"])
-                    start_date = str(row["start_date"])
-                    end_date = str(row["end_date"])
-
-                    # Create an instance of CulturalHeritageObject for the activity
-                    cultural_heritage_object = CulturalHeritageObject(
-                        object_id, "", "", "", ""
-                    )
-
-                    # Initialize the activity variable
-                    activity = None
-
-                    # Create an instance of the appropriate activity type
-                    if activity_type == "Acquisition":
-                        technique = str(row["technique"])
-                        activity = Acquisition(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            technique,
-                            responsible_person,
-                            start_date,
-                            end_date,
-                            tool,
-                        )
-                    elif activity_type == "Processing":
-                        activity = Processing(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Modelling":
-                        activity = Modelling(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Optimising":
-                        activity = Optimising(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-                    elif activity_type == "Exporting":
-                        activity = Exporting(
-                            cultural_heritage_object,
-                            responsible_institute,
-                            responsible_person,
-                            tool,
-                            start_date,
-                            end_date,
-                        )
-
-                    # Append the created activity instance to the list if it exists
-                    if activity:
-                        all_activities.append(activity)
-
-            # Print a summary of each created activity for verification
-            print("Activities list created:")
-            for activity in all_activities:
-                print(
-                    f"Activity Type: {type(activity).__name__}, "
-                    f"Responsible Institute: {activity.institute}, "
-                    f"Responsible Person: {activity.person}, "
-                    f"Tool: {activity.tool}, "
-                    f"Start Date: {activity.start}, "
-                    f"End Date: {activity.end}"
-                )
-
-        # Return the list of Activity instances filtered by tool name
-        return all_activities
-
-    
+        return self._activities("getActivitiesUsingTool", tool_name)
 
+    @instrumented
     def getActivitiesStartedAfter(
         self, date: str
     ) -> List[Activity]:  # Amanda/Ekaterina
-        all_activities = []
-        activities_df = pd.DataFrame()
-
-        if len(self.processQuery) > 0:
-            activities_df = self.processQuery[0].getActivitiesStartedAfter(date)
-            print("DataFrame returned from SQL query:")
-            print(activities_df)
-
-            if "type" not in activities_df.columns:
-                print("Warning: 'type' column not found in the DataFrame.")
-                return all_activities
-
-            for index, row in activities_df.iterrows():
-                activity_type = row["type"]
-                object_id = str(row["object_id"])
-                tool = str(row["tool"])
-                responsible_person = str(row["responsible_person"])
-                responsible_institute = str(row["responsible_institute"])
-                start_date = str(row["start_date"])
-                end_date = str(row["end_date"])
-
-                cultural_heritage_object = CulturalHeritageObject(
-                    object_id, "", "", "", ""
-                )
-
-                activity = None
-                if activity_type == "Acquisition":
-                    technique = str(row["technique"])
-                    activity = Acquisition(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        technique,
-                        responsible_person,
-                        start_date,
-                        end_date,
-                        tool,
-                    )
-                elif activity_type == "Processing":
-                    activity = Processing(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Modelling":
-                    activity = Modelling(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Optimising":
-                    activity = Optimising(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Exporting":
-                    activity = Exporting(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-
-                if activity:
-                    all_activities.append(activity)
-
-            print("Activities list created:")
-            for activity in all_activities:
-                print(
-                    f"Activity Type: {type(activity).__name__}, "
-                    f"Responsible Institute: {activity.institute}, "
-                    f"Responsible Person: {activity.person}, "
-                    f"Tool: {activity.tool}, "
-                    f"Start Date: {activity.start}, "
-                    f"End Date: {activity.end}"
-                )
-
-        return all_activities
+        return self._activities("getActivitiesStartedAfter", date)
 
+    @instrumented
     def getActivitiesEndedBefore(self, date: str) -> List[Activity]:  # Amanda/Ekaterina
-        all_activities = []
-        activities_df = pd.DataFrame()
-
-        if len(self.processQuery) > 0:
-            activities_df = self.processQuery[0].getActivitiesEndedBefore(date)
-            print("DataFrame returned from SQL query:")
-            print(activities_df)
-
-            if "type" not in activities_df.columns:
-                print("Warning: 'type' column not found in the DataFrame.")
-                return all_activities
-
-            for index, row in activities_df.iterrows():
-                activity_type = row["type"]
-                object_id = str(row["object_id"])
-                tool = str(row["tool"])
-                responsible_person = str(row["responsible_person"])
-                responsible_institute = str(row["responsible_institute"])
-                start_date = str(row["start_date"])
-                end_date = str(row["end_date"])
-
-                cultural_heritage_object = CulturalHeritageObject(
-                    object_id, "", "", "", ""
-                )
-
-                activity = None
-                if activity_type == "Acquisition":
-                    technique = str(row["technique"])
-                    activity = Acquisition(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        technique,
-                        responsible_person,
-                        start_date,
-                        end_date,
-                        tool,
-                    )
-                elif activity_type == "Processing":
-                    activity = Processing(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Modelling":
-                    activity = Modelling(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Optimising":
-                    activity = Optimising(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
-                elif activity_type == "Exporting":
-                    activity = Exporting(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        responsible_person,
-                        tool,
-                        start_date,
-                        end_date,
-                    )
+        return self._activities("getActivitiesEndedBefore", date)
 
-                if activity:
-                    all_activities.append(activity)
+    @instrumented
+    def getActivitiesOverlapping(self, start_date: str, end_date: str) -> List[Activity]:
+        return self._activities("getActivitiesOverlapping", start_date, end_date)
 
-            print("Activities list created:")
-            for activity in all_activities:
-                print(
-                    f"Activity Type: {type(activity).__name__}, "
-                    f"Responsible Institute: {activity.institute}, "
-                    f"Responsible Person: {activity.person}, "
-                    f"Tool: {activity.tool}, "
-                    f"Start Date: {activity.start}, "
-                    f"End Date: {activity.end}"
-                )
-
-        return all_activities
+    @instrumented
+    def getActivitiesContainedIn(self, start_date: str, end_date: str) -> List[Activity]:
+        return self._activities("getActivitiesContainedIn", start_date, end_date)
 
+    @instrumented
     def getAcquisitionsByTechnique(self, technique: str):  # Amanda/Ekaterina
-        all_activities = []
-        activities_df = pd.DataFrame()
-
-        if len(self.processQuery) > 0:
-            activities_df = self.processQuery[0].getAcquisitionsByTechnique(technique)
-            print("DataFrame returned from SQL query:")
-            print(activities_df)
-
-            if "type" not in activities_df.columns:
-                print("Warning: 'type' column not found in the DataFrame.")
-                return all_activities
-
-            for index, row in activities_df.iterrows():
-                activity_type = row["type"]
-                object_id = str(row["object_id"])
-                tool = str(row["tool"])
-                responsible_person = str(row["responsible_person"])
-                responsible_institute = str(row["responsible_institute"])
-                start_date = str(row["start_date"])
-                end_date = str(row["end_date"])
-
-                cultural_heritage_object = CulturalHeritageObject(
-                    object_id, "", "", "", ""
-                )
+        return self._activities("getAcquisitionsByTechnique", technique, types={"Acquisition"})
 
-                activity = None
-                if activity_type == "Acquisition":
-                    technique = str(row["technique"])
-                    activity = Acquisition(
-                        cultural_heritage_object,
-                        responsible_institute,
-                        technique,
-                        responsible_person,
-                        start_date,
-                        end_date,
-                        tool,
-                    )
-
-                if activity:
-                    all_activities.append(activity)
-
-            print("Activities list created:")
-            for activity in all_activities:
-                print(
-                    f"Activity Type: {type(activity).__name__}, "
-                    f"Responsible Institute: {activity.institute}, "
-                    f"Responsible Person: {activity.person}, "
-                    f"Tool: {activity.tool}, "
-                    f"Start Date: {activity.start}, "
-                    f"End Date: {activity.end}"
-                )
+    # Lazy counterparts of the getAll* methods. They read one page of results at a time,
+    # handler after handler, and print nothing.
 
-        return all_activities
+    def iterAllPeople(self, page_size: int = ITER_PAGE_SIZE) -> Iterator[Person]:
+        """
+        Yields each distinct person of all the metadata handlers, reading `page_size` people
+        per query.
+        """
+        seen = set()
+        for handler in list(self.metadataQuery):
+            for page in handler.iterAllPeople(page_size):
+                for person in people_from_frame(page, "id", "name"):
+                    if person.id not in seen:
+                        seen.add(person.id)
+                        yield person
+
+    def iterAllCulturalHeritageObjects(self, page_size: int = ITER_PAGE_SIZE) -> Iterator[CulturalHeritageObject]:
+        """
+        Yields each distinct cultural heritage object of all the metadata handlers, reading
+        `page_size` objects per query.
+        """
+        seen = set()
+        for handler in list(self.metadataQuery):
+            for page in handler.iterAllCulturalHeritageObjects(page_size):
+                for obj in cultural_heritage_objects_from_frame(page, self.objects):
+                    if obj.id not in seen:
+                        seen.add(obj.id)
+                        yield obj
+
+    def iterAllActivities(self, page_size: int = ITER_PAGE_SIZE) -> Iterator[Activity]:
+        """
+        Yields the activities of all the process handlers, fetching `page_size` rows at a
+        time from each database. Unlike getAllActivities, rows found in more than one
+        database are yielded once per database.
+        """
+        for handler in list(self.processQuery):
+            for page in handler.iterAllActivities(page_size):
+                yield from activities_from_frame(page, objects=self.objects)
 
 
 class AdvancedMashup(BasicMashup):
-    def __init__(self, metadataQuery=None, processQuery=None):
-        super().__init__(metadataQuery, processQuery)
+    def __init__(self, metadataQuery=None, processQuery=None, max_workers=MASHUP_MAX_WORKERS, timeout=MASHUP_HANDLER_TIMEOUT,
+                 id_batch_size=ID_FILTER_BATCH_SIZE):
+        super().__init__(metadataQuery, processQuery, max_workers, timeout)
+        self.id_batch_size = id_batch_size  # Object ids sent to a metadata handler per query
         
+    @instrumented
     def getActivitiesOnObjectsAuthoredBy(
         self, author_id: str
     ) -> list[Activity]:  # Rubens
-        related_cultural_heritage_objects = self.metadataQuery[0].getCulturalHeritageObjectsAuthoredBy(author_id)
+        related_cultural_heritage_objects = self._fan_out(self.metadataQuery, "getCulturalHeritageObjectsAuthoredBy", author_id)
+        if "id" not in related_cultural_heritage_objects.columns:
+            return []
+        return self._activities_on_objects(
+            related_cultural_heritage_objects, self._fan_out(self.processQuery, "getAllActivities")
+        )
+
+    def _activities_on_objects(self, related_cultural_heritage_objects: pd.DataFrame,
+                               all_activities: pd.DataFrame) -> List[Activity]:
+        # The activities on the objects of getCulturalHeritageObjectsAuthoredBy results
+        if "id" not in related_cultural_heritage_objects.columns:
+            return []
 
         related_ids = set(related_cultural_heritage_objects["id"])
-        print("Related IDs:", related_ids)
+        logger.debug("Related IDs: %s", related_ids)
         related_ids_str = {str(id) for id in related_ids}
 
-        all_activities = self.processQuery[0].getAllActivities()
-        # print(all_activities)
+        if "object_id" not in all_activities.columns:
+            return []
 
-        # Convert object_id column to string (if not already)
-
-        all_activities["object_id"] = all_activities["object_id"].astype(str)
+        # Compare ids as strings: the SPARQL results parse them as numbers
         selected_rows = all_activities[
-            all_activities["object_id"].isin(related_ids_str)
+            all_activities["object_id"].astype(str).isin(related_ids_str)
         ]
-        
+
         # Convert selected_rows to a list of Activity objects
-        activities_list = [Activity(row) for index, row in selected_rows.iterrows()]
-        
-        return activities_list
+        return activities_from_frame(selected_rows, objects=self.objects)
 
-    def getObjectsHandledByResponsiblePerson(
-        self, responsible_person: str
-    ) -> List[CulturalHeritageObject]:  # Ekaterina
-        all_objects = []
+    def _objects_handled(self, method: str, value: str) -> List[CulturalHeritageObject]:
+        # The objects referred to by the activities a process query returns, in the order
+        # they first appear
+        activities_df = objects_df = None
         if len(self.processQuery) > 0:
-            activities_df = self.processQuery[0].getActivitiesByResponsiblePerson(
-                responsible_person
-            )
+            activities_df = self._fan_out(self.processQuery, method, value)
 
-            if len(self.metadataQuery) > 0:
-                objects_df = self.metadataQuery[0].getAllCulturalHeritageObjects()
-
-                object_ids = []
-                for index, row in activities_df.iterrows():
-                    activity_id = row["object_id"]
-                    if activity_id not in object_ids:
-                        object_ids.append(activity_id)
-                        object_data = objects_df[objects_df["id"] == activity_id].iloc[
-                            0
-                        ]
-                        object_type = object_data["type_name"]
-                        if object_type == "NauticalChart":
-                            obj = NauticalChart(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "ManuscriptPlate":
-                            obj = ManuscriptPlate(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "ManuscriptVolume":
-                            obj = ManuscriptVolume(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "PrintedVolume":
-                            obj = PrintedVolume(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "PrintedMaterial":
-                            obj = PrintedMaterial(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Herbarium":
-                            obj = Herbarium(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Specimen":
-                            obj = Specimen(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Painting":
-                            obj = Painting(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Model":
-                            obj = Model(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=str(object_data["author_id"]),
-                                author_name=object_data["author_name"],
-                            )
-                        elif object_type == "Model":
-                            obj = Model(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Map":
-                            obj = Map(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        else:
-                            print(f"No class defined for type: {object_type}")
-                            continue
-
-                    all_objects.append(obj)
-
-        print("Cultural Heritage Objects list created:")
-        for obj in all_objects:
-            print(
-                f"Object ID: {obj.id}, Title: {obj.title}, Type: {type(obj).__name__}"
-            )
+            if len(self.metadataQuery) > 0 and "object_id" in activities_df.columns and not activities_df.empty:
+                # Only the objects the activities refer to are fetched from the metadata
+                objects_df = self._fan_out(self.metadataQuery, "getCulturalHeritageObjectsByIds",
+                                           referred_object_ids(activities_df), self.id_batch_size)
+        return self._objects_of_activities(activities_df, objects_df)
+
+    def _objects_of_activities(self, activities_df: Optional[pd.DataFrame],
+                               objects_df: Optional[pd.DataFrame]) -> List[CulturalHeritageObject]:
+        # The objects of `objects_df` the activities refer to, if both were fetched
+        all_objects = []
+        if activities_df is not None and objects_df is not None:
+            all_objects = cultural_heritage_objects_from_frame(join_on_object_id(activities_df, objects_df), self.objects)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Cultural Heritage Objects list created:")
+            for obj in all_objects:
+                logger.debug("Object ID: %s, Title: %s, Type: %s", obj.id, obj.title, type(obj).__name__)
 
         return all_objects
 
+    @instrumented
+    def getObjectsHandledByResponsiblePerson(
+        self, responsible_person: str
+    ) -> List[CulturalHeritageObject]:  # Ekaterina
+        return self._objects_handled("getActivitiesByResponsiblePerson", responsible_person)
+
+    @instrumented
     def getObjectsHandledByResponsibleInstitution(
         self, institute_name: str
     ) -> List[CulturalHeritageObject]:  # Ekaterina
-        all_objects = []
-        activities_df = pd.DataFrame()
-
-        if len(self.processQuery) > 0:
-            activities_df = self.processQuery[0].getActivitiesByResponsibleInstitution(
-                institute_name
-            )
-
-            if len(self.metadataQuery) > 0:
-                objects_df = self.metadataQuery[0].getAllCulturalHeritageObjects()
-
-                object_ids = []
-                for _, row in activities_df.iterrows():
-                    activity_id = row["object_id"]
-                    if activity_id not in object_ids:
-                        object_ids.append(activity_id)
-                        object_data = objects_df[objects_df["id"] == activity_id].iloc[
-                            0
-                        ]
-                        object_type = object_data["type_name"]
-                        if object_type == "NauticalChart":
-                            obj = NauticalChart(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "ManuscriptPlate":
-                            obj = ManuscriptPlate(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "ManuscriptVolume":
-                            obj = ManuscriptVolume(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "PrintedVolume":
-                            obj = PrintedVolume(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "PrintedMaterial":
-                            obj = PrintedMaterial(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Herbarium":
-                            obj = Herbarium(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Specimen":
-                            obj = Specimen(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Painting":
-                            obj = Painting(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Model":
-                            obj = Model(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=str(object_data["author_id"]),
-                                author_name=object_data["author_name"],
-                            )
-                        elif object_type == "Model":
-                            obj = Model(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        elif object_type == "Map":
-                            obj = Map(
-                                id=str(object_data["id"]),
-                                title=object_data["title"],
-                                date=str(object_data["date"]),
-                                owner=str(object_data["owner"]),
-                                place=object_data["place"],
-                                author_id=(
-                                    str(object_data["author_id"])
-                                    if "author_id" in objects_df.columns
-                                    else None
-                                ),
-                                author_name=(
-                                    object_data["author_name"]
-                                    if "author_name" in objects_df.columns
-                                    else None
-                                ),
-                            )
-                        else:
-                            print(f"No class defined for type: {object_type}")
-                            continue
-
-                        all_objects.append(obj)
-
-        print("Cultural Heritage Objects list created:")
-        for obj in all_objects:
-            print(
-                f"Object ID: {obj.id}, Title: {obj.title}, Type: {type(obj).__name__}"
-            )
-
-        return all_objects
+        return self._objects_handled("getActivitiesByResponsibleInstitution", institute_name)
 
+    @instrumented
     def getAuthorsOfObjectsAcquiredInTimeFrame(
         self, start_date: str, end_date: str
     ) -> list[Person]:  # Rubens
-        acquired_authors = []
+        """
+        Returns the authors of the objects acquired on or after `start_date` and exported on
+        or before `end_date`, the distinct authors of each object in turn.
 
-        activities_started = self.processQuery[0].getActivitiesStartedAfter(start_date)
-        started_ids = set(
-            activities_started[activities_started["type"] == "Acquisition"]["object_id"]
+        Each process handler answers both bounds in one query and each metadata handler
+        resolves the authors of all the objects in `id_batch_size` sized batches.
+        """
+        common_ids = acquired_and_exported_ids(
+            self._fan_out(self.processQuery, "getObjectIdsInTimeFrame", start_date, end_date)
         )
+        if not common_ids:
+            return []
+        return self._authors_of_objects(
+            common_ids,
+            self._fan_out(self.metadataQuery, "getAuthorsOfCulturalHeritageObjects", common_ids, self.id_batch_size),
+        )
+
+    def _authors_of_objects(self, common_ids: list, authors_df: pd.DataFrame) -> List[Person]:
+        # The distinct authors of each object in turn, from getAuthorsOfCulturalHeritageObjects results
+        acquired_authors = []
+        if "object_id" not in authors_df.columns:
+            return acquired_authors
+
+        authors_df = join_on_object_id(
+            pd.DataFrame({"object_id": common_ids}), authors_df.rename(columns={"object_id": "id", "id": "author_id"})
+        ).drop_duplicates(["id", "author_id"])
+        for author_id, name in zip(authors_df["author_id"].tolist(), authors_df["name"].tolist()):
+            acquired_authors.append(Person(id=author_id, name=name))
+
+        return acquired_authors
+
+
+class AsyncBasicMashup(BasicMashup):
+    """
+    The methods of BasicMashup as coroutines, for asyncio applications.
+
+    Meant for AsyncMetadataQueryHandler and AsyncProcessDataQueryHandler, whose calls are
+    awaited concurrently with asyncio.gather; blocking handlers are called in the loop's
+    default executor instead. At most `max_workers` calls of one fan-out run at once, and a
+    call still running after `timeout` seconds is cancelled and its handler left out of the
+    result. The iter* methods are inherited unchanged and block.
+
+    Used as an async context manager (or through aclose), the mashup closes its handlers
+    and worker threads when done.
+    """
+
+    async def aclose(self):
+        # Close the handlers that hold connections, then the worker threads
+        for handler in self.metadataQuery + self.processQuery:
+            if hasattr(handler, "aclose"):
+                await handler.aclose()
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _gather(self, handlers: list, method: str, *args) -> pd.DataFrame:
+        # Coroutine counterpart of _fan_out
+        if not handlers:
+            return pd.DataFrame()
+        limit = asyncio.Semaphore(self.max_workers)
+
+        async def call(handler):
+            async with limit:
+                function = getattr(handler, method)
+                if asyncio.iscoroutinefunction(function):
+                    return await asyncio.wait_for(function(*args), self.timeout)
+                future = asyncio.get_running_loop().run_in_executor(None, function, *args)
+                return await asyncio.wait_for(future, self.timeout)
+
+        results = await asyncio.gather(*(call(handler) for handler in handlers), return_exceptions=True)
+        frames = []
+        for handler, result in zip(handlers, results):
+            handler_name = f"{type(handler).__name__}.{method}"
+            if isinstance(result, asyncio.TimeoutError):
+                logger.warning("%s did not answer within %ss, skipping its results", handler_name, self.timeout)
+            elif isinstance(result, Exception):
+                logger.warning("%s failed, skipping its results: %s", handler_name, result)
+            elif isinstance(result, BaseException):
+                raise result  # Cancelled
+            else:
+                frames.append(result)
+        return merge_handler_frames(frames)
+
+    @instrumented
+    async def getEntityById(self, id: str) -> IdentifiableEntity:
+        return self._entity(await self._gather(self.metadataQuery, "getById", id))
+
+    @instrumented
+    async def getAllPeople(self) -> List[Person]:
+        return self._people(await self._gather(self.metadataQuery, "getAllPeople"))
+
+    @instrumented
+    async def getAllCulturalHeritageObjects(self) -> List[CulturalHeritageObject]:
+        return self._objects(await self._gather(self.metadataQuery, "getAllCulturalHeritageObjects"))
+
+    @instrumented
+    async def getAuthorsOfCulturalHeritageObject(self, object_id: str) -> List[Person]:
+        return self._authors(await self._gather(self.metadataQuery, "getAuthorsOfCulturalHeritageObject", object_id))
+
+    @instrumented
+    async def getCulturalHeritageObjectsAuthoredBy(self, input_id: str) -> List[CulturalHeritageObject]:
+        return self._objects_authored(await self._gather(self.metadataQuery, "getCulturalHeritageObjectsAuthoredBy", input_id))
+
+    async def _activities(self, method: str, *args, types: Optional[set] = None) -> List[Activity]:
+        if len(self.processQuery) > 0:
+            return self._activities_from(await self._gather(self.processQuery, method, *args), types)
+        return []
+
+    @instrumented
+    async def getAllActivities(self) -> List[Activity]:
+        return await self._activities("getAllActivities")
+
+    @instrumented
+    async def getActivitiesByResponsibleInstitution(self, institute_name: str) -> List[Activity]:
+        activities = await self._activities("getActivitiesByResponsibleInstitution", institute_name)
+        return [a for a in activities if institute_name.lower() in (a.institute or "").lower()]
+
+    @instrumented
+    async def getActivitiesByResponsiblePerson(self, person_name: str) -> List[Activity]:
+        activities = await self._activities("getActivitiesByResponsiblePerson", person_name)
+        return [a for a in activities if person_name.lower() in (a.person or "").lower()]
+
+    @instrumented
+    async def getActivitiesUsingTool(self, tool_name: str) -> List[Activity]:
+        return await self._activities("getActivitiesUsingTool", tool_name)
+
+    @instrumented
+    async def getActivitiesStartedAfter(self, date: str) -> List[Activity]:
+        return await self._activities("getActivitiesStartedAfter", date)
+
+    @instrumented
+    async def getActivitiesEndedBefore(self, date: str) -> List[Activity]:
+        return await self._activities("getActivitiesEndedBefore", date)
+
+    @instrumented
+    async def getActivitiesOverlapping(self, start_date: str, end_date: str) -> List[Activity]:
+        return await self._activities("getActivitiesOverlapping", start_date, end_date)
 
-        activities_ended = self.processQuery[0].getActivitiesEndedBefore(end_date)
-        ended_ids = set(
-            activities_ended[activities_ended["type"] == "Exporting"]["object_id"]
+    @instrumented
+    async def getActivitiesContainedIn(self, start_date: str, end_date: str) -> List[Activity]:
+        return await self._activities("getActivitiesContainedIn", start_date, end_date)
+
+    @instrumented
+    async def getAcquisitionsByTechnique(self, technique: str) -> List[Activity]:
+        return await self._activities("getAcquisitionsByTechnique", technique, types={"Acquisition"})
+
+
+class AsyncAdvancedMashup(AsyncBasicMashup, AdvancedMashup):
+    """
+    The methods of AdvancedMashup as coroutines, for asyncio applications.
+
+    Where the SQL and SPARQL sides of a method do not depend on each other they are awaited
+    together, so a method takes as long as the slower side rather than both.
+    """
+
+    @instrumented
+    async def getActivitiesOnObjectsAuthoredBy(self, author_id: str) -> List[Activity]:
+        related_cultural_heritage_objects, all_activities = await asyncio.gather(
+            self._gather(self.metadataQuery, "getCulturalHeritageObjectsAuthoredBy", author_id),
+            self._gather(self.processQuery, "getAllActivities"),
+        )
+        return self._activities_on_objects(related_cultural_heritage_objects, all_activities)
+
+    async def _objects_handled(self, method: str, value: str) -> List[CulturalHeritageObject]:
+        # The metadata lookup for the objects of each process handler starts as soon as that
+        # handler answers, while the other process handlers are still running. Each object
+        # is looked up once.
+        if len(self.processQuery) == 0:
+            return self._objects_of_activities(None, None)
+        requested = set()
+
+        async def handled(handler):
+            activities_df = await self._gather([handler], method, value)
+            if len(self.metadataQuery) == 0 or "object_id" not in activities_df.columns or activities_df.empty:
+                return activities_df, None
+            object_ids = [object_id for object_id in referred_object_ids(activities_df) if object_id not in requested]
+            requested.update(object_ids)
+            if not object_ids:
+                return activities_df, None
+            return activities_df, await self._gather(self.metadataQuery, "getCulturalHeritageObjectsByIds", object_ids,
+                                                     self.id_batch_size)
+
+        results = await asyncio.gather(*(handled(handler) for handler in self.processQuery))
+        objects = [objects_df for _, objects_df in results if objects_df is not None]
+        return self._objects_of_activities(
+            merge_handler_frames([activities_df for activities_df, _ in results]),
+            merge_handler_frames(objects) if objects else None,
         )
 
-        common_ids = started_ids.intersection(ended_ids)
-        common_ids_int = {int(id) for id in common_ids}
-        print("IDs of this timeframe:", common_ids_int)
+    @instrumented
+    async def getObjectsHandledByResponsiblePerson(self, responsible_person: str) -> List[CulturalHeritageObject]:
+        return await self._objects_handled("getActivitiesByResponsiblePerson", responsible_person)
 
-        for item in common_ids_int:
-            authors = self.getAuthorsOfCulturalHeritageObject(item)
-            acquired_authors.extend(authors)
+    @instrumented
+    async def getObjectsHandledByResponsibleInstitution(self, institute_name: str) -> List[CulturalHeritageObject]:
+        return await self._objects_handled("getActivitiesByResponsibleInstitution", institute_name)
 
-        return acquired_authors
\ No newline at end of file
+    @instrumented
+    async def getAuthorsOfObjectsAcquiredInTimeFrame(self, start_date: str, end_date: str) -> List[Person]:
+        # The authors can only be asked for once every process handler has answered
+        common_ids = acquired_and_exported_ids(
+            await self._gather(self.processQuery, "getObjectIdsInTimeFrame", start_date, end_date)
+        )
+        if not common_ids:
+            return []
+        return self._authors_of_objects(
+            common_ids,
+            await self._gather(self.metadataQuery, "getAuthorsOfCulturalHeritageObjects", common_ids, self.id_batch_size),
+        )
@@ -0,0 +1,655 @@
+# -*- coding: utf-8 -*-
+# Benchmarks for the storage and query paths of impl.py.
+#
+# They do not need a running Blazegraph instance. Run them from the repository root, e.g.:
+#
+#     python Tests/benchmark.py fts --activities 5000000
+#
+# and pass --help to a benchmark to see its options.
+import argparse
+import asyncio
+import csv
+import gc
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Main"))
+
+import impl  # noqa: E402
+from blazegraph_standin import BlazegraphStandIn  # noqa: E402
+
+TYPES = list(impl.ACTIVITY_TABLES.values())
+TECHNIQUES = ["Photogrammetry", "Structured-light 3D scanner", "Laser scanner", "Computed tomography",
+              "Time-of-flight optical scanner", "Manual measurement", "Contact scanner"]
+
+
+def timed(function, *args, repeat=5):
+    # Best wall time of `repeat` calls, in seconds, and the last result
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def synthetic_names(seed=42):
+    rng = random.Random(seed)
+    syllables = ["al", "be", "ca", "do", "er", "fi", "ga", "ho", "in", "ju", "ka", "lo", "mi", "no",
+                 "or", "pe", "qu", "ri", "sa", "to", "ul", "vi", "wa", "xe", "yo", "za"]
+
+    def word(n):
+        return "".join(rng.choice(syllables) for _ in range(n)).capitalize()
+
+    people = [f"{word(2)} {word(3)}" for _ in range(5000)]
+    institutes = [f"{word(3)} {rng.choice(['Institute', 'Council', 'Library', 'Museum'])}" for _ in range(500)]
+    tools = [f"{word(2)} {rng.randint(1, 99)}" for _ in range(400)]
+    return rng, people, institutes, tools
+
+
+def make_activity_db(path, activities, batch_size=100000):
+    # Fill an activity-schema database with `activities` random rows (five per object)
+    rng, people, institutes, tools = synthetic_names()
+    conn = sqlite3.connect(path, isolation_level=None)
+    c = conn.cursor()
+    for name, value in impl.BULK_LOAD_PRAGMAS.items():
+        c.execute(f"PRAGMA {name} = {value}")
+    c.execute("BEGIN")
+    impl.create_activity_schema(c)
+    rows, tool_rows = [], []
+    for activity_id in range(1, activities + 1):
+        kind = TYPES[(activity_id - 1) % len(TYPES)]
+        start = f"20{rng.randint(10, 23)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        rows.append((activity_id, str((activity_id - 1) // len(TYPES) + 1), kind,
+                     rng.choice(institutes), rng.choice(people),
+                     rng.choice(TECHNIQUES) if kind == "Acquisition" else None, start, start))
+        for position, tool in enumerate(rng.sample(tools, rng.randint(1, 3))):
+            tool_rows.append((activity_id, position, tool))
+        if len(rows) >= batch_size:
+            c.executemany(impl.ACTIVITY_INSERT, rows)
+            c.executemany(impl.ACTIVITY_TOOL_INSERT, tool_rows)
+            rows, tool_rows = [], []
+    c.executemany(impl.ACTIVITY_INSERT, rows)
+    c.executemany(impl.ACTIVITY_TOOL_INSERT, tool_rows)
+    c.execute("COMMIT")
+    conn.close()
+    return people, institutes, tools
+
+
+def bench_fts(args):
+    """LIKE scans against the FTS5 trigram index for the four substring lookups."""
+    with tempfile.TemporaryDirectory() as root:
+        db = os.path.join(root, "activities.db")
+        started = time.perf_counter()
+        people, institutes, tools = make_activity_db(db, args.activities)
+        print(f"Generated {args.activities} activities in {time.perf_counter() - started:.1f}s")
+
+        q = impl.ProcessDataQueryHandler()
+        q.setDbPathOrUrl(db)
+        probes = [
+            ("getActivitiesByResponsiblePerson", people[7].split()[1][:5].lower()),
+            ("getActivitiesByResponsibleInstitution", institutes[3].split()[0][:5].upper()),
+            ("getActivitiesUsingTool", tools[11]),
+            ("getAcquisitionsByTechnique", "tomogr"),
+        ]
+        like = {}
+        for method, value in probes:
+            like[method] = timed(getattr(q, method), value, repeat=args.repeat)
+
+        started = time.perf_counter()
+        indexed = impl.build_activity_fts(db)
+        print(f"Built the full-text index over {indexed} activities in {time.perf_counter() - started:.1f}s")
+
+        print(f"{'method':40} {'rows':>8} {'LIKE (ms)':>10} {'FTS5 (ms)':>10} {'speed-up':>9}")
+        for method, value in probes:
+            like_time, expected = like[method]
+            fts_time, result = timed(getattr(q, method), value, repeat=args.repeat)
+            assert len(result) == len(expected), method
+            print(f"{method:40} {len(result):8} {like_time * 1000:10.1f} {fts_time * 1000:10.1f} "
+                  f"{like_time / fts_time:8.1f}x")
+
+
+def activity_frame(activities):
+    # A getAllActivities-shaped DataFrame of `activities` random rows
+    rng, people, institutes, tools = synthetic_names()
+    kinds = [TYPES[i % len(TYPES)] for i in range(activities)]
+    dates = [f"20{rng.randint(10, 23)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for _ in range(activities)]
+    return pd.DataFrame({
+        "object_id": [str(i // len(TYPES) + 1) for i in range(activities)],
+        "responsible_institute": [rng.choice(institutes) for _ in range(activities)],
+        "responsible_person": [rng.choice(people) for _ in range(activities)],
+        "technique": [rng.choice(TECHNIQUES) if kind == "Acquisition" else None for kind in kinds],
+        "tool": [None] * activities,
+        "start_date": dates,
+        "end_date": dates,
+        "type": kinds,
+    })
+
+
+def iterrows_activities(df):
+    # The row-by-row construction the mashups used before activities_from_frame
+    activities = []
+    for _, row in df.iterrows():
+        refers_to = impl.CulturalHeritageObject(str(row["object_id"]), "", "", "", "")
+        args = (str(row["responsible_institute"]), str(row["responsible_person"]), str(row["tool"]),
+                str(row["start_date"]), str(row["end_date"]))
+        if row["type"] == "Acquisition":
+            activities.append(impl.Acquisition(refers_to, args[0], str(row["technique"]), args[1], args[3], args[4], args[2]))
+        elif row["type"] in impl.ACTIVITY_CLASSES:
+            activities.append(impl.ACTIVITY_CLASSES[row["type"]](refers_to, *args))
+    return activities
+
+
+def bench_materialize(args):
+    """Building Activity objects from a query result: iterrows against activities_from_frame."""
+    df = activity_frame(args.activities)
+    print(f"{'method':22} {'activities':>10} {'seconds':>8} {'activities/s':>13}")
+    for name, function in (("iterrows", iterrows_activities), ("activities_from_frame", impl.activities_from_frame)):
+        seconds, built = timed(function, df, repeat=args.repeat)
+        assert len(built) == args.activities, name
+        print(f"{name:22} {len(built):10} {seconds:8.2f} {len(built) / seconds:13.0f}")
+
+
+class LegacyCulturalHeritageObject(object):
+    # The attribute layout of CulturalHeritageObject before it used __slots__
+    def __init__(self, id, title, date, owner, place, hasAuthor=None, author_id=None, author_name=None):
+        self.id = id
+        self.title = title
+        self.date = date
+        self.owner = str(owner)
+        self.place = place
+        self.author_id = author_id
+        self.author_name = author_name
+        self.hasAuthor = hasAuthor or []
+
+
+class LegacyActivity(object):
+    # The attribute layout of Activity before it used __slots__
+    def __init__(self, refersTo, institute, person, tool, start, end, technique=None):
+        self.refersTo = refersTo
+        self.institute = institute
+        self.person = person
+        self.tool = [tool] if tool else []
+        self.start = start
+        self.end = end
+        self.technique = technique
+
+
+def legacy_activities(df):
+    # One unslotted activity and one fresh placeholder object per row, as the mashups used to build them
+    return [
+        LegacyActivity(LegacyCulturalHeritageObject(object_id, "", "", "", ""), institute, person, None, start, end, technique)
+        for object_id, institute, person, technique, start, end in zip(
+            df["object_id"].tolist(), df["responsible_institute"].tolist(), df["responsible_person"].tolist(),
+            df["technique"].tolist(), df["start_date"].tolist(), df["end_date"].tolist())
+    ]
+
+
+def allocated(function, *args):
+    # Bytes still allocated by the result of function(*args), and the result
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def bench_memory(args):
+    """Bytes per materialized activity: unslotted objects against slotted ones sharing objects per id."""
+    df = activity_frame(args.activities)
+    print(f"{'layout':34} {'activities':>10} {'objects':>8} {'MB':>8} {'bytes/activity':>15}")
+    for name, function in (("dict + placeholder per activity", legacy_activities),
+                           ("__slots__ + identity map", impl.activities_from_frame)):
+        size, built = allocated(function, df)
+        objects = len({id(activity.refersTo) for activity in built})
+        print(f"{name:34} {len(built):10} {objects:8} {size / 2 ** 20:8.1f} {size / len(built):15.0f}")
+        del built
+
+
+def bench_logging(args):
+    """Cost of the mashup's diagnostics: silent by default, against DEBUG output to a discarded stream."""
+    with tempfile.TemporaryDirectory() as root:
+        db = os.path.join(root, "activities.db")
+        make_activity_db(db, args.activities)
+        q = impl.ProcessDataQueryHandler()
+        q.setDbPathOrUrl(db)
+        m = impl.BasicMashup([], [q])
+
+        def baseline():
+            # The same query and materialization, without the mashup's logging
+            return impl.activities_from_frame(q.getAllActivities())
+
+        def debug():
+            handler = impl.configure_logging(logging.DEBUG, io.StringIO())
+            try:
+                return m.getAllActivities()
+            finally:
+                impl.logger.removeHandler(handler)
+                impl.logger.setLevel(logging.NOTSET)
+
+        print(f"{'mode':22} {'activities':>10} {'seconds':>8} {'us/activity':>12}")
+        for name, function in (("no logging calls", baseline), ("silent (default)", m.getAllActivities),
+                               ("DEBUG to a buffer", debug)):
+            seconds, built = timed(function, repeat=args.repeat)
+            assert len(built) == args.activities, name
+            print(f"{name:22} {len(built):10} {seconds:8.2f} {seconds / len(built) * 1e6:12.2f}")
+
+
+HERITAGE_TYPES = ["Nautical chart", "Manuscript plate", "Manuscript volume", "Printed volume", "Printed material",
+                  "Herbarium", "Specimen", "Painting", "Model", "Map"]
+
+
+def bench_parquet(args):
+    """Process queries on the SQLite database against a partitioned Parquet snapshot of it."""
+    with tempfile.TemporaryDirectory() as root:
+        db = os.path.join(root, "activities.db")
+        people, institutes, tools = make_activity_db(db, args.activities)
+        snapshot = os.path.join(root, "snapshot")
+        exported = impl.export_activity_parquet(db, snapshot)
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(snapshot) for f in files)
+        print(f"Exported {exported['activities']} activities to {exported['files']} files "
+              f"({size / 2 ** 20:.1f} MiB, database {os.path.getsize(db) / 2 ** 20:.1f} MiB) "
+              f"in {exported['seconds']:.1f}s")
+
+        sql = impl.ProcessDataQueryHandler()
+        sql.setDbPathOrUrl(db)
+        columnar = impl.ProcessDataQueryHandler()
+        columnar.setDbPathOrUrl(f"parquet://{snapshot}")
+        probes = [
+            ("getAllActivities", ()),
+            ("getActivitiesStartedAfter", ("2022-01-01",)),
+            ("getActivitiesEndedBefore", ("2011-06-01",)),
+            ("getActivitiesByResponsiblePerson", (people[7].split()[1][:5].lower(),)),
+            ("getActivitiesUsingTool", (tools[11],)),
+            ("getObjectIdsInTimeFrame", ("2023-01-01", "2010-12-31")),
+        ]
+        print(f"{'method':36} {'rows':>9} {'SQLite (ms)':>12} {'Parquet (ms)':>13} {'speed-up':>9}")
+        for method, method_args in probes:
+            sql_time, expected = timed(getattr(sql, method), *method_args, repeat=args.repeat)
+            parquet_time, result = timed(getattr(columnar, method), *method_args, repeat=args.repeat)
+            assert len(result) == len(expected), method
+            print(f"{method:36} {len(result):9} {sql_time * 1000:12.1f} {parquet_time * 1000:13.1f} "
+                  f"{sql_time / parquet_time:8.1f}x")
+
+
+def bench_serving(args):
+    """p50/p99 latency of each query method under concurrent readers, pooled against read-only serving."""
+    with tempfile.TemporaryDirectory() as root:
+        db = os.path.join(root, "activities.db")
+        people, institutes, tools = make_activity_db(db, args.activities)
+        impl.build_activity_fts(db)
+        probes = [
+            ("getActivitiesByResponsiblePerson", (people[7].split()[1][:5].lower(),)),
+            ("getActivitiesByResponsibleInstitution", (institutes[3].split()[0][:5].upper(),)),
+            ("getActivitiesUsingTool", (tools[11],)),
+            ("getAcquisitionsByTechnique", ("tomogr",)),
+            ("getActivitiesStartedAfter", ("2023-12-20",)),
+            ("getActivitiesEndedBefore", ("2010-01-10",)),
+            ("getObjectIdsInTimeFrame", ("2023-12-25", "2010-01-05")),
+        ]
+        print(f"{args.readers} readers, {args.queries} queries each per method")
+        print(f"{'method':40} {'mode':8} {'rows':>6} {'p50 (ms)':>9} {'p99 (ms)':>9} {'queries/s':>10}")
+        for method, method_args in probes:
+            for mode, serving in (("pooled", False), ("serving", True)):
+                q = impl.ProcessDataQueryHandler(pool_size=args.readers, serving=serving)
+                started = time.perf_counter()
+                q.setDbPathOrUrl(db)
+                setup = time.perf_counter() - started
+                rows = len(getattr(q, method)(*method_args))
+                latencies = []
+
+                def read():
+                    for _ in range(args.queries):
+                        started = time.perf_counter()
+                        getattr(q, method)(*method_args)
+                        latencies.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                threads = [threading.Thread(target=read) for _ in range(args.readers)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+                latencies.sort()
+                print(f"{method:40} {mode:8} {rows:6} {latencies[len(latencies) // 2] * 1000:9.2f} "
+                      f"{latencies[int(len(latencies) * 0.99)] * 1000:9.2f} {len(latencies) / elapsed:10.0f}"
+                      + (f"   (setup {setup * 1000:.0f} ms)" if serving and method == probes[0][0] else ""))
+                impl.close_sqlite_pools()
+
+
+def bench_periods(args):
+    """Date-range queries comparing the date columns as text against the interval index."""
+    with tempfile.TemporaryDirectory() as root:
+        plain = os.path.join(root, "plain.db")
+        make_activity_db(plain, args.activities)
+        indexed = os.path.join(root, "indexed.db")
+        shutil.copy(plain, indexed)
+        started = time.perf_counter()
+        impl.build_activity_periods(indexed)
+        print(f"Indexed {args.activities} activities in {time.perf_counter() - started:.1f}s")
+
+        handlers = []
+        for db in (plain, indexed):
+            q = impl.ProcessDataQueryHandler()
+            q.setDbPathOrUrl(db)
+            handlers.append(q)
+        probes = [
+            ("getActivitiesStartedAfter", ("2023-12-20",)),
+            ("getActivitiesEndedBefore", ("2010-01-10",)),
+            ("getActivitiesOverlapping", ("2016-06-01", "2016-06-03")),
+            ("getActivitiesContainedIn", ("2018-02-01", "2018-02-04")),
+            ("getObjectIdsInTimeFrame", ("2023-12-25", "2010-01-05")),
+        ]
+        print(f"{'method':30} {'rows':>7} {'text (ms)':>10} {'index (ms)':>11} {'speed-up':>9}")
+        for method, method_args in probes:
+            text_time, expected = timed(getattr(handlers[0], method), *method_args, repeat=args.repeat)
+            index_time, result = timed(getattr(handlers[1], method), *method_args, repeat=args.repeat)
+            assert len(result) == len(expected), method
+            print(f"{method:30} {len(result):7} {text_time * 1000:10.1f} {index_time * 1000:11.1f} "
+                  f"{text_time / index_time:8.1f}x")
+
+
+def make_meta_csv(path, objects):
+    # Write a metadata CSV shaped like meta.csv, with `objects` rows and one author per row
+    rng, people, institutes, tools = synthetic_names()
+    authors = [f"{name} (VIAF:{100000 + i})" for i, name in enumerate(people)]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Id", "Type", "Title", "Date", "Author", "Owner", "Place"])
+        for object_id in range(1, objects + 1):
+            writer.writerow([object_id, rng.choice(HERITAGE_TYPES), f"Title {object_id}", rng.randint(1400, 1900),
+                             rng.choice(authors), rng.choice(institutes), rng.choice(["Bologna", "Ravenna", "Forli"])])
+
+
+def bench_embedded(args):
+    """Metadata queries over HTTP to a Blazegraph stand-in against the embedded stores."""
+    with tempfile.TemporaryDirectory() as root, BlazegraphStandIn() as server:
+        meta = os.path.join(root, "meta.csv")
+        make_meta_csv(meta, args.objects)
+        uploader = impl.MetadataUploadHandler(mode="streaming", sink=impl.GraphSink())
+        backends = [("Blazegraph stand-in", server.url), ("rdflib snapshot", f"rdflib://{root}/meta.nt")]
+        try:
+            import pyoxigraph  # noqa: F401
+            backends.append(("Oxigraph", f"oxigraph://{root}/oxigraph"))
+        except ImportError:
+            print("pyoxigraph is not installed, skipping the Oxigraph store")
+
+        ids = [str(i) for i in range(1, args.objects + 1, max(args.objects // 100, 1))]
+        probes = [("getAllCulturalHeritageObjects", ()), ("getAllPeople", ()),
+                  ("getAuthorsOfCulturalHeritageObject", ("17",)), ("getCulturalHeritageObjectsByIds", (ids,))]
+        times = {}
+        for name, url in backends:
+            # The stand-in's graph is filled directly: uploads are not what is measured here
+            store = impl.get_embedded_store(url)
+            sink = impl.EmbeddedStoreSink(store) if store is not None else impl.GraphSink(server.graph)
+            loaded = uploader.stream_heritage_data(meta, sink)
+            print(f"Loaded {loaded['triples']} triples into {name} in {loaded['seconds']:.1f}s")
+            q = impl.MetadataQueryHandler(cache=False)
+            q.setDbPathOrUrl(url)
+            for method, method_args in probes:
+                times[name, method] = timed(getattr(q, method), *method_args, repeat=args.repeat)
+            impl.close_embedded_store(url)
+
+        print(f"{'method':36} " + " ".join(f"{name:>20}" for name, _ in backends) + "   (ms)")
+        for method, _ in probes:
+            rows = {len(times[name, method][1]) for name, _ in backends}
+            assert len(rows) == 1, method
+            print(f"{method:36} " + " ".join(f"{times[name, method][0] * 1000:20.1f}" for name, _ in backends))
+
+
+def bench_http(args):
+    """Query latency with a new connection per request (sparql_dataframe) against the shared session."""
+    from sparql_dataframe import get
+
+    # --handshake adds its milliseconds to the first request on each connection, as TCP and
+    # TLS setup to a remote endpoint would
+    with BlazegraphStandIn(latency=args.latency / 1000, connect_latency=args.handshake / 1000) as server:
+        impl.MetadataUploadHandler(mode="streaming", sink=impl.GraphSink(server.graph))
+        query = impl.AUTHORS_BY_OBJECT_QUERY % {"ids": impl.sparql_values(["1"])}
+        print(f"{'client':30} {'queries':>8} {'mean (ms)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'connections':>12}")
+        for name, function in (("sparql_dataframe.get", lambda: get(server.url, query, True)),
+                               ("impl.sparql_select", lambda: impl.sparql_select(server.url, query))):
+            connections = len(server.connections)
+            latencies = []
+            for _ in range(args.queries):
+                started = time.perf_counter()
+                function()
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            print(f"{name:30} {args.queries:8} {sum(latencies) / len(latencies) * 1000:10.2f} "
+                  f"{latencies[len(latencies) // 2] * 1000:9.2f} {latencies[int(len(latencies) * 0.99)] * 1000:9.2f} "
+                  f"{len(server.connections) - connections:12}")
+
+
+def bench_async(args):
+    """Mashup calls from an event loop: the blocking mashup against the asyncio one, alone and concurrently."""
+    data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data")
+    with tempfile.TemporaryDirectory() as root, BlazegraphStandIn(latency=args.latency / 1000) as server:
+        impl.MetadataUploadHandler(mode="streaming", sink=impl.GraphSink(server.graph))
+        db = os.path.join(root, "process.db")
+        impl.ProcessDataUploadHandler().stream_json_to_db(os.path.join(data, "process.json"), db)
+
+        def mashup(cls, metadata_cls, process_cls):
+            qm = metadata_cls(cache=False)
+            qm.setDbPathOrUrl(server.url)
+            qp = process_cls()
+            qp.setDbPathOrUrl(db)
+            return cls([qm], [qp])
+
+        blocking = mashup(impl.AdvancedMashup, impl.MetadataQueryHandler, impl.ProcessDataQueryHandler)
+        asynchronous = mashup(impl.AsyncAdvancedMashup, impl.AsyncMetadataQueryHandler, impl.AsyncProcessDataQueryHandler)
+        probes = [("getActivitiesOnObjectsAuthoredBy", ("2",)),
+                  ("getObjectsHandledByResponsibleInstitution", ("Council",)),
+                  ("getAuthorsOfObjectsAcquiredInTimeFrame", ("2023-04-01", "2023-09-15"))]
+
+        async def run(method, method_args):
+            # One call, then --requests calls at once; the blocking mashup answers them in turn
+            timings = []
+            for calls in (1, args.requests):
+                started = time.perf_counter()
+                for _ in range(calls):
+                    expected = getattr(blocking, method)(*method_args)
+                timings.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                results = await asyncio.gather(*(getattr(asynchronous, method)(*method_args) for _ in range(calls)))
+                timings.append(time.perf_counter() - started)
+                assert all(len(result) == len(expected) for result in results), method
+            return timings
+
+        async def main():
+            print(f"{'method':44} {'blocking (ms)':>14} {'async (ms)':>11} "
+                  f"{f'x{args.requests} blocking':>14} {f'x{args.requests} async':>11}")
+            for method, method_args in probes:
+                timings = await run(method, method_args)
+                print(f"{method:44} " + " ".join(f"{t * 1000:{w}.1f}" for t, w in zip(timings, (14, 11, 14, 11))))
+            await asynchronous.aclose()
+
+        asyncio.run(main())
+
+
+def bench_metrics(args):
+    """Cost of the instrumentation: per call with metrics disabled and enabled, and on real queries."""
+
+    class Plain(object):
+        def getNothing(self):
+            return ()
+
+    class Instrumented(object):
+        @impl.instrumented
+        def getNothing(self):
+            return ()
+
+    def per_call(handler):
+        started = time.perf_counter()
+        for _ in range(args.calls):
+            handler.getNothing()
+        return (time.perf_counter() - started) / args.calls
+
+    previous = impl.set_metrics_collector(None)
+    try:
+        plain = per_call(Plain())
+        disabled = per_call(Instrumented())
+        impl.set_metrics_collector(impl.MetricsCollector())
+        enabled = per_call(Instrumented())
+        print(f"{'empty method':30} {'plain (ns)':>11} {'disabled (ns)':>14} {'enabled (ns)':>13}")
+        print(f"{'':30} {plain * 1e9:11.0f} {disabled * 1e9:14.0f} {enabled * 1e9:13.0f}")
+
+        with tempfile.TemporaryDirectory() as root:
+            db = os.path.join(root, "activities.db")
+            make_activity_db(db, args.activities)
+            q = impl.ProcessDataQueryHandler()
+            q.setDbPathOrUrl(db)
+            m = impl.BasicMashup([], [q])
+            print(f"{'query':30} {'disabled (ms)':>14} {'enabled (ms)':>13}")
+            for name, function, function_args in (("getActivitiesUsingTool", q.getActivitiesUsingTool, ("Blender",)),
+                                                  ("BasicMashup.getAllActivities", m.getAllActivities, ())):
+                impl.set_metrics_collector(None)
+                disabled = timed(function, *function_args, repeat=args.repeat)[0]
+                impl.set_metrics_collector(impl.MetricsCollector())
+                enabled = timed(function, *function_args, repeat=args.repeat)[0]
+                print(f"{name:30} {disabled * 1000:14.2f} {enabled * 1000:13.2f}")
+    finally:
+        impl.set_metrics_collector(previous)
+
+
+def bench_delta(args):
+    """Syncing a one-row edit to a store by delta against reloading the whole CSV."""
+    with tempfile.TemporaryDirectory() as root:
+        meta = os.path.join(root, "meta.csv")
+        make_meta_csv(meta, args.objects)
+        try:
+            import pyoxigraph  # noqa: F401
+            url = f"oxigraph://{root}/oxigraph"
+        except ImportError:
+            url = f"rdflib://{root}/meta.nt"
+        uploader = impl.MetadataUploadHandler(mode="streaming", sink=impl.GraphSink(),
+                                              manifest=os.path.join(root, "manifest.db"))
+        first = uploader.sync_heritage_data(meta, url)
+        print(f"First sync of {args.objects} rows to {url.partition(':')[0]}: {first['inserted']} triples "
+              f"in {first['seconds']:.2f}s")
+
+        with open(meta, encoding="utf-8") as f:
+            lines = f.readlines()
+        lines[len(lines) // 2] = lines[len(lines) // 2].replace("Title", "Edited title", 1)
+        with open(meta, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+
+        delta = uploader.sync_heritage_data(meta, url)
+        started = time.perf_counter()
+        reload = uploader.stream_heritage_data(meta, impl.EmbeddedStoreSink(impl.get_embedded_store(url)))
+        impl.close_embedded_store(url)
+        print(f"{'':16} {'seconds':>9} {'triples sent':>13} {'requests':>9}")
+        print(f"{'delta sync':16} {delta['seconds']:9.3f} {delta['deleted'] + delta['inserted']:13} {delta['requests']:9}")
+        print(f"{'full reload':16} {time.perf_counter() - started:9.3f} {reload['triples']:13} {'-':>9}")
+
+
+def sparql_result_payloads(bindings):
+    # CSV and JSON serializations of a getAllCulturalHeritageObjects-shaped result
+    rng, people, institutes, tools = synthetic_names()
+    variables = ["type_name", "id", "title", "date", "owner", "place", "author_id", "author_name"]
+    rows = []
+    for i in range(bindings):
+        rows.append([rng.choice(HERITAGE_TYPES).replace(" ", ""), str(i // 2 + 1), f"Title {i // 2 + 1}",
+                     str(rng.randint(1400, 1900)), rng.choice(institutes), "Bologna" if i % 7 else None,
+                     f"VIAF:{rng.randint(1, 99999)}", rng.choice(people)])
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(variables)
+    writer.writerows([["" if value is None else value for value in row] for row in rows])
+    document = {"head": {"vars": variables}, "results": {"bindings": [
+        {name: {"type": "literal", "value": value} for name, value in zip(variables, row) if value is not None}
+        for row in rows
+    ]}}
+    return text.getvalue().encode("utf-8"), json.dumps(document).encode("utf-8")
+
+
+class ChunkedReader(io.RawIOBase):
+    # A socket-like stream over a payload, handing it out a few kilobytes at a time
+    def __init__(self, payload, chunk=65536):
+        self.view, self.position, self.chunk = memoryview(payload), 0, chunk
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.chunk, len(self.view) - self.position)
+        buffer[:size] = self.view[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+def peak_allocated(function, *args):
+    # Peak bytes allocated while function(*args) runs
+    gc.collect()
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench_results(args):
+    """Decoding SPARQL results: buffered CSV (sparql_dataframe), CSV read from the stream, and JSON."""
+    csv_payload, json_payload = sparql_result_payloads(args.bindings)
+    print(f"{args.bindings} bindings: {len(csv_payload) / 2 ** 20:.1f} MB as CSV, {len(json_payload) / 2 ** 20:.1f} MB as JSON")
+    decoders = [
+        ("CSV, buffered", lambda: pd.read_csv(io.StringIO(csv_payload.decode("utf-8")), sep=",")),
+        ("CSV, streamed", lambda: impl.read_sparql_csv(ChunkedReader(csv_payload))),
+        ("JSON, typed columns" + (" (orjson)" if impl.orjson is not None else ""), lambda: impl.read_sparql_json(json_payload)),
+    ]
+    print(f"{'decoder':30} {'seconds':>8} {'bindings/s':>11} {'peak MB':>8}")
+    for name, function in decoders:
+        seconds, df = timed(function, repeat=args.repeat)
+        assert len(df) == args.bindings, name
+        del df
+        peak = peak_allocated(function)  # Measured apart: tracing slows allocation-heavy decoders down
+        print(f"{name:30} {seconds:8.2f} {args.bindings / seconds:11.0f} {peak / 2 ** 20:8.1f}")
+
+
+BENCHMARKS = {
+    "fts": (bench_fts, [("--activities", int, 5000000), ("--repeat", int, 3)]),
+    "materialize": (bench_materialize, [("--activities", int, 500000), ("--repeat", int, 3)]),
+    "memory": (bench_memory, [("--activities", int, 500000)]),
+    "logging": (bench_logging, [("--activities", int, 200000), ("--repeat", int, 3)]),
+    "parquet": (bench_parquet, [("--activities", int, 1000000), ("--repeat", int, 3)]),
+    "serving": (bench_serving, [("--activities", int, 1000000), ("--readers", int, 8), ("--queries", int, 50)]),
+    "periods": (bench_periods, [("--activities", int, 1000000), ("--repeat", int, 3)]),
+    "embedded": (bench_embedded, [("--objects", int, 2000), ("--repeat", int, 3)]),
+    "http": (bench_http, [("--queries", int, 500), ("--latency", float, 0.0), ("--handshake", float, 2.0)]),
+    "results": (bench_results, [("--bindings", int, 1000000), ("--repeat", int, 3)]),
+    "async": (bench_async, [("--requests", int, 20), ("--latency", float, 20.0)]),
+    "metrics": (bench_metrics, [("--calls", int, 1000000), ("--activities", int, 100000), ("--repeat", int, 5)]),
+    "delta": (bench_delta, [("--objects", int, 200000)]),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the storage and query paths of impl.py.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    for name, (function, options) in BENCHMARKS.items():
+        sub = subparsers.add_parser(name, help=function.__doc__)
+        for option, kind, default in options:
+            sub.add_argument(option, type=kind, default=default)
+        sub.set_defaults(function=function)
+    args = parser.parse_args(argv)
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# A local stand-in for the Blazegraph SPARQL endpoint, backed by an in-memory rdflib graph.
+#
+# It understands the requests impl.py sends - SPARQL queries (form-encoded or posted
+# directly), SPARQL updates and RDF documents posted for insertion - so upload and query
+# handlers can be tested and benchmarked without running Blazegraph:
+#
+#     with BlazegraphStandIn() as server:
+#         handler.setDbPathOrUrl(server.url)
+#
+# Run this file directly to serve on the port Blazegraph uses, for the tests in test.py:
+#
+#     python Tests/blazegraph_standin.py --port 9999
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from rdflib import Graph
+
+RDF_FORMATS = {
+    "text/plain": "nt",
+    "application/n-triples": "nt",
+    "text/turtle": "turtle",
+    "application/x-turtle": "turtle",
+    "application/rdf+xml": "xml",
+}
+RESULT_FORMATS = {
+    "text/csv": "csv",
+    "application/sparql-results+json": "json",
+    "application/json": "json",
+    "application/sparql-results+xml": "xml",
+}
+
+
+class BlazegraphStandIn(object):
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, connect_latency=0.0):
+        self.graph = Graph()
+        self.lock = threading.Lock()
+        self.latency = latency  # Seconds added to every response
+        self.connect_latency = connect_latency  # Seconds added to the first response on a connection, like a handshake
+        self.requests = 0
+        self.connections = set()  # Client (host, port) pairs seen, to count TCP connections
+        self.failures = 0  # Number of upcoming requests answered with 503
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/blazegraph/sparql"
+
+    def fail_next(self, count):
+        # Answer the next `count` requests with 503 Service Unavailable
+        self.failures = count
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like Blazegraph's Jetty
+            disable_nagle_algorithm = True  # Headers and body are written separately
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                if "query" in params:
+                    self._query(params["query"][0])
+                else:
+                    self._reply(200, "text/plain", b"Blazegraph stand-in")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+                if content_type == "application/x-www-form-urlencoded":
+                    params = parse_qs(body.decode("utf-8"))
+                    if "update" in params:
+                        self._update(params["update"][0])
+                    else:
+                        self._query(params.get("query", [""])[0])
+                elif content_type == "application/sparql-query":
+                    self._query(body.decode("utf-8"))
+                elif content_type == "application/sparql-update":
+                    self._update(body.decode("utf-8"))
+                elif content_type in RDF_FORMATS:
+                    self._insert(body, RDF_FORMATS[content_type])
+                else:
+                    self._reply(415, "text/plain", b"Unsupported content type")
+
+            def _begin(self):
+                if standin.connect_latency and self.client_address not in standin.connections:
+                    time.sleep(standin.connect_latency)
+                standin.connections.add(self.client_address)
+                standin.requests += 1
+                if standin.latency:
+                    time.sleep(standin.latency)
+                if standin.failures > 0:
+                    standin.failures -= 1
+                    self._reply(503, "text/plain", b"Service Unavailable")
+                    return False
+                return True
+
+            def _query(self, query):
+                if not self._begin():
+                    return
+                accept = (self.headers.get("Accept") or "text/csv").split(",")[0].split(";")[0].strip()
+                result_format = RESULT_FORMATS.get(accept, "csv")
+                try:
+                    with standin.lock:
+                        try:
+                            result = standin.graph.query(query)
+                            payload = result.serialize(format=result_format)
+                        except TypeError:
+                            # rdflib cannot sort rows where an ORDER BY expression fails to
+                            # evaluate (Blazegraph sorts them first); answer unordered instead
+                            result = standin.graph.query(re.sub(r"ORDER BY[^}]*$", "", query, flags=re.S))
+                            payload = result.serialize(format=result_format)
+                except Exception as e:
+                    self._reply(400, "text/plain", str(e).encode("utf-8"))
+                    return
+                content_type = accept if accept in RESULT_FORMATS else "text/csv"
+                self._reply(200, content_type, payload)
+
+            def _update(self, update):
+                if not self._begin():
+                    return
+                try:
+                    with standin.lock:
+                        before = len(standin.graph)
+                        standin.graph.update(update)
+                        modified = abs(len(standin.graph) - before)
+                except Exception as e:
+                    self._reply(400, "text/plain", str(e).encode("utf-8"))
+                    return
+                self._modified(modified)
+
+            def _insert(self, body, rdf_format):
+                if not self._begin():
+                    return
+                try:
+                    with standin.lock:
+                        before = len(standin.graph)
+                        standin.graph.parse(data=body.decode("utf-8"), format=rdf_format)
+                        modified = len(standin.graph) - before
+                except Exception as e:
+                    self._reply(400, "text/plain", str(e).encode("utf-8"))
+                    return
+                self._modified(modified)
+
+            def _modified(self, modified):
+                # Blazegraph answers updates with a small XML document
+                self._reply(200, "application/xml", f'<data modified="{modified}" milliseconds="0"/>'.encode("utf-8"))
+
+            def _reply(self, status, content_type, payload):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a Blazegraph stand-in backed by an in-memory graph.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    args = parser.parse_args()
+    server = BlazegraphStandIn(args.host, args.port)
+    print(f"Serving {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
@@ -13,12 +13,37 @@
 # ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
 # SOFTWARE.
 import unittest
+import io
+import csv
+import os
+import json
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+import itertools
+import re
+import urllib.request
+import urllib.error
+import asyncio
 from os import sep
 from pandas import DataFrame
 from impl import MetadataUploadHandler, ProcessDataUploadHandler
 from impl import MetadataQueryHandler, ProcessDataQueryHandler
-from impl import AdvancedMashup
-from impl import Person, CulturalHeritageObject, Activity, Acquisition
+from impl import AdvancedMashup, BasicMashup
+from impl import AsyncAdvancedMashup, AsyncMetadataQueryHandler, AsyncProcessDataQueryHandler
+from impl import Person, CulturalHeritageObject, Activity, Acquisition, Exporting, Painting, Map
+from impl import FileResolver, iter_json_array, get_sqlite_pool
+from impl import migrate_to_activity_schema, build_activity_fts
+from impl import SPARQLBulkLoader, GraphSink, NTriplesFileSink, SPARQLUploadSink
+from impl import QueryResultCache, configure_logging, invalidate_query_cache
+from impl import MetricsCollector, set_metrics_collector
+from impl import EmbeddedStoreSink, get_embedded_store, close_embedded_store
+from impl import activities_from_frame, cultural_heritage_objects_from_frame, CulturalHeritageObjectMap
+from blazegraph_standin import BlazegraphStandIn
+import impl
+from rdflib import Graph, URIRef, Literal
 
 # REMEMBER: before launching the tests, please run the Blazegraph instance!
 
@@ -162,4 +187,1160 @@ class TestProjectBasic(unittest.TestCase):
         r = am.getAuthorsOfObjectsAcquiredInTimeFrame("1088-01-01", "2029-01-01")
         self.assertIsInstance(r, list)
         for i in r:
-            self.assertIsInstance(i, Person)   
+            self.assertIsInstance(i, Person)
+
+
+class SlowProcessDataQueryHandler(ProcessDataQueryHandler):
+    # A shard answering after `delay` seconds, to test the mashup fan-out
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def getAllActivities(self):
+        time.sleep(self.delay)
+        return super().getAllActivities()
+
+
+class UnfilteredProcessDataQueryHandler(ProcessDataQueryHandler):
+    # A handler answering institution queries with every activity, leaving the filter to the mashup
+
+    def getActivitiesByResponsibleInstitution(self, institution_str):
+        return self.getAllActivities()
+
+
+class TestProjectPerformance(unittest.TestCase):
+
+    # These tests do not need a running Blazegraph instance: they work on temporary
+    # folders and databases.
+
+    def test_01_FileResolver(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "a", "b"))
+            index_path = os.path.join(root, "index.json")
+            r = FileResolver([root], index_path=index_path)
+            self.assertIsNone(r.find("process.json"))
+
+            path = os.path.join(root, "a", "b", "process.json")
+            open(path, "w").close()
+            self.assertEqual(r.find("process.json"), path)
+            self.assertTrue(os.path.isfile(index_path))
+
+            # A fresh resolver answers from the persisted index without scanning
+            r = FileResolver([root], index_path=index_path)
+            self.assertEqual(r.find("process.json"), path)
+            self.assertEqual(r.getStats()["scans"], 0)
+            self.assertEqual(r.getStats()["hits"], 1)
+
+            # The default roots follow the working directory; the index stays in the project folder
+            cwd = os.getcwd()
+            try:
+                os.chdir(os.path.join(root, "a"))
+                shared = impl.get_file_resolver()
+                self.assertEqual(shared.roots[0], os.path.realpath(os.path.join(root, "a")))
+                self.assertEqual(os.path.dirname(shared.index_path), impl.PROJECT_DIR)
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(impl.get_file_resolver().roots[0], cwd)
+
+    def test_02_StreamingIngestion(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with open(process) as f:
+            data = json.load(f)
+        self.assertEqual(list(iter_json_array(process, chunk_size=7)), data)
+
+        with tempfile.TemporaryDirectory() as root:
+            db = os.path.join(root, "process.db")
+            u = ProcessDataUploadHandler()
+            u.batch_size = 4
+            stats = u.stream_json_to_db(process, db)
+            self.assertEqual(stats["objects"], len(data))
+            self.assertEqual(stats["rows"], 5 * len(data))
+            with sqlite3.connect(db) as conn:
+                n = conn.execute("SELECT COUNT(*) FROM Exporting").fetchone()[0]
+            self.assertEqual(n, len(data))
+
+    def test_03_ConnectionPool(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with tempfile.TemporaryDirectory() as root:
+            db = os.path.join(root, "process.db")
+            ProcessDataUploadHandler().stream_json_to_db(process, db)
+
+            q = ProcessDataQueryHandler(pool_size=2)
+            self.assertTrue(q.setDbPathOrUrl(db))
+            expected = len(q.getAllActivities())
+            results = []
+
+            def read():
+                for _ in range(20):
+                    results.append(len(q.getAllActivities()))
+
+            threads = [threading.Thread(target=read) for _ in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(set(results), {expected})
+
+            pool = get_sqlite_pool(db, 2)
+            self.assertLessEqual(pool._open, 2)
+            # A handler asking for a bigger pool on the same file grows the shared one
+            wide = ProcessDataQueryHandler(pool_size=5, pool_idle_timeout=600)
+            wide.setDbPathOrUrl(db)
+            wide.getAllActivities()
+            self.assertIs(get_sqlite_pool(db, 2), pool)
+            self.assertEqual((pool.size, pool.idle_timeout), (5, 600))
+            pool.close()
+
+    def test_04_ActivitySchema(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with tempfile.TemporaryDirectory() as root:
+            tables = os.path.join(root, "tables.db")
+            activity = os.path.join(root, "activity.db")
+            ProcessDataUploadHandler().stream_json_to_db(process, tables)
+            ProcessDataUploadHandler().stream_json_to_db(process, activity)
+            self.assertEqual(migrate_to_activity_schema(activity, drop_tables=True), 175)
+            self.assertEqual(migrate_to_activity_schema(activity), 0)
+
+            qt = ProcessDataQueryHandler()
+            qt.setDbPathOrUrl(tables)
+            qa = ProcessDataQueryHandler()
+            qa.setDbPathOrUrl(activity)
+            for method, args in [
+                ("getAllActivities", ()),
+                ("getActivitiesByResponsiblePerson", ("Alice",)),
+                ("getActivitiesUsingTool", ("Blender",)),
+                ("getActivitiesStartedAfter", ("2023-05-01",)),
+                ("getAcquisitionsByTechnique", ("photo",)),
+            ]:
+                expected = getattr(qt, method)(*args)
+                result = getattr(qa, method)(*args)
+                self.assertEqual(
+                    sorted(tuple(map(str, row)) for row in expected.itertuples(index=False)),
+                    sorted(tuple(map(str, row)) for row in result[expected.columns].itertuples(index=False)),
+                )
+
+    def test_05_FullTextIndex(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with tempfile.TemporaryDirectory() as root:
+            plain = os.path.join(root, "plain.db")
+            indexed = os.path.join(root, "indexed.db")
+            ProcessDataUploadHandler(mode="streaming", schema="activity").stream_json_to_db(process, plain)
+            u = ProcessDataUploadHandler(mode="streaming", schema="activity", fts=True)
+            u.stream_json_to_db(process, indexed)
+            self.assertEqual(build_activity_fts(indexed), 175)
+
+            qp = ProcessDataQueryHandler()
+            qp.setDbPathOrUrl(plain)
+            qi = ProcessDataQueryHandler()
+            qi.setDbPathOrUrl(indexed)
+            for method, value in [
+                ("getActivitiesByResponsiblePerson", "ALICE"),
+                ("getActivitiesByResponsibleInstitution", "phil"),
+                ("getActivitiesUsingTool", "blend"),
+                ("getAcquisitionsByTechnique", "photo"),
+                ("getActivitiesByResponsiblePerson", "e"),
+            ]:
+                expected = getattr(qp, method)(value)
+                result = getattr(qi, method)(value)
+                self.assertEqual(
+                    sorted(tuple(map(str, row)) for row in expected.itertuples(index=False)),
+                    sorted(tuple(map(str, row)) for row in result.itertuples(index=False)),
+                )
+
+            # Enabling the index on a database that already holds activities indexes them too
+            with open(process, encoding="utf-8") as f:
+                items = json.load(f)
+            earlier = json.loads(json.dumps(items[:10]))
+            earlier[0]["acquisition"]["responsible person"] = "Zelda Earlier"
+            earlier[0]["acquisition"]["tool"] = ["Earlier Tool"]
+            first = os.path.join(root, "earlier.json")
+            with open(first, "w", encoding="utf-8") as f:
+                json.dump(earlier, f)
+            for index_later in ("plain_twice.db", "indexed_twice.db"):
+                ProcessDataUploadHandler().stream_json_to_db(first, os.path.join(root, index_later))
+                ProcessDataUploadHandler(mode="streaming", schema="activity", fts=index_later.startswith("indexed"))\
+                    .stream_json_to_db(process, os.path.join(root, index_later))
+            qp.setDbPathOrUrl(os.path.join(root, "plain_twice.db"))
+            qi.setDbPathOrUrl(os.path.join(root, "indexed_twice.db"))
+            with sqlite3.connect(os.path.join(root, "indexed_twice.db")) as conn:
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity_fts").fetchone()[0], 175 + 50)
+            for method, value in [
+                ("getActivitiesByResponsiblePerson", "Zelda"),
+                ("getActivitiesUsingTool", "earlier tool"),
+                ("getActivitiesByResponsibleInstitution", "phil"),
+            ]:
+                expected = getattr(qp, method)(value)
+                self.assertGreater(len(expected), 0, method)
+                self.assertEqual(sorted(map(str, expected.itertuples(index=False))),
+                                 sorted(map(str, getattr(qi, method)(value).itertuples(index=False))), method)
+
+    def test_06_SPARQLBulkLoader(self):
+        graph = Graph()
+        for i in range(250):
+            subject = URIRef(f"https://github.com/katyakrsn/ds24project/{i}")
+            graph.add((subject, URIRef("https://schema.org/name"), Literal(f'Title "{i}"\nline')))
+            graph.add((subject, URIRef("https://schema.org/identifier"), Literal(str(i))))
+
+        for format in ("sparql-update", "ntriples"):
+            with BlazegraphStandIn() as server:
+                server.fail_next(2)
+                loader = SPARQLBulkLoader(server.url, chunk_size=100, backoff=0.01, format=format)
+                self.assertEqual(loader.load(graph), 500)
+                self.assertEqual(loader.stats["requests"], 5)
+                self.assertEqual(loader.stats["retries"], 2)
+                self.assertEqual(set(server.graph), set(graph))
+
+    def test_07_StreamingMetadataConversion(self):
+        in_memory = GraphSink()
+        MetadataUploadHandler(mode="streaming", sink=in_memory, csv_chunk_size=7)
+        full = in_memory.graph
+        self.assertEqual(in_memory.count, len(full))  # Repeated authors are described once
+        self.assertIn((URIRef("https://github.com/katyakrsn/ds24project/1"), URIRef("https://schema.org/name"),
+                       Literal("Nautical chart")), full)
+
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "meta.nt")
+            MetadataUploadHandler(mode="streaming", sink=NTriplesFileSink(path))
+            self.assertEqual(set(Graph().parse(path, format="nt")), set(full))
+
+        with BlazegraphStandIn() as server:
+            loader = SPARQLBulkLoader(server.url, chunk_size=100)
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(loader))
+            self.assertEqual(set(server.graph), set(full))
+            self.assertGreater(loader.stats["requests"], 1)
+
+            u = MetadataUploadHandler(mode="streaming", sink=GraphSink())
+            server.graph.remove((None, None, None))
+            u.setDbPathOrUrl(server.url)
+            self.assertTrue(u.pushDataToDb("meta.csv"))
+            self.assertEqual(set(server.graph), set(full))
+
+    def test_08_MashupFanOut(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with open(process) as f:
+            data = json.load(f)
+
+        with tempfile.TemporaryDirectory() as root:
+            # Shard the process data across two databases
+            u = ProcessDataUploadHandler()
+            shards = []
+            for n, part in enumerate((data[:len(data) // 2], data[len(data) // 2:])):
+                path = os.path.join(root, f"part{n}.json")
+                with open(path, "w") as f:
+                    json.dump(part, f)
+                shards.append(os.path.join(root, f"shard{n}.db"))
+                u.stream_json_to_db(path, shards[-1])
+            whole = os.path.join(root, "whole.db")
+            u.stream_json_to_db(process, whole)
+
+            def handler(path, cls=ProcessDataQueryHandler, *args):
+                q = cls(*args)
+                q.setDbPathOrUrl(path)
+                return q
+
+            def keys(activities):
+                return sorted((a.refersTo.id, type(a).__name__) for a in activities)
+
+            expected = keys(BasicMashup([], [handler(whole)]).getAllActivities())
+            self.assertEqual(len(expected), 5 * len(data))
+
+            # The shards are queried concurrently and their results merged
+            m = BasicMashup([], [handler(shards[0]), handler(shards[1]), handler(shards[0])])
+            self.assertEqual(keys(m.getAllActivities()), expected)
+            self.assertEqual(len(m.getActivitiesByResponsibleInstitution("Council")),
+                             len(BasicMashup([], [handler(whole)]).getActivitiesByResponsibleInstitution("Council")))
+
+            # Activities without an institute are left out, not dereferenced
+            missing = os.path.join(root, "missing.json")
+            with open(missing, "w") as f:
+                json.dump([dict(data[0], acquisition=dict(data[0]["acquisition"], **{"responsible institute": None}))], f)
+            u.stream_json_to_db(missing, os.path.join(root, "missing.db"))
+            found = BasicMashup([], [handler(os.path.join(root, "missing.db"), UnfilteredProcessDataQueryHandler)]
+                                ).getActivitiesByResponsibleInstitution("a")
+            self.assertEqual(len(found), sum("a" in (data[0][key].get("responsible institute") or "").lower()
+                                             for key in impl.ACTIVITY_TABLES if key != "acquisition"))
+            self.assertNotIn("Acquisition", [type(a).__name__ for a in found])
+
+            slow = [handler(shards[0], SlowProcessDataQueryHandler, 0.3), handler(shards[1], SlowProcessDataQueryHandler, 0.3)]
+            started = time.perf_counter()
+            self.assertEqual(keys(BasicMashup([], slow, max_workers=2).getAllActivities()), expected)
+            self.assertLess(time.perf_counter() - started, 0.55)
+
+            # A handler exceeding the timeout is left out
+            with BasicMashup([], [handler(shards[0]), handler(shards[1], SlowProcessDataQueryHandler, 1.0)],
+                             timeout=0.2) as m:
+                started = time.perf_counter()
+                self.assertEqual(len(m.getAllActivities()), 5 * (len(data) // 2))
+                self.assertLess(time.perf_counter() - started, 0.8)
+                workers = m._executor
+            # Closing does not wait for the call that timed out
+            self.assertLess(time.perf_counter() - started, 0.8)
+            self.assertIsNone(m._executor)
+            self.assertTrue(workers._shutdown)
+            self.assertEqual(len(m.getAllActivities()), 5 * (len(data) // 2))  # New workers after close()
+            m.close()
+
+    def test_09_QueryResultCache(self):
+        with BlazegraphStandIn() as server:
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(SPARQLBulkLoader(server.url)))
+            q = MetadataQueryHandler(cache=QueryResultCache(max_entries=2, ttl=60))
+            q.setDbPathOrUrl(server.url)
+
+            requests_before = server.requests
+            people = q.getAllPeople()
+            people["name"] = None  # Callers get copies, the cached result is unchanged
+            again = q.getAllPeople()
+            self.assertEqual(server.requests, requests_before + 1)
+            self.assertTrue(again["name"].notna().all())
+            self.assertEqual((q.getCacheStats()["hits"], q.getCacheStats()["misses"]), (1, 1))
+
+            # Least recently used results are evicted past max_entries
+            q.getAllCulturalHeritageObjects()
+            q.getAuthorsOfCulturalHeritageObject("1")
+            self.assertEqual(q.getCacheStats()["entries"], 2)
+            self.assertEqual(q.getCacheStats()["evictions"], 1)
+
+            # Uploading to the endpoint invalidates its results
+            u = MetadataUploadHandler(mode="streaming", sink=GraphSink())
+            u.setDbPathOrUrl(server.url)
+            self.assertTrue(u.pushDataToDb("meta.csv"))
+            self.assertEqual(q.getCacheStats()["entries"], 0)
+            requests_before = server.requests
+            q.getAllPeople()
+            self.assertEqual(server.requests, requests_before + 1)
+
+            # A full upload goes to the endpoint set with setDbPathOrUrl and invalidates it
+            full = MetadataUploadHandler()
+            full.setDbPathOrUrl(server.url)
+            q.getAllPeople()
+            requests_before = server.requests
+            self.assertTrue(full.pushDataToDb("meta.csv"))
+            self.assertGreater(server.requests, requests_before)
+            self.assertEqual(q.getCacheStats()["entries"], 0)
+
+            # A result read before an invalidation is not cached after it
+            generation = q.cache.generation()
+            invalidate_query_cache(server.url)
+            q.cache.put(server.url, "SELECT * WHERE { ?s ?p ?o }", people, generation)
+            self.assertIsNone(q.cache.get(server.url, "SELECT * WHERE { ?s ?p ?o }"))
+            self.assertEqual(q.getCacheStats()["stale"], 1)
+
+            # Expired results are queried again
+            requests_before = server.requests
+            q.getAllPeople()
+            q.cache.ttl = 0
+            q.getAllCulturalHeritageObjects()
+            q.getAllCulturalHeritageObjects()
+            self.assertEqual(server.requests, requests_before + 3)
+
+            uncached = MetadataQueryHandler(cache=False)
+            uncached.setDbPathOrUrl(server.url)
+            uncached.getAllPeople()
+            uncached.getAllPeople()
+            self.assertEqual(server.requests, requests_before + 5)
+
+    def test_10_Materializer(self):
+        activities = DataFrame({
+            "object_id": ["1", "2", "1", "3"],
+            "responsible_institute": ["Council", "Heritage", "Council", "Philology"],
+            "responsible_person": ["Alice Liddell", "Ada Lovelace", "Alice Liddell", None],
+            "technique": ["Photogrammetry", None, None, float("nan")],
+            "tool": [None, "Blender", None, "Nikon D7200, Adobe Lightroom"],
+            "start_date": ["2023-05-08", "2023-05-09", "2023-05-10", "2023-05-11"],
+            "end_date": ["2023-05-08", "2023-05-09", "2023-05-10", "2023-05-11"],
+            "type": ["Acquisition", "Exporting", "Juggling", "Acquisition"],
+        })
+        built = activities_from_frame(activities)
+        self.assertEqual([type(a) for a in built], [Acquisition, Exporting, Acquisition])  # Row order, unknown type skipped
+        self.assertEqual([a.refersTo.id for a in built], ["1", "2", "3"])
+        self.assertEqual(built[0].getTechnique(), "Photogrammetry")
+        self.assertEqual(built[0].getTools(), [])
+        self.assertEqual(built[1].getTools(), ["Blender"])
+        self.assertIsNone(built[2].getResponsiblePerson())
+        self.assertIsNone(built[2].getTechnique())
+        self.assertEqual(built[2].getTools(), ["Nikon D7200", "Adobe Lightroom"])
+        self.assertEqual(len(activities_from_frame(activities, {"Exporting"})), 1)
+        self.assertEqual(activities_from_frame(DataFrame()), [])
+
+        objects = DataFrame({
+            "type_name": ["Painting", "Map", "Painting"],
+            "id": [7, 8, 7],
+            "title": ["Portrait", "Atlas", "Portrait"],
+            "date": [1600, 1700, 1600],
+            "owner": ["BUB", float("nan"), "BUB"],
+            "place": ["Bologna", "Bologna", "Bologna"],
+            "author_id": ["VIAF:1", None, "VIAF:2"],
+            "author_name": ["Reni, Guido", None, "Carracci, Annibale"],
+        })
+        built = cultural_heritage_objects_from_frame(objects)
+        self.assertEqual([(type(o), o.getId(), o.getDate()) for o in built], [(Painting, "7", "1600"), (Map, "8", "1700")])
+        self.assertEqual([a.getId() for a in built[0].getAuthors()], ["VIAF:1", "VIAF:2"])
+        self.assertEqual(built[1].getAuthors(), [])
+        self.assertIsNone(built[1].getOwner())
+
+    def test_11_CompactEntities(self):
+        author = Person("VIAF:1", "Reni, Guido")
+        painting = Painting("7", "Portrait", "1600", "BUB", "Bologna", author_id="VIAF:1", author_name="Reni, Guido")
+        acquisition = Acquisition(painting, "Council", "Photogrammetry", "Alice Liddell", "2023-05-08", "2023-05-08", "Nikon")
+        for entity in (author, painting, acquisition):
+            self.assertFalse(hasattr(entity, "__dict__"))
+        self.assertEqual((painting.author_id, painting.author_name), ("VIAF:1", "Reni, Guido"))
+        self.assertEqual([a.getName() for a in painting.getAuthors()], ["Reni, Guido"])
+        self.assertIs(acquisition.refersTo, painting)
+
+        # Activities on the same object share one instance; activities built once the full
+        # object is registered refer to it, and no instance handed out changes class
+        objects = CulturalHeritageObjectMap()
+        activities = DataFrame({
+            "object_id": ["7", "7", "8"],
+            "responsible_institute": ["Council"] * 3,
+            "responsible_person": ["Alice Liddell"] * 3,
+            "technique": ["Photogrammetry", None, None],
+            "tool": [None] * 3,
+            "start_date": ["2023-05-08"] * 3,
+            "end_date": ["2023-05-08"] * 3,
+            "type": ["Acquisition", "Processing", "Processing"],
+        })
+        built = activities_from_frame(activities, objects=objects)
+        self.assertIs(built[0].refersTo, built[1].refersTo)
+        self.assertIsNot(built[0].refersTo, built[2].refersTo)
+        self.assertEqual(len(objects), 2)
+
+        registered = cultural_heritage_objects_from_frame(DataFrame({
+            "type_name": ["Painting"], "id": [7], "title": ["Portrait"], "date": ["1600"],
+            "owner": ["BUB"], "place": ["Bologna"],
+        }), objects)
+        self.assertIs(type(built[1].refersTo), CulturalHeritageObject)
+        later = activities_from_frame(activities, objects=objects)
+        self.assertIs(later[0].refersTo, registered[0])
+        self.assertEqual(later[1].refersTo.getTitle(), "Portrait")
+        # An object of the same class is filled in where it is
+        again = cultural_heritage_objects_from_frame(DataFrame({
+            "type_name": ["Painting"], "id": [7], "title": ["Portrait of a Lady"], "date": ["1600"],
+            "owner": ["BUB"], "place": ["Bologna"],
+        }), objects)
+        self.assertIs(again[0], registered[0])
+        self.assertEqual(later[0].refersTo.getTitle(), "Portrait of a Lady")
+        self.assertIsInstance(objects.reference("9", Map), Map)
+
+    def test_12_LazyIterators(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with BlazegraphStandIn() as server, tempfile.TemporaryDirectory() as root:
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(SPARQLBulkLoader(server.url)))
+            qm = MetadataQueryHandler(cache=False)
+            qm.setDbPathOrUrl(server.url)
+            db = os.path.join(root, "process.db")
+            ProcessDataUploadHandler().stream_json_to_db(process, db)
+            qp = ProcessDataQueryHandler()
+            qp.setDbPathOrUrl(db)
+            m = BasicMashup([qm], [qp])
+
+            objects = [o.getId() for o in m.iterAllCulturalHeritageObjects(page_size=4)]
+            self.assertEqual(sorted(objects), sorted(o.getId() for o in m.getAllCulturalHeritageObjects()))
+            self.assertEqual(len(objects), len(set(objects)))
+            people = [p.getId() for p in m.iterAllPeople(page_size=4)]
+            self.assertEqual(sorted(people), sorted(p.getId() for p in m.getAllPeople()))
+            activities = list(m.iterAllActivities(page_size=7))
+            self.assertEqual(len(activities), len(m.getAllActivities()))
+
+            # Only the pages needed for the first results are queried
+            requests_before = server.requests
+            first = list(itertools.islice(m.iterAllCulturalHeritageObjects(page_size=2), 3))
+            self.assertEqual(len(first), 3)
+            self.assertEqual(server.requests, requests_before + 2)
+            pages = qp.iterAllActivities(page_size=10)
+            self.assertEqual(len(next(pages)), 10)
+            pages.close()
+
+    def test_13_Logging(self):
+        # Quiet by default: debug and info records are dropped, warnings still go out
+        self.assertFalse(impl.logger.isEnabledFor(logging.INFO))
+        with self.assertLogs(impl.logger, logging.WARNING) as captured:
+            cultural_heritage_objects_from_frame(DataFrame({"id": ["1"], "type_name": ["Statue"], "title": ["t"],
+                                                            "date": [""], "owner": [""], "place": [""]}))
+        self.assertEqual(captured.records[0].getMessage(), "No class defined for type: Statue")
+
+        stream = io.StringIO()
+        handler = configure_logging(logging.DEBUG, stream, structured=True)
+        try:
+            # Calling it again replaces the handler instead of adding a second one
+            handler = configure_logging(logging.DEBUG, stream, structured=True)
+            self.assertEqual(impl.logger.handlers, [handler])
+            impl.logger.info("Streamed %d rows", 2, extra={"rows": 2})
+            entry = json.loads(stream.getvalue().splitlines()[-1])
+            self.assertEqual((entry["level"], entry["message"], entry["rows"]), ("INFO", "Streamed 2 rows", 2))
+        finally:
+            impl.logger.removeHandler(handler)
+            impl.logger.setLevel(logging.NOTSET)
+
+    def test_14_JoinPushdown(self):
+        objects = DataFrame({"type_name": ["Map", "Painting", "Painting"], "id": [3, 1, 1], "title": ["c", "a", "a"],
+                             "author_id": ["x", "y", "z"]})
+        activities = DataFrame({"object_id": ["1", "2", "1", "3"]})
+        joined = impl.join_on_object_id(activities, objects)
+        self.assertEqual(joined["id"].tolist(), ["1", "1", "3"])
+        self.assertEqual(joined["author_id"].tolist(), ["y", "z", "x"])
+
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with BlazegraphStandIn() as server, tempfile.TemporaryDirectory() as root:
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(SPARQLBulkLoader(server.url)))
+            qm = MetadataQueryHandler(cache=False)
+            qm.setDbPathOrUrl(server.url)
+            db = os.path.join(root, "process.db")
+            ProcessDataUploadHandler().stream_json_to_db(process, db)
+            qp = ProcessDataQueryHandler()
+            qp.setDbPathOrUrl(db)
+
+            all_objects = qm.getAllCulturalHeritageObjects()
+            some = qm.getCulturalHeritageObjectsByIds(["1", "2", 3, "1"], batch_size=2)
+            self.assertEqual(sorted(set(some["id"].astype(str))), ["1", "2", "3"])
+            self.assertEqual(len(some), len(all_objects[all_objects["id"].astype(str).isin(["1", "2", "3"])]))
+            self.assertTrue(qm.getCulturalHeritageObjectsByIds([]).empty)
+
+            # One metadata query for the handled objects, not a scan of all of them
+            m = AdvancedMashup([qm], [qp])
+            requests_before = server.requests
+            handled = m.getObjectsHandledByResponsibleInstitution("Council")
+            self.assertEqual(server.requests, requests_before + 1)
+            expected = dict.fromkeys(qp.getActivitiesByResponsibleInstitution("Council")["object_id"].astype(str))
+            self.assertEqual([o.getId() for o in handled], [i for i in expected if i in set(all_objects["id"].astype(str))])
+
+    def test_15_TimeFrameAuthors(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with BlazegraphStandIn() as server, tempfile.TemporaryDirectory() as root:
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(SPARQLBulkLoader(server.url)))
+            qm = MetadataQueryHandler(cache=False)
+            qm.setDbPathOrUrl(server.url)
+            db = os.path.join(root, "process.db")
+            ProcessDataUploadHandler().stream_json_to_db(process, db)
+            qp = ProcessDataQueryHandler()
+            qp.setDbPathOrUrl(db)
+
+            # Both bounds in one query, matching the two separate ones
+            frame = qp.getObjectIdsInTimeFrame("2023-04-01", "2023-09-15")
+            started = qp.getActivitiesStartedAfter("2023-04-01")
+            ended = qp.getActivitiesEndedBefore("2023-09-15")
+            self.assertEqual(set(frame[frame["type"] == "Acquisition"]["object_id"]),
+                             set(started[started["type"] == "Acquisition"]["object_id"]))
+            self.assertEqual(set(frame[frame["type"] == "Exporting"]["object_id"]),
+                             set(ended[ended["type"] == "Exporting"]["object_id"]))
+
+            common = sorted(set(started[started["type"] == "Acquisition"]["object_id"])
+                            & set(ended[ended["type"] == "Exporting"]["object_id"]))
+            expected = sorted((p.getId(), p.name) for object_id in common
+                              for p in BasicMashup([qm], []).getAuthorsOfCulturalHeritageObject(object_id))
+
+            # Authors resolved in batches of two objects per query, instead of a query per object
+            m = AdvancedMashup([qm], [qp], id_batch_size=2)
+            requests_before = server.requests
+            authors = m.getAuthorsOfObjectsAcquiredInTimeFrame("2023-04-01", "2023-09-15")
+            self.assertEqual(server.requests - requests_before, (len(common) + 1) // 2)
+            self.assertEqual(sorted((p.getId(), p.name) for p in authors), expected)
+            self.assertEqual(m.getAuthorsOfObjectsAcquiredInTimeFrame("2030-01-01", "2000-01-01"), [])
+
+    def test_16_EmbeddedStore(self):
+        with BlazegraphStandIn() as server, tempfile.TemporaryDirectory() as root:
+            urls = [f"rdflib://{root}/meta.nt"]
+            try:
+                import pyoxigraph  # noqa: F401
+                urls.append(f"oxigraph://{root}/oxigraph")
+            except ImportError:
+                pass
+            self.assertIsNone(get_embedded_store(server.url))
+            with self.assertRaises(TypeError):  # Only backends implementing it can be built
+                impl.EmbeddedTripleStore(urls[0], root)
+
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(SPARQLBulkLoader(server.url)))
+            remote = MetadataQueryHandler(cache=False)
+            remote.setDbPathOrUrl(server.url)
+            for url in urls:
+                MetadataUploadHandler(mode="streaming", sink=EmbeddedStoreSink(get_embedded_store(url)))
+                local = MetadataQueryHandler(cache=False)
+                local.setDbPathOrUrl(url)
+                # The same DataFrames as the endpoint returns, without any HTTP request
+                requests_before = server.requests
+                for method, args in (("getAllCulturalHeritageObjects", ()), ("getAllPeople", ()),
+                                     ("getAuthorsOfCulturalHeritageObject", ("1",)), ("getById", ("1",))):
+                    expected, result = getattr(remote, method)(*args), getattr(local, method)(*args)
+                    self.assertEqual(sorted(map(str, result.values.tolist())), sorted(map(str, expected.values.tolist())))
+                    self.assertEqual(list(result.dtypes), list(expected.dtypes))
+                self.assertEqual(server.requests, requests_before + 4)
+
+                # The store is persisted: reopening it finds the same triples
+                size = len(get_embedded_store(url))
+                self.assertTrue(close_embedded_store(url))
+                self.assertEqual(len(get_embedded_store(url)), size)
+                close_embedded_store(url)
+
+    def test_17_SharedHTTPSession(self):
+        from pandas.testing import assert_frame_equal
+        from sparql_dataframe import get
+        with BlazegraphStandIn() as server:
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(SPARQLBulkLoader(server.url, chunk_size=50)))
+            # Every upload chunk went over the same connection
+            self.assertEqual(len(server.connections), 1)
+            self.assertGreater(server.requests, 1)
+
+            q = MetadataQueryHandler(cache=False)
+            q.setDbPathOrUrl(server.url)
+            query = impl.CULTURAL_OBJECTS_QUERY % {"page": ""}
+            assert_frame_equal(impl.sparql_select(server.url, query), get(server.url, query, True))
+
+            connections = len(server.connections)
+            for _ in range(5):
+                q.getAllPeople()
+                q.getAuthorsOfCulturalHeritageObject("1")
+            self.assertEqual(len(server.connections), connections)
+
+            # A caller asking for a larger pool than the host's session has widens it
+            session = impl.get_http_session(server.url)
+            wide = MetadataQueryHandler(cache=False, pool_size=impl.SPARQL_POOL_SIZE + 8)
+            wide.setDbPathOrUrl(server.url)
+            self.assertGreater(len(wide.getAllPeople()), 0)
+            self.assertIs(impl.get_http_session(server.url), session)
+            self.assertEqual(session.get_adapter(server.url)._pool_maxsize, impl.SPARQL_POOL_SIZE + 8)
+            impl.get_http_session(server.url, pool_size=1)  # Never narrowed
+            self.assertEqual(session.get_adapter(server.url)._pool_maxsize, impl.SPARQL_POOL_SIZE + 8)
+
+            server.fail_next(1)
+            with self.assertRaises(impl.requests.HTTPError):
+                q.getAllPeople()
+
+    def test_18_ResultDecoding(self):
+        xsd = "http://www.w3.org/2001/XMLSchema#"
+        payload = json.dumps({"head": {"vars": ["s", "n", "x", "b"]}, "results": {"bindings": [
+            {"s": {"type": "uri", "value": "http://a"}, "n": {"type": "literal", "value": "7", "datatype": xsd + "integer"},
+             "x": {"type": "literal", "value": "1.5", "datatype": xsd + "double"},
+             "b": {"type": "literal", "value": "true", "datatype": xsd + "boolean"}},
+            {"s": {"type": "bnode", "value": "b0"}, "n": {"type": "literal", "value": "x", "datatype": xsd + "integer"},
+             "x": {"type": "literal", "value": "12", "xml:lang": "en"}},
+        ]}}).encode("utf-8")
+        df = impl.read_sparql_json(payload)
+        self.assertEqual(list(df.columns), ["s", "n", "x", "b"])
+        self.assertEqual(df.iloc[0].tolist(), ["http://a", 7, 1.5, True])
+        self.assertEqual(df.iloc[1].tolist()[:3], ["_:b0", "x", "12"])
+        self.assertTrue(df["b"].isna().iloc[1])
+
+        with BlazegraphStandIn() as server:
+            MetadataUploadHandler(mode="streaming", sink=GraphSink(server.graph))
+            as_csv = MetadataQueryHandler(cache=False)
+            as_json = MetadataQueryHandler(cache=False, result_format="json")
+            for q in (as_csv, as_json):
+                q.setDbPathOrUrl(server.url)
+            # The same values; plain literals stay strings instead of being guessed as numbers
+            for method in ("getAllCulturalHeritageObjects", "getAllPeople"):
+                expected, result = getattr(as_csv, method)(), getattr(as_json, method)()
+                self.assertEqual(list(result.columns), list(expected.columns))
+                self.assertEqual(sorted(map(str, result.astype(str).values.tolist())),
+                                 sorted(map(str, expected.astype(str).values.tolist())))
+            self.assertEqual(as_json.getAllCulturalHeritageObjects()["id"].map(type).unique().tolist(), [str])
+
+            m = AdvancedMashup([as_json], [])
+            self.assertEqual(sorted(o.getId() for o in m.getAllCulturalHeritageObjects()),
+                             sorted(o.getId() for o in AdvancedMashup([as_csv], []).getAllCulturalHeritageObjects()))
+        with self.assertRaises(ValueError):
+            MetadataQueryHandler(result_format="xml")
+
+    def test_19_IncrementalUpsert(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with open(process, encoding="utf-8") as f:
+            items = json.load(f)
+        with tempfile.TemporaryDirectory() as root:
+            db = os.path.join(root, "process.db")
+            u = ProcessDataUploadHandler(mode="incremental", schema="activity", fts=True)
+            stats = u.upsert_json_to_db(process, db)
+            self.assertEqual((stats["inserted"], stats["updated"], stats["unchanged"]), (175, 0, 0))
+            stats = u.upsert_json_to_db(process, db)
+            self.assertEqual((stats["inserted"], stats["updated"], stats["unchanged"]), (0, 0, 175))
+
+            # One changed block and one new object
+            changed = json.loads(json.dumps(items))
+            changed[0]["acquisition"]["responsible person"] = "Zelda Upsert"
+            changed.append(dict(changed[1], **{"object id": "9999"}))
+            delta = os.path.join(root, "delta.json")
+            with open(delta, "w", encoding="utf-8") as f:
+                json.dump(changed, f)
+            with sqlite3.connect(db) as conn:
+                before = conn.execute(
+                    "SELECT id FROM activity WHERE object_id = ? AND type = 'Acquisition'", (items[0]["object id"],)
+                ).fetchone()[0]
+            stats = u.upsert_json_to_db(delta, db)
+            self.assertEqual((stats["inserted"], stats["updated"], stats["unchanged"]), (5, 1, 174))
+            with sqlite3.connect(db) as conn:
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity").fetchone()[0], 180)
+                self.assertEqual(conn.execute(
+                    "SELECT id, responsible_person FROM activity WHERE object_id = ? AND type = 'Acquisition'",
+                    (items[0]["object id"],)).fetchall(), [(before, "Zelda Upsert")])
+                self.assertEqual(conn.execute(
+                    "SELECT count(*) FROM activity_fts WHERE activity_fts MATCH 'zelda'").fetchone()[0], 1)
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity_fts").fetchone()[0], 180)
+            q = ProcessDataQueryHandler()
+            q.setDbPathOrUrl(db)
+            self.assertEqual(len(q.getActivitiesByResponsiblePerson("Zelda")), 1)
+
+            # A database loaded twice without the manifest is de-duplicated on the first upsert
+            blind = os.path.join(root, "blind.db")
+            s = ProcessDataUploadHandler(mode="streaming", schema="activity")
+            s.stream_json_to_db(process, blind)
+            s.stream_json_to_db(process, blind)
+            stats = u.upsert_json_to_db(process, blind)
+            self.assertEqual((stats["inserted"], stats["updated"]), (0, 175))
+            with sqlite3.connect(blind) as conn:
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity").fetchone()[0], 175)
+                self.assertEqual(conn.execute(
+                    "SELECT count(*) FROM activity_tool WHERE activity_id NOT IN (SELECT id FROM activity)"
+                ).fetchone()[0], 0)
+            self.assertEqual(u.upsert_json_to_db(process, blind)["unchanged"], 175)
+
+            # Enabling the index on a database that already holds activities indexes them too
+            earlier = os.path.join(root, "earlier.json")
+            with open(earlier, "w", encoding="utf-8") as f:
+                json.dump([dict(items[0], **{"object id": "8888", "acquisition": dict(
+                    items[0]["acquisition"], **{"responsible person": "Zelda Earlier"})})], f)
+            late = os.path.join(root, "late.db")
+            ProcessDataUploadHandler(mode="streaming", schema="activity").stream_json_to_db(earlier, late)
+            u.upsert_json_to_db(process, late)
+            with sqlite3.connect(late) as conn:
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity_fts").fetchone()[0],
+                                 conn.execute("SELECT count(*) FROM activity").fetchone()[0])
+            q.setDbPathOrUrl(late)
+            self.assertEqual(q.getActivitiesByResponsiblePerson("Zelda")["object_id"].tolist(), ["8888"])
+
+            # An object repeated in one file keeps its last version, indexed once
+            repeated = os.path.join(root, "repeated.json")
+            with open(repeated, "w", encoding="utf-8") as f:
+                json.dump([items[0], dict(items[0], acquisition=dict(
+                    items[0]["acquisition"], **{"responsible person": "Zelda Repeated"}))], f)
+            twice = os.path.join(root, "twice.db")
+            stats = u.upsert_json_to_db(repeated, twice)
+            self.assertEqual((stats["inserted"], stats["updated"], stats["unchanged"]), (5, 1, 4))
+            with sqlite3.connect(twice) as conn:
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity").fetchone()[0], 5)
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity_fts").fetchone()[0], 5)
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity_period").fetchone()[0], 5)
+            q.setDbPathOrUrl(twice)
+            self.assertEqual(len(q.getActivitiesByResponsiblePerson("Zelda Repeated")), 1)
+
+        with self.assertRaises(ValueError):
+            ProcessDataUploadHandler(mode="incremental")
+
+    def test_20_MetadataDeltaSync(self):
+        meta = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "meta.csv")
+        with BlazegraphStandIn() as server, tempfile.TemporaryDirectory() as root:
+            manifest = os.path.join(root, "manifest.db")
+            u = MetadataUploadHandler(mode="streaming", sink=GraphSink(Graph()), manifest=manifest)
+            u.mode = "delta"
+            u.setDbPathOrUrl(server.url)
+
+            def expected(path):
+                graph = Graph()
+                u.stream_heritage_data(path, GraphSink(graph))
+                return set(graph)
+
+            stats = u.sync_heritage_data(meta)
+            self.assertEqual((stats["added"], stats["changed"], stats["removed"]), (35, 0, 0))
+            self.assertEqual(set(server.graph), expected(meta))
+            stats = u.sync_heritage_data(meta)
+            self.assertEqual((stats["unchanged"], stats["requests"]), (35, 0))
+
+            # Edit a title, move an object to a new author, drop an object and add one
+            with open(meta, encoding="utf-8", newline="") as f:
+                rows = list(csv.DictReader(f))
+            rows[0]["Title"] = "A changed title"
+            rows[1]["Author"] = "Nobody, New (VIAF:1)"
+            removed = rows.pop(5)
+            rows.append(dict(rows[2], Id="9999"))
+            edited = os.path.join(root, "meta.csv")
+            with open(edited, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            requests_before = server.requests
+            stats = u.sync_heritage_data(edited)
+            self.assertEqual((stats["added"], stats["changed"], stats["removed"], stats["unchanged"]), (1, 2, 1, 32))
+            self.assertEqual(server.requests - requests_before, 1)
+            self.assertLess(stats["deleted"] + stats["inserted"], 30)
+            self.assertEqual(set(server.graph), expected(edited))
+            self.assertNotIn(Literal(removed["Title"].strip()), set(server.graph.objects()))
+
+            # The same manifest tracks an embedded store separately
+            url = "rdflib://" + os.path.join(root, "graph.nt")
+            try:
+                self.assertEqual(u.sync_heritage_data(edited, url)["added"], 35)
+                self.assertEqual(u.sync_heritage_data(meta, url)["changed"], 2)
+                close_embedded_store(url)
+                self.assertEqual(set(get_embedded_store(url).graph), expected(meta))
+            finally:
+                close_embedded_store(url)
+
+    def test_21_ParquetSnapshot(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with tempfile.TemporaryDirectory() as root:
+            tables = os.path.join(root, "tables.db")
+            activity = os.path.join(root, "activity.db")
+            ProcessDataUploadHandler().stream_json_to_db(process, tables)
+            ProcessDataUploadHandler(mode="streaming", schema="activity").stream_json_to_db(process, activity)
+            probes = [
+                ("getAllActivities", ()),
+                ("getActivitiesByResponsibleInstitution", ("phil",)),
+                ("getActivitiesByResponsiblePerson", ("ALICE",)),
+                ("getActivitiesUsingTool", ("blend",)),
+                ("getActivitiesStartedAfter", ("2023-05-01",)),
+                ("getActivitiesEndedBefore", ("2023-06-01",)),
+                ("getAcquisitionsByTechnique", ("photo",)),
+                ("getObjectIdsInTimeFrame", ("2023-03-01", "2023-09-01")),
+            ]
+            for db in (tables, activity):
+                snapshot = os.path.join(root, os.path.basename(db) + ".parquet")
+                self.assertEqual(impl.export_activity_parquet(db, snapshot, batch_size=50)["activities"], 175)
+                self.assertTrue(os.path.isdir(os.path.join(snapshot, "type=Acquisition")))
+                sql = ProcessDataQueryHandler()
+                sql.setDbPathOrUrl(db)
+                columnar = ProcessDataQueryHandler()
+                columnar.setDbPathOrUrl("parquet://" + snapshot)
+                for method, args in probes:
+                    expected = getattr(sql, method)(*args)
+                    result = getattr(columnar, method)(*args)
+                    self.assertEqual(list(result.columns), list(expected.columns), method)
+                    self.assertEqual(
+                        sorted(tuple(map(str, row)) for row in expected.itertuples(index=False)),
+                        sorted(tuple(map(str, row)) for row in result.itertuples(index=False)),
+                        method,
+                    )
+                self.assertEqual(sum(len(page) for page in columnar.iterAllActivities(page_size=40)),
+                                 len(sql.getAllActivities()))
+                m = AdvancedMashup([], [columnar])
+                self.assertEqual(len(m.getAllActivities()), len(AdvancedMashup([], [sql]).getAllActivities()))
+
+            # Tools stay lists of strings, and a year filter only reads its partitions
+            df = impl.read_activity_parquet(snapshot, columns=["object_id", "tool", "start_year"],
+                                            filter=impl.require_pyarrow()[2].field("start_year") == 2023)
+            self.assertEqual(list(df.columns), ["object_id", "tool", "start_year"])
+            self.assertTrue(all(isinstance(tool, str) for tools in df["tool"] for tool in tools))
+            self.assertEqual(set(df["start_year"]), {2023})
+
+            # Exporting again replaces the old snapshot and leaves nothing beside it
+            open(os.path.join(snapshot, "stale.parquet"), "wb").close()
+            self.assertEqual(impl.export_activity_parquet(activity, snapshot)["activities"], 175)
+            self.assertFalse(os.path.exists(os.path.join(snapshot, "stale.parquet")))
+            self.assertFalse(os.path.exists(snapshot + ".old") or os.path.exists(snapshot + ".partial"))
+
+    def test_22_ReadOnlyServing(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with open(process, encoding="utf-8") as f:
+            items = json.load(f)
+        interval = impl.SQLITE_SWAP_CHECK_INTERVAL
+        with tempfile.TemporaryDirectory() as root:
+            db = os.path.join(root, "process.db")
+            ProcessDataUploadHandler(mode="streaming", schema="activity", fts=True).stream_json_to_db(process, db)
+            plain = ProcessDataQueryHandler()
+            plain.setDbPathOrUrl(db)
+            serving = ProcessDataQueryHandler(pool_size=3, serving=True)
+            serving.setDbPathOrUrl(db)
+            pool = serving._pool()
+            self.assertTrue(pool.serving)
+            self.assertEqual(pool._open, 3)  # Opened and warmed up front
+            with pool.connection() as conn:
+                self.assertEqual(conn.execute("PRAGMA mmap_size").fetchone()[0], os.path.getsize(db))
+                with self.assertRaises(sqlite3.OperationalError):
+                    conn.execute("CREATE TABLE t (x)")
+            self.assertIsNot(pool, plain._pool())
+
+            for method, args in [
+                ("getAllActivities", ()),
+                ("getActivitiesByResponsiblePerson", ("alice",)),
+                ("getActivitiesUsingTool", ("blend",)),
+                ("getActivitiesStartedAfter", ("2023-05-01",)),
+                ("getActivitiesEndedBefore", ("2023-06-01",)),
+                ("getAcquisitionsByTechnique", ("photo",)),
+                ("getObjectIdsInTimeFrame", ("2023-03-01", "2023-09-01")),
+            ]:
+                expected = getattr(plain, method)(*args)
+                result = getattr(serving, method)(*args)
+                self.assertEqual(
+                    sorted(tuple(map(str, row)) for row in expected.itertuples(index=False)),
+                    sorted(tuple(map(str, row)) for row in result.itertuples(index=False)),
+                    method,
+                )
+
+            # A new snapshot renamed over the file is picked up by the next query
+            extra = os.path.join(root, "extra.json")
+            with open(extra, "w", encoding="utf-8") as f:
+                json.dump(items + [dict(items[0], **{"object id": "9999"})], f)
+            staged = os.path.join(root, "staged.db")
+            ProcessDataUploadHandler(mode="streaming", schema="activity").stream_json_to_db(extra, staged)
+            os.replace(staged, db)
+            try:
+                # Of several readers checking at once, only one sees the swap
+                impl.SQLITE_SWAP_CHECK_INTERVAL = 60.0
+                pool._checked = time.monotonic() - 120
+                seen = []
+                barrier = threading.Barrier(8)
+
+                def check():
+                    barrier.wait()
+                    seen.append(pool.stale())
+
+                threads = [threading.Thread(target=check) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(sorted(seen), [False] * 7 + [True])
+
+                impl.SQLITE_SWAP_CHECK_INTERVAL = 0.0
+                self.assertEqual(len(serving.getActivitiesByResponsiblePerson("")), 180)
+                self.assertTrue(pool._closed)
+                self.assertNotIn("activity_fts", serving._tables())
+            finally:
+                impl.SQLITE_SWAP_CHECK_INTERVAL = interval
+                impl.close_sqlite_pools()
+
+    def test_23_IntervalIndex(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with open(process, encoding="utf-8") as f:
+            items = json.load(f)
+        with sqlite3.connect(":memory:") as conn:
+            for value in ("0001-01-01", "1999-12-31", "2000-03-01", "2023-05-07", "2023-05-07T10:00:00"):
+                self.assertEqual(impl.period_day(value),
+                                 conn.execute("SELECT CAST(julianday(substr(?, 1, 10)) AS INTEGER)", (value,)).fetchone()[0])
+        self.assertIsNone(impl.period_day("2023/05/07"))
+
+        # A missing end date and a date that is not ISO
+        items = json.loads(json.dumps(items))
+        del items[0]["exporting"]["end date"]
+        items[1]["acquisition"]["start date"] = "May 2023"
+        with tempfile.TemporaryDirectory() as root:
+            source = os.path.join(root, "process.json")
+            with open(source, "w", encoding="utf-8") as f:
+                json.dump(items, f)
+            indexed = os.path.join(root, "indexed.db")
+            plain = os.path.join(root, "plain.db")
+            tables = os.path.join(root, "tables.db")
+            ProcessDataUploadHandler(mode="streaming", schema="activity").stream_json_to_db(source, indexed)
+            ProcessDataUploadHandler(mode="streaming", schema="activity", period_index=False).stream_json_to_db(source, plain)
+            ProcessDataUploadHandler().stream_json_to_db(source, tables)
+            with sqlite3.connect(indexed) as conn:
+                self.assertEqual(conn.execute("SELECT count(*) FROM activity_period").fetchone()[0], 175)
+                plan = " ".join(row[-1] for row in conn.execute(
+                    "EXPLAIN QUERY PLAN " + impl.ACTIVITY_SELECT
+                    + " WHERE id IN (SELECT id FROM activity_period WHERE start_min >= ? AND end_max <= ?)", (0, 0)))
+                self.assertIn("VIRTUAL TABLE INDEX", plan)
+            with sqlite3.connect(plain) as conn:
+                self.assertFalse(impl.has_table(conn, "activity_period"))
+
+            handlers = []
+            for db in (indexed, plain, tables):
+                q = ProcessDataQueryHandler()
+                q.setDbPathOrUrl(db)
+                handlers.append(q)
+            for method, args in [
+                ("getActivitiesStartedAfter", ("2023-05-01",)),
+                ("getActivitiesEndedBefore", ("2023-06-01",)),
+                ("getActivitiesOverlapping", ("2023-05-01", "2023-05-31")),
+                ("getActivitiesContainedIn", ("2023-03-01", "2023-09-01")),
+                ("getObjectIdsInTimeFrame", ("2023-03-01", "2023-09-01")),
+                ("getActivitiesStartedAfter", ("2023-06",)),  # Not a full date: compared as text
+            ]:
+                # Except for the object whose date is only a date when compared as text
+                results = [getattr(q, method)(*args) for q in handlers]
+                rows = [sorted(tuple(map(str, row)) for row in df.itertuples(index=False)
+                               if row[0] != items[1]["object id"]) for df in results]
+                self.assertGreater(len(rows[0]), 0, method)
+                self.assertEqual(rows[0], rows[1], method)
+                self.assertEqual(rows[0], rows[2], method)
+            # "May 2023" only counts as a date where it is compared as text
+            for q, found in ((handlers[0], False), (handlers[1], True)):
+                df = q.getActivitiesStartedAfter("2000-01-01")
+                self.assertEqual(items[1]["object id"] in set(df[df["type"] == "Acquisition"]["object_id"]), found)
+            self.assertEqual(len(AdvancedMashup([], [handlers[0]]).getActivitiesOverlapping("2023-05-01", "2023-05-31")),
+                             len(handlers[1].getActivitiesOverlapping("2023-05-01", "2023-05-31")))
+
+            # Upserts keep the index in line with the rows
+            items[2]["acquisition"]["start date"] = "2099-01-01"
+            with open(source, "w", encoding="utf-8") as f:
+                json.dump(items, f)
+            ProcessDataUploadHandler(mode="incremental", schema="activity").upsert_json_to_db(source, indexed)
+            self.assertEqual(
+                handlers[0].getActivitiesStartedAfter("2099-01-01")["object_id"].tolist(), [items[2]["object id"]]
+            )
+            self.assertEqual(impl.build_activity_periods(indexed), 175)
+
+    def test_24_AsyncMashups(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        with BlazegraphStandIn() as server, tempfile.TemporaryDirectory() as root:
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(SPARQLBulkLoader(server.url)))
+            db = os.path.join(root, "process.db")
+            ProcessDataUploadHandler().stream_json_to_db(process, db)
+            handlers = []
+            for cls in (MetadataQueryHandler, AsyncMetadataQueryHandler, ProcessDataQueryHandler, AsyncProcessDataQueryHandler):
+                q = cls(cache=False) if "Metadata" in cls.__name__ else cls()
+                q.setDbPathOrUrl(server.url if "Metadata" in cls.__name__ else db)
+                handlers.append(q)
+            blocking = AdvancedMashup([handlers[0]], [handlers[2]], id_batch_size=3)
+            m = AsyncAdvancedMashup([handlers[1]], [handlers[3]], id_batch_size=3)
+
+            def keys(results):
+                return sorted((type(x).__name__, x.refersTo.id, str(x.start), str(x.end)) if isinstance(x, Activity)
+                              else (type(x).__name__, x.id, x.title if hasattr(x, "title") else x.name, "") for x in results)
+
+            async def compare():
+                for method, args in [
+                    ("getAllPeople", ()),
+                    ("getAllCulturalHeritageObjects", ()),
+                    ("getAuthorsOfCulturalHeritageObject", ("1",)),
+                    ("getCulturalHeritageObjectsAuthoredBy", ("2",)),
+                    ("getAllActivities", ()),
+                    ("getActivitiesByResponsibleInstitution", ("council",)),
+                    ("getActivitiesStartedAfter", ("2023-05-01",)),
+                    ("getAcquisitionsByTechnique", ("Photogrammetry",)),
+                    ("getActivitiesOnObjectsAuthoredBy", ("2",)),
+                    ("getObjectsHandledByResponsiblePerson", ("Jane",)),
+                    ("getObjectsHandledByResponsibleInstitution", ("Council",)),
+                    ("getAuthorsOfObjectsAcquiredInTimeFrame", ("2023-04-01", "2023-09-15")),
+                ]:
+                    expected = getattr(blocking, method)(*args)
+                    self.assertGreater(len(expected), 0, method)
+                    self.assertEqual(keys(await getattr(m, method)(*args)), keys(expected), method)
+                self.assertIsNone(await m.getEntityById("no-such-id"))
+
+            async def timed(call):
+                # Seconds `call` takes, and the ticks of a 10ms timer meanwhile: the loop is never blocked
+                ticks = 0
+
+                async def tick():
+                    nonlocal ticks
+                    while True:
+                        await asyncio.sleep(0.01)
+                        ticks += 1
+
+                ticker = asyncio.ensure_future(tick())
+                started = time.perf_counter()
+                result = await call
+                elapsed = time.perf_counter() - started
+                ticker.cancel()
+                return result, elapsed, ticks
+
+            async def run():
+                await compare()
+                # The SPARQL and SQL sides are awaited together
+                server.latency = 0.3
+                slow = AsyncAdvancedMashup([handlers[1]], [SlowProcessDataQueryHandler(0.3)])
+                slow.processQuery[0].setDbPathOrUrl(db)
+                activities, elapsed, ticks = await timed(slow.getActivitiesOnObjectsAuthoredBy("2"))
+                self.assertGreater(len(activities), 0)
+                self.assertLess(elapsed, 0.55)
+                self.assertGreater(ticks, 15)
+                # A handler exceeding the timeout is left out
+                async with AsyncAdvancedMashup([handlers[1]], [handlers[3]], timeout=0.1) as late:
+                    self.assertEqual(await late.getAllPeople(), [])
+                    self.assertGreater(len(await late.getAllActivities()), 0)
+                server.latency = 0
+                # Leaving the mashup closed the session of the endpoint's host
+                self.assertEqual(impl._async_http_sessions.get(asyncio.get_running_loop(), {}), {})
+                async with handlers[1] as handler:
+                    self.assertGreater(len(await handler.getAllPeople()), 0)
+                    session = impl.get_async_http_session(server.url)
+                self.assertTrue(session.closed)
+
+            asyncio.run(run())
+
+            # Without aiohttp the queries run in the executor, with the same results
+            if impl.aiohttp is not None:
+                aiohttp, impl.aiohttp = impl.aiohttp, None
+                try:
+                    people = asyncio.run(AsyncAdvancedMashup([handlers[1]], []).getAllPeople())
+                finally:
+                    impl.aiohttp = aiohttp
+                self.assertEqual(keys(people), keys(blocking.getAllPeople()))
+
+    def test_25_Metrics(self):
+        process = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "process.json")
+        metrics = MetricsCollector()
+        with BlazegraphStandIn() as server, tempfile.TemporaryDirectory() as root:
+            MetadataUploadHandler(mode="streaming", sink=SPARQLUploadSink(SPARQLBulkLoader(server.url)))
+            db = os.path.join(root, "process.db")
+            ProcessDataUploadHandler().stream_json_to_db(process, db)
+            qm = MetadataQueryHandler(cache=QueryResultCache())
+            qm.setDbPathOrUrl(server.url)
+            qp = ProcessDataQueryHandler()
+            qp.setDbPathOrUrl(db)
+            m = AdvancedMashup([qm], [qp])
+
+            # Nothing is recorded while no collector is installed
+            self.assertIsNone(set_metrics_collector(None))
+            m.getAllActivities()
+            self.assertEqual(metrics.export(), "")
+
+            previous = set_metrics_collector(metrics)
+            try:
+                self.assertIsNone(previous)
+                df = qp.getAllActivities()
+                activities = m.getAllActivities()
+                people = m.getAllPeople()
+                m.getAllPeople()
+                objects = m.getObjectsHandledByResponsibleInstitution("Council")
+                async_handler = AsyncMetadataQueryHandler(cache=False)
+                async_handler.setDbPathOrUrl(server.url)
+
+                async def query_async():
+                    async with AsyncAdvancedMashup([async_handler], []) as async_mashup:
+                        await async_mashup.getAllPeople()
+
+                asyncio.run(query_async())
+                broken = MetadataQueryHandler(cache=False)
+                broken.setDbPathOrUrl("http://127.0.0.1:1/blazegraph/sparql")
+                with self.assertRaises(Exception):
+                    broken.getAllPeople()
+            finally:
+                set_metrics_collector(previous)
+
+            self.assertEqual(metrics.counter("calls_total", method="ProcessDataQueryHandler.getAllActivities"), 2)
+            self.assertEqual(metrics.counter("rows_total", method="ProcessDataQueryHandler.getAllActivities"), 2 * len(df))
+            self.assertEqual(metrics.counter("rows_total", method="BasicMashup.getAllActivities"), len(activities))
+            self.assertEqual(metrics.counter("rows_total", method="BasicMashup.getAllPeople"), 2 * len(people))
+            self.assertEqual(metrics.counter("rows_total", method="AdvancedMashup.getObjectsHandledByResponsibleInstitution"),
+                             len(objects))
+            self.assertEqual(metrics.counter("calls_total", method="AsyncBasicMashup.getAllPeople"), 1)
+            self.assertEqual(metrics.counter("errors_total", method="MetadataQueryHandler.getAllPeople"), 1)
+            self.assertEqual(metrics.counter("cache_requests_total", result="hit"), 1)
+            self.assertGreater(metrics.counter("bytes_total", direction="received"), 1000)
+            self.assertGreater(metrics.counter("bytes_total", direction="sent"), 0)
+            for stage in ("sql", "sparql", "parse", "materialize"):
+                count, seconds = metrics.histogram("stage_duration_seconds", stage=stage)
+                self.assertGreater(count, 0, stage)
+                self.assertGreater(seconds, 0, stage)
+            count, seconds = metrics.histogram("call_duration_seconds", method="BasicMashup.getAllActivities")
+            self.assertEqual(count, 1)
+            self.assertLess(seconds, 60)
+
+            # The Prometheus text format, from a file or over HTTP
+            text = metrics.export()
+            sample = re.compile(r'^impl_[a-z_]+(\{([a-z_]+="([^"\\]|\\.)*",?)*\})? [0-9.e+-]+$')
+            for line in text.splitlines():
+                self.assertTrue(line.startswith("# ") or sample.match(line), line)
+            self.assertIn('impl_call_duration_seconds_bucket{method="BasicMashup.getAllActivities",le="+Inf"} 1', text)
+            self.assertIn('impl_call_duration_seconds_count{method="BasicMashup.getAllActivities"} 1', text)
+            self.assertEqual(text.count("# TYPE impl_calls_total counter"), 1)
+            path = os.path.join(root, "impl.prom")
+            metrics.write(path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), text)
+            endpoint = metrics.serve()
+            try:
+                url = "http://127.0.0.1:%d" % endpoint.server_address[1]
+                with urllib.request.urlopen(url + "/metrics") as response:
+                    self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+                    self.assertEqual(response.read().decode("utf-8"), text)
+                with self.assertRaises(urllib.error.HTTPError):
+                    urllib.request.urlopen(url + "/other")
+            finally:
+                endpoint.shutdown()
+                endpoint.server_close()
+            metrics.reset()
+            self.assertEqual(metrics.export(), "")